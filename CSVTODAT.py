@@ -13,6 +13,7 @@ from curwmysqladapter import MySQLAdapter
 
 from Util.LibForecastTimeseries import extractForecastTimeseries
 from Util.LibForecastTimeseries import extractForecastTimeseriesInDays
+from Util.LibEventIds import resolveEventIds
 
 
 def usage():
@@ -77,12 +78,17 @@ def save_forecast_timeseries(my_adapter, timeseries, my_model_date, my_model_tim
         'source': 'HEC-HMS',
         'name': run_name,
     }
+    meta_data_list = []
     for index in range(0, min(len(types), len(extracted_timeseries))):
         meta_data_copy = copy.deepcopy(meta_data)
         meta_data_copy['type'] = types[index]
-        event_id = my_adapter.get_event_id(meta_data_copy)
+        meta_data_list.append(meta_data_copy)
+    # Event ids of all the days are resolved at once
+    event_ids = resolveEventIds(my_adapter, meta_data_list)
+    for index, (event_id, created) in enumerate(event_ids):
         if event_id is None:
-            event_id = my_adapter.create_event_id(meta_data_copy)
+            continue
+        if created:
             print('HASH SHA256 created: ', event_id)
         else:
             print('HASH SHA256 exists: ', event_id)
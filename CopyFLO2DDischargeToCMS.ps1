@@ -1,4 +1,4 @@
-param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert)
+param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert, [string]$workers, [string]$all_channels)
 
 if(!$date) {
 	$date = (Get-Date).ToString('yyyy-MM-dd')
@@ -14,6 +14,8 @@ If ($path) { $args += ("--path", $path) }
 If ($out) { $args += ("--out", $out) }
 If ($name) { $args += ("--name", $name) }
 If ($forceInsert) { $args += ("-f", $forceInsert) }
+If ($workers) { $args += ("--workers", $workers) }
+If ($all_channels) { $args += ("--all_channels") }
 Invoke-Expression "python EXTRACTFLO2DWATERDISCHARGE.py -d $date $args"
 
 $output_dir = If ($out) {".\OUTPUT\water_discharge-$out"} Else {".\OUTPUT\water_discharge-$date"}
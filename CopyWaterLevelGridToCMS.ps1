@@ -1,4 +1,4 @@
-param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert)
+param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert, [string]$cube, [string]$sparse, [string]$workers, [string]$gzip, [string]$pyramid)
 
 if(!$date) {
 	$date = (Get-Date).ToString('yyyy-MM-dd')
@@ -14,9 +14,24 @@ If ($path) { $args += ("--path", $path) }
 If ($out) { $args += ("--out", $out) }
 If ($name) { $args += ("--name", $name) }
 If ($forceInsert) { $args += ("-f", $forceInsert) }
+If ($cube) { $args += ("--cube") }
+If ($sparse) { $args += ("--sparse") }
+If ($workers) { $args += ("--workers", $workers) }
+If ($gzip) { $args += ("--gzip") }
+If ($pyramid) { $args += ("--pyramid", $pyramid) }
 Invoke-Expression "python EXTRACTFLO2DWATERLEVELGRID.py -d $date $args"
 
 $output_dir = If ($out) {".\OUTPUT\water_level_grid-$out"} Else {".\OUTPUT\water_level_grid-$date"}
+If ($pyramid) {
+    $levels = Get-ChildItem -Directory ".\OUTPUT" -Filter ("water_level_grid_*x-" + $(If ($out) {$out} Else {$date}))
+    ForEach ($level in $levels) { pscp -i .\ssh\id_lahikos -r $level.FullName uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/WL_GRID }
+}
+If ($cube -or $sparse) {
+    # Single water depth cube file and/or wet cells file instead of a directory of grid files
+    If ($cube) { pscp -i .\ssh\id_lahikos "$output_dir.cube" uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/WL_GRID }
+    If ($sparse) { pscp -i .\ssh\id_lahikos "$output_dir.wet.npz" uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/WL_GRID }
+    exit
+}
 pscp -i .\ssh\id_lahikos -r $output_dir uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/WL_GRID
 
 if(Test-Path $output_dir){
@@ -1,4 +1,4 @@
-param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert)
+param([string]$date, [string]$time, [string]$start_date, [string]$start_time, [string]$path, [string]$out, [string]$name, [string]$forceInsert, [string]$variables, [string]$workers, [string]$all_channels)
 
 if(!$date) {
 	$date = (Get-Date).ToString('yyyy-MM-dd')
@@ -14,6 +14,9 @@ If ($path) { $args += ("--path", $path) }
 If ($out) { $args += ("--out", $out) }
 If ($name) { $args += ("--name", $name) }
 If ($forceInsert) { $args += ("-f", $forceInsert) }
+If ($variables) { $args += ("--variables", $variables) }
+If ($workers) { $args += ("--workers", $workers) }
+If ($all_channels) { $args += ("--all_channels") }
 Invoke-Expression "python EXTRACTFLO2DWATERLEVEL.py -d $date $args"
 
 $output_dir = If ($out) {".\OUTPUT\water_level-$out"} Else {".\OUTPUT\water_level-$date"}
@@ -22,4 +25,10 @@ pscp -i .\ssh\id_lahikos -r $output_dir uwcc-admin@10.138.0.6:/home/uwcc-admin/c
 if(Test-Path $output_dir){
     Compress-Archive -Force -Path $output_dir -DestinationPath "$output_dir.zip"
     pscp -i .\ssh\id_lahikos "$output_dir.zip" uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/WL_Archive
+}
+
+# Discharge is also extracted in the same pass, if requested with -variables
+$discharge_dir = If ($out) {".\OUTPUT\water_discharge-$out"} Else {".\OUTPUT\water_discharge-$date"}
+if(($variables -match "all|discharge") -and (Test-Path $discharge_dir)){
+    pscp -i .\ssh\id_lahikos -r $discharge_dir uwcc-admin@10.138.0.6:/home/uwcc-admin/cfcwm/data/FLO2D/DIS
 }
\ No newline at end of file
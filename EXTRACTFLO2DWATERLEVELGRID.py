@@ -1,5 +1,6 @@
 #!/usr/bin/python3
 
+import csv
 import datetime
 import getopt
 import json
@@ -8,18 +9,53 @@ import sys
 import traceback
 from os.path import join as pjoin
 
+import numpy as np
+
+from LIBFLO2DBASEOUT import getBaseOutCellValues
+from LIBFLO2DBASEOUT import iterBaseOutResults
+from LIBFLO2DENVELOPE import ENVELOPE_DEPTH_THRESHOLDS
+from LIBFLO2DENVELOPE import getEnvelopeGrids
+from LIBFLO2DENVELOPE import openEnvelope
+from LIBFLO2DENVELOPE import updateEnvelope
+from LIBFLO2DGRIDCUBE import CUBE_SUFFIX
+from LIBFLO2DGRIDCUBE import appendCubeTimestep
+from LIBFLO2DGRIDCUBE import closeCubeWriter
+from LIBFLO2DGRIDCUBE import openCubeWriter
+from LIBFLO2DGRIDWRITER import putGridFile
+from LIBFLO2DGRIDWRITER import startGridWriter
+from LIBFLO2DGRIDWRITER import stopGridWriter
+from LIBFLO2DPYRAMID import PYRAMID_METHODS
+from LIBFLO2DPYRAMID import getPyramid
+from LIBFLO2DSPARSEGRID import SPARSE_GRID_SUFFIX
+from LIBFLO2DSPARSEGRID import appendSparseGridTimestep
+from LIBFLO2DSPARSEGRID import closeSparseGridWriter
+from LIBFLO2DSPARSEGRID import openSparseGridWriter
 from LIBFLO2DWATERLEVELGRID import getCellGrid
-from LIBFLO2DWATERLEVELGRID import getEsriGrid
 from LIBFLO2DWATERLEVELGRID import getGridBoudary
-from LIBFLO2DWATERLEVELGRID import getWaterLevelGrid
+from LIBFLO2DWATERLEVELGRID import getGridOfValues
+from LIBFLO2DWATERLEVELGRID import getGridIndex
+from LIBFLO2DWATERLEVELGRID import getMesh
+from LIBFLO2DWATERLEVELGRID import writeEsriGridFile
+from LIBFLO2DWATERLEVELGRID import CADPTS_DAT_FILES
+from Util.LibAdapterPool import MYSQL_POOL_SIZE
+from Util.LibAdapterPool import acquireAdapter
+from Util.LibAdapterPool import closeAdapterPool
+from Util.LibAdapterPool import getAdapterPool
+from Util.LibForecastTimeseries import getTimesFromHours
+from Util.LibForecastTimeseries import save_forecast_timeseries
+from Util.LibTimeseriesLoader import TIMESERIES_BATCH_SIZE
+from Util.LibTimeseriesLoader import closeTimeseriesLoader
+from Util.LibTimeseriesLoader import flushTimeseriesLoader
+from Util.LibTimeseriesLoader import openTimeseriesLoader
+from Util.Utils import getUTCOffset
 
 
 def usage():
     usage_text = """
 Usage: ./FLO2DTOLEVELGRID.py [-d YYYY-MM-DD] [-t HH:MM:SS] [-p -o -h] [-S YYYY-MM-DD] [-T HH:MM:SS]
+                             [BASE.OUT options] [Grid output options] [--flood-plain [Database options]]
 
 -h  --help          Show usage
--f #TODO
 -F  --flo2d_config  Configuration for FLO2D model run
 -d  --date          Date in YYYY-MM-DD. Default is current date.
 -t  --time          Time in HH:MM:SS. If -d passed, then default is 00:00:00. Otherwise Default is current time.
@@ -28,10 +64,52 @@ Usage: ./FLO2DTOLEVELGRID.py [-d YYYY-MM-DD] [-t HH:MM:SS] [-p -o -h] [-S YYYY-M
                     Default is 'water_level-<YYYY-MM-DD>' and 'water_level_grid-<YYYY-MM-DD>' same as -d option value.
 -S  --start_date    Base Date of FLO2D model output in YYYY-MM-DD format. Default is same as -d option value.
 -T  --start_time    Base Time of FLO2D model output in HH:MM:SS format. Default is set to 00:00:00
+-M  --mesh          FLO2D mesh file in META_FLO2D. E.g. CADPTS_SLD.DAT, CADPTS_KADAWALA.DAT. Default is CADPTS.DAT
+
+BASE.OUT options:
+    --follow        Extract the timesteps as they are written into BASE.OUT while FLO2D is still running.
+                    With --flood-plain, timeseries of each day are stored as soon as the day is completed.
+    --follow-timeout    Stop following when BASE.OUT does not grow for given seconds. Default is 600.
+    --follow-until  Stop following once given file exists, instead of --follow-timeout.
+                    E.g. the file which is created by Run_FLO2D.py once FLO2D is completed.
+    --cache-base-out    Build the BASE.OUT cache (BASE.OUT.npz) if there is not a valid one, thus the later
+                        extractions of the same run do not parse BASE.OUT again. Ignored with --follow.
+    --window-start  Extract the timesteps from given time in 'YYYY-MM-DD HH:MM:SS' format.
+                    Default is the model state time (-d and -t option values).
+    --window-end    Extract the timesteps until given time in 'YYYY-MM-DD HH:MM:SS' format. Default is end of the run.
+
+Grid output options:
+    --cube          Write a single compressed water depth cube file 'water_level_grid-<SUFFIX>.cube'
+                    instead of a 'water_level_grid-<SUFFIX>' directory of Esri grid files.
+    --sparse        Write only the wet cells of each timestep into a single file 'water_level_grid-<SUFFIX>.wet.npz'
+                    instead of a 'water_level_grid-<SUFFIX>' directory of Esri grid files. Can be used with --cube.
+    --thresholds    Comma separated flood depth thresholds (m) of the flood envelope. Default is 0.5,1.0
+                    Flood envelope grids (max_depth, peak_time, first_wet_time and duration_above_<THRESHOLD>)
+                    are written into 'water_level_grid_envelope-<SUFFIX>' directory.
+    --elevation     Also write the water elevation grids into 'water_elevation_grid-<SUFFIX>' directory.
+    --pyramid       Also write the depth grids downsampled to 2x, 4x and 8x cell size into
+                    'water_level_grid_<N>x-<SUFFIX>' directories, by aggregating the cells with "max" or "mean".
+-z  --gzip          Write gzip compressed grid files, i.e. 'water_level_grid-<TIMESTAMP>.asc.gz'.
+-w  --workers       Number of threads which format and write the grid files, while BASE.OUT is being parsed.
+                    Default is 1. If 0, the grid files are written one after the other while parsing.
+
+Database options:
+    --flood-plain   Also extract the water levels of FLOOD_PLAIN_CELL_MAP stations into 'water_level-<SUFFIX>'
+                    directory and store them into the database, in the same pass of BASE.OUT.
+                    Then run EXTRACTFLO2DWATERLEVEL.py with --skip-flood-plain. All the timesteps of BASE.OUT
+                    are read for the stations, the time window (--window-start, --window-end) is only applied
+                    on the grids.
+-f  --forceInsert   Force Insert into the database, for --flood-plain. May override existing values.
+-n  --name          Name field value of the Run table in Database, for --flood-plain. Default is 'Cloud-1'.
+-u  --utc_offset    UTC offset of current timestamps, for --flood-plain. "+05:30" or "-10:00". Default is "+00:00".
 """
     print(usage_text)
 
 
+# Database is only used with --flood-plain
+pool = None
+adapter = None
+utcOffset = datetime.timedelta()
 try:
     CONFIG = json.loads(open('CONFIG.json').read())
 
@@ -39,8 +117,22 @@ try:
     BASE_OUT_FILE = 'BASE.OUT'
     WATER_LEVEL_FILE = 'water_level_grid.asc'
     WATER_LEVEL_DIR = 'water_level_grid'
+    ENVELOPE_DIR = 'water_level_grid_envelope'
+    ELEVATION_FILE = 'water_elevation_grid.asc'
+    ELEVATION_DIR = 'water_elevation_grid'
+    FLOOD_PLAIN_FILE = 'water_level.txt'
+    FLOOD_PLAIN_DIR = 'water_level'
+    UTC_OFFSET = '+00:00:00'
+    MISSING_VALUE = -999
+
+    MYSQL_HOST = "localhost"
+    MYSQL_USER = "root"
+    MYSQL_DB = "curw"
+    MYSQL_PASSWORD = ""
     OUTPUT_DIR = 'OUTPUT'
     RUN_FLO2D_FILE = 'RUN_FLO2D.json'
+    META_FLO2D_DIR = 'META_FLO2D'
+    CADPTS_DAT_FILE = 'CADPTS.DAT'
 
     if 'BASE_OUT_FILE' in CONFIG:
         BASE_OUT_FILE = CONFIG['BASE_OUT_FILE']
@@ -48,6 +140,32 @@ try:
         WATER_LEVEL_FILE = CONFIG['WATER_LEVEL_FILE']
     if 'OUTPUT_DIR' in CONFIG:
         OUTPUT_DIR = CONFIG['OUTPUT_DIR']
+    FLOOD_DEPTH_THRESHOLDS = ENVELOPE_DEPTH_THRESHOLDS
+    GRID_GZIP = False
+    if 'GRID_GZIP' in CONFIG:
+        GRID_GZIP = CONFIG['GRID_GZIP']
+    GRID_PYRAMID = ''
+    if 'GRID_PYRAMID' in CONFIG:
+        GRID_PYRAMID = CONFIG['GRID_PYRAMID']
+    if 'FLOOD_DEPTH_THRESHOLDS' in CONFIG:
+        FLOOD_DEPTH_THRESHOLDS = CONFIG['FLOOD_DEPTH_THRESHOLDS']
+    if 'CADPTS_DAT_FILE' in CONFIG:
+        CADPTS_DAT_FILE = CONFIG['CADPTS_DAT_FILE']
+
+    if 'MYSQL_HOST' in CONFIG:
+        MYSQL_HOST = CONFIG['MYSQL_HOST']
+    if 'MYSQL_USER' in CONFIG:
+        MYSQL_USER = CONFIG['MYSQL_USER']
+    if 'MYSQL_DB' in CONFIG:
+        MYSQL_DB = CONFIG['MYSQL_DB']
+    if 'MYSQL_PASSWORD' in CONFIG:
+        MYSQL_PASSWORD = CONFIG['MYSQL_PASSWORD']
+    MYSQL_BATCH_SIZE = TIMESERIES_BATCH_SIZE
+    if 'MYSQL_BATCH_SIZE' in CONFIG:
+        MYSQL_BATCH_SIZE = CONFIG['MYSQL_BATCH_SIZE']
+    MYSQL_WORKERS = MYSQL_POOL_SIZE - 1
+    if 'MYSQL_WORKERS' in CONFIG:
+        MYSQL_WORKERS = CONFIG['MYSQL_WORKERS']
 
     date = ''
     time = ''
@@ -57,11 +175,33 @@ try:
     start_time = ''
     flo2d_config = ''
     forceInsert = False
+    follow = False
+    followTimeout = 600
+    followUntil = None
+    cacheBaseOut = False
+    window_start = ''
+    window_end = ''
+    cube = False
+    sparse = False
+    elevation = False
+    floodPlain = False
+    run_name = ''
+    utc_offset = ''
+    workers = 1
+    compress = GRID_GZIP
+    pyramid = GRID_PYRAMID
 
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hF:d:t:p:o:S:T:fn:",
+        opts, args = getopt.getopt(sys.argv[1:], "hF:d:t:p:o:S:T:fn:u:w:zM:",
                                    ["help", "flo2d_config=", "date=", "time=", "path=", "out=", "start_date=",
-                                    "start_time=", "name=", "forceInsert"])
+                                    "start_time=", "mesh=",
+                                    # BASE.OUT options
+                                    "follow", "follow-timeout=", "follow-until=", "cache-base-out", "window-start=",
+                                    "window-end=",
+                                    # Grid output options
+                                    "cube", "sparse", "thresholds=", "elevation", "pyramid=", "gzip", "workers=",
+                                    # Database options
+                                    "flood-plain", "forceInsert", "name=", "utc_offset="])
     except getopt.GetoptError:          
         usage()                        
         sys.exit(2)                     
@@ -87,6 +227,38 @@ try:
             run_name = arg.strip()
         elif opt in ("-f", "--forceInsert"):
             forceInsert = True
+        elif opt == "--follow":
+            follow = True
+        elif opt == "--follow-timeout":
+            followTimeout = int(arg)
+        elif opt == "--follow-until":
+            followUntil = pjoin(CWD, arg.strip())
+        elif opt == "--cache-base-out":
+            cacheBaseOut = True
+        elif opt == "--window-start":
+            window_start = arg.strip()
+        elif opt == "--window-end":
+            window_end = arg.strip()
+        elif opt == "--cube":
+            cube = True
+        elif opt == "--sparse":
+            sparse = True
+        elif opt == "--elevation":
+            elevation = True
+        elif opt == "--flood-plain":
+            floodPlain = True
+        elif opt == "--pyramid":
+            pyramid = arg.strip()
+        elif opt in ("-z", "--gzip"):
+            compress = True
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-u", "--utc_offset"):
+            utc_offset = arg.strip()
+        elif opt == "--thresholds":
+            FLOOD_DEPTH_THRESHOLDS = [float(threshold) for threshold in arg.split(',')]
+        elif opt in ("-M", "--mesh"):
+            CADPTS_DAT_FILE = arg.strip()
 
     appDir = pjoin(CWD, date + '_Kelani')
     if path:
@@ -142,76 +314,260 @@ try:
     print('Extract Water Level Grid Result of FLO2D on', date, '@', time,
           'with Bast time of', start_date, '@', start_time)
 
+    # Time window of the timesteps in model time (hours). By default, seek to the model state time
+    baseDateTime = datetime.datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
+    windowStart = now
+    if window_start:
+        windowStart = datetime.datetime.strptime(window_start, '%Y-%m-%d %H:%M:%S')
+    windowEnd = None
+    if window_end:
+        windowEnd = datetime.datetime.strptime(window_end, '%Y-%m-%d %H:%M:%S')
+    startModelTime = (windowStart - baseDateTime).total_seconds() / 3600
+    endModelTime = (windowEnd - baseDateTime).total_seconds() / 3600 if windowEnd else None
+    print('Extract timesteps from', windowStart, 'until', windowEnd or 'end of the run')
+
     OUTPUT_DIR_PATH = pjoin(CWD, OUTPUT_DIR)
     BASE_OUT_FILE_PATH = pjoin(appDir, BASE_OUT_FILE)
+    CADPTS_DAT_FILE_PATH = pjoin(CWD, META_FLO2D_DIR, CADPTS_DAT_FILE)
 
-    WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, date))
+    outputSuffix = date
     # Use FLO2D Config file data, if available
     if 'FLO2D_OUTPUT_SUFFIX' in FLO2D_CONFIG and len(FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']):
-        WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']))
+        outputSuffix = FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']
     if output_suffix:
-            WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, output_suffix))
+        outputSuffix = output_suffix
+    WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, outputSuffix))
+    ENVELOPE_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (ENVELOPE_DIR, outputSuffix))
+    ELEVATION_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (ELEVATION_DIR, outputSuffix))
+    FLOOD_PLAIN_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (FLOOD_PLAIN_DIR, outputSuffix))
+
+    if pyramid and pyramid not in PYRAMID_METHODS:
+        print('Invalid pyramid aggregation :', pyramid, 'Use one of', list(PYRAMID_METHODS.keys()))
+        sys.exit()
 
     print('Processing FLO2D model on', appDir)
 
-    # Check BASE.OUT file exists
-    if not os.path.exists(BASE_OUT_FILE_PATH):
+    # Check BASE.OUT file exists. While following, wait for FLO2D to create it.
+    if not follow and not os.path.exists(BASE_OUT_FILE_PATH):
         print('Unable to find file : ', BASE_OUT_FILE_PATH)
         sys.exit()
 
+    if not os.path.exists(CADPTS_DAT_FILE_PATH):
+        print('Unable to find mesh file : ', CADPTS_DAT_FILE_PATH, 'Available meshes :', CADPTS_DAT_FILES)
+        sys.exit()
+
     # Create OUTPUT Directory
     if not os.path.exists(OUTPUT_DIR_PATH):
         os.makedirs(OUTPUT_DIR_PATH)
 
-    buffer_size = 65536
-    with open(BASE_OUT_FILE_PATH) as infile: 
-        isWaterLevelLines = False
-        waterLevelLines = []
-        boundary = getGridBoudary()
-        CellGrid = getCellGrid(boundary)
-        while True:
-            lines = infile.readlines(buffer_size)
-
-            if not lines:
-                break
-            for line in lines:
-                if line.startswith('MODEL TIME =', 5):
-                    isWaterLevelLines = True
-                elif isWaterLevelLines and line.startswith('***CHANNEL RESULTS***', 17):
-                    waterLevels = getWaterLevelGrid(waterLevelLines)
-                    EsriGrid = getEsriGrid(waterLevels, boundary, CellGrid)
-
-                    # Create Directory
-                    if not os.path.exists(WATER_LEVEL_DIR_PATH):
-                        os.makedirs(WATER_LEVEL_DIR_PATH)
-                    # Get Time stamp Ref:http://stackoverflow.com/a/13685221/1461060
-                    ModelTime = float(waterLevelLines[0].split()[3])
-                    fileModelTime = datetime.datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
-                    fileModelTime = fileModelTime + datetime.timedelta(hours=ModelTime)
-                    dateAndTime = fileModelTime.strftime("%Y-%m-%d_%H-%M-%S")
-                    if fileModelTime >= now:
-                        # Create files
-                        fileName = WATER_LEVEL_FILE.rsplit('.', 1)
-                        fileName = "%s-%s.%s" % (fileName[0], dateAndTime, fileName[1])
-                        WATER_LEVEL_FILE_PATH = pjoin(WATER_LEVEL_DIR_PATH, fileName)
-                        file = open(WATER_LEVEL_FILE_PATH, 'w')
-                        file.writelines(EsriGrid)
-                        file.close()
-                        print('Write to :', fileName)
-                    else:
-                        print('Skip. Current model time:' + dateAndTime +
-                              ' is not greater than ' + now.strftime("%Y-%m-%d_%H-%M-%S"))
-
-                    isWaterLevelLines = False
-                    # for l in waterLevelLines :
-                    #     print(l)
-                    waterLevelLines = []
-
-                if isWaterLevelLines:
-                    waterLevelLines.append(line)
+    # Flood plain stations are extracted out of the same pass of BASE.OUT
+    FLOOD_PLAIN_CELL_MAP = {}
+    if floodPlain:
+        pool = getAdapterPool(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_WORKERS + 1)
+        adapter = acquireAdapter(pool)
+        flo2d_source = adapter.get_source(name='FLO2D')
+        try:
+            flo2d_source = json.loads(flo2d_source.get('parameters', "{}"))
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+        if 'FLOOD_PLAIN_CELL_MAP' in flo2d_source:
+            FLOOD_PLAIN_CELL_MAP = flo2d_source['FLOOD_PLAIN_CELL_MAP']
+
+        # Run Name of DB
+        if 'RUN_NAME' in FLO2D_CONFIG and len(FLO2D_CONFIG['RUN_NAME']):
+            run_name = FLO2D_CONFIG['RUN_NAME']
+        if not run_name:
+            run_name = 'Cloud-1'
+        # UTC Offset
+        if 'UTC_OFFSET' in FLO2D_CONFIG and len(FLO2D_CONFIG['UTC_OFFSET']):
+            UTC_OFFSET = FLO2D_CONFIG['UTC_OFFSET']
+        if utc_offset:
+            UTC_OFFSET = utc_offset
+        utcOffset = getUTCOffset(UTC_OFFSET, default=True)
+
+    # Open the files upfront, thus timesteps are available on the files while following BASE.OUT
+    floodPlainFiles = {}
+    if len(FLOOD_PLAIN_CELL_MAP) and not os.path.exists(FLOOD_PLAIN_DIR_PATH):
+        os.makedirs(FLOOD_PLAIN_DIR_PATH)
+    for elementNo in FLOOD_PLAIN_CELL_MAP:
+        fileName = FLOOD_PLAIN_FILE.rsplit('.', 1)
+        fileTimestamp = "%s_%s" % (date, time.replace(':', '-'))
+        fileName = "%s-%s-%s.%s" % \
+                   (fileName[0], FLOOD_PLAIN_CELL_MAP[elementNo].replace(' ', '_'), fileTimestamp, fileName[1])
+        floodPlainFiles[elementNo] = open(pjoin(FLOOD_PLAIN_DIR_PATH, fileName), 'w')
+
+    # Mesh is loaded from the cache next to the mesh file. See getMesh
+    mesh = getMesh(CADPTS_DAT_FILE_PATH)
+    boundary = getGridBoudary(mesh=mesh)
+    CellGrid = getCellGrid(boundary, mesh=mesh)
+    gridIndex = None
+    cubeWriter = None
+    sparseWriter = None
+    envelope = None
+    modelTimes = []
+    floodPlainSeriesDict = {elementNo: [] for elementNo in FLOOD_PLAIN_CELL_MAP}
+    floodPlainOpts = {}
+    for elementNo in FLOOD_PLAIN_CELL_MAP:
+        if adapter.get_station({'name': FLOOD_PLAIN_CELL_MAP[elementNo]}) is None:
+            print('WARNING: Station %s does not exists. Continue with others.' % FLOOD_PLAIN_CELL_MAP[elementNo])
+            continue
+        floodPlainOpts[elementNo] = {
+            'forceInsert': forceInsert,
+            'station': FLOOD_PLAIN_CELL_MAP[elementNo],
+            'variable': 'WaterLevel',
+            'run_name': run_name
+        }
+        if utcOffset != datetime.timedelta():
+            floodPlainOpts[elementNo]['utcOffset'] = utcOffset
+    # Timeseries of all the flood plain stations are inserted in batches
+    loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS) if floodPlain else None
+    # While following, the timeseries of each day are stored once the day is completed. Days before savedDays
+    # are already stored.
+    savedDays = 0
+    stepDay = None
+    # Flood plain stations need all the timesteps, thus the time window is applied only on the grids
+    timeWindow = (None, None) if floodPlain else (startModelTime, endModelTime)
+    if floodPlain:
+        print('NOTE: All the timesteps of BASE.OUT are read for --flood-plain stations.',
+              'Time window is only applied on the grids.')
+    # Grid files are formatted and written by the writer threads, while the next timesteps are parsed
+    gridWriter = startGridWriter(workers)
+    for ModelTime, cells, values in iterBaseOutResults(BASE_OUT_FILE_PATH, follow, idleTimeout=followTimeout,
+                                                       startTime=timeWindow[0], endTime=timeWindow[1],
+                                                       buildCache=cacheBaseOut, stopFile=followUntil):
+        # Position of the cells on the grid is computed once, unless the cells of BASE.OUT are changed
+        if gridIndex is None or not np.array_equal(gridIndex['cells'], cells):
+            gridIndex = getGridIndex(cells, boundary, CellGrid)
+
+        # Get Time stamp Ref:http://stackoverflow.com/a/13685221/1461060
+        fileModelTime = baseDateTime + datetime.timedelta(hours=ModelTime)
+        dateAndTime = fileModelTime.strftime("%Y-%m-%d_%H-%M-%S")
+
+        if floodPlain:
+            waterLevels = getBaseOutCellValues(cells, values['elevation'], FLOOD_PLAIN_CELL_MAP.keys())
+            modelTimes.append(ModelTime)
+            for elementNo in FLOOD_PLAIN_CELL_MAP:
+                waterLevel = waterLevels[elementNo] if elementNo in waterLevels else MISSING_VALUE
+                floodPlainSeriesDict[elementNo].append(waterLevel)
+                csv.writer(floodPlainFiles[elementNo], delimiter=',', quotechar='|').writerow(
+                    [fileModelTime.strftime("%Y-%m-%d %H:%M:%S"), waterLevel])
+                if follow:
+                    floodPlainFiles[elementNo].flush()
+            # A day is completed once a timestep of the next day is written. Same as the days of the database.
+            day = (fileModelTime + utcOffset).date()
+            if follow and stepDay is not None and day != stepDay:
+                # Timestep of the next day is left out, along with its day. See getForecastTimeseriesInDays
+                floodPlainTimes = getTimesFromHours(baseDateTime, modelTimes)
+                days = savedDays
+                for elementNo in floodPlainOpts:
+                    opts = dict(floodPlainOpts[elementNo], fromDay=savedDays)
+                    days = save_forecast_timeseries(adapter, (floodPlainTimes, floodPlainSeriesDict[elementNo]),
+                                                    date, time, opts, loader)
+                savedDays = max(savedDays, days)
+                flushTimeseriesLoader(loader)
+                print('Stored Flood Plain Water Levels until', stepDay)
+            stepDay = day
+
+        if fileModelTime < windowStart:
+            if not cube and not sparse:
+                print('Skip. Current model time:' + dateAndTime +
+                      ' is not greater than ' + windowStart.strftime("%Y-%m-%d_%H-%M-%S"))
+            continue
+        if windowEnd is not None and fileModelTime > windowEnd:
+            continue
+
+        grid = getGridOfValues(values['depth'], gridIndex)
+        # Flood envelope is updated in the same pass
+        if envelope is None:
+            envelope = openEnvelope(gridIndex['rows'] * gridIndex['cols'], FLOOD_DEPTH_THRESHOLDS, startModelTime)
+        updateEnvelope(envelope, ModelTime, grid)
+        if cube:
+            if cubeWriter is None:
+                cubeWriter = openCubeWriter(WATER_LEVEL_DIR_PATH + CUBE_SUFFIX, boundary,
+                                            gridIndex['cols'], gridIndex['rows'], baseDateTime)
+            appendCubeTimestep(cubeWriter, ModelTime, grid)
+        if sparse:
+            if sparseWriter is None:
+                sparseWriter = openSparseGridWriter(WATER_LEVEL_DIR_PATH + SPARSE_GRID_SUFFIX, boundary,
+                                                    gridIndex['cols'], gridIndex['rows'], baseDateTime,
+                                                    gridIndex['index'])
+            appendSparseGridTimestep(sparseWriter, ModelTime, grid)
+
+        if not cube and not sparse:
+            # Create Directory
+            if not os.path.exists(WATER_LEVEL_DIR_PATH):
+                os.makedirs(WATER_LEVEL_DIR_PATH)
+            # Create files
+            fileName = WATER_LEVEL_FILE.rsplit('.', 1)
+            fileName = "%s-%s.%s%s" % (fileName[0], dateAndTime, fileName[1], '.gz' if compress else '')
+            WATER_LEVEL_FILE_PATH = pjoin(WATER_LEVEL_DIR_PATH, fileName)
+            putGridFile(gridWriter, WATER_LEVEL_FILE_PATH, grid, gridIndex['cols'], gridIndex['rows'], boundary)
+            print('Write to :', fileName)
+
+        if pyramid:
+            # Coarse levels are built from each timestep as it arrives
+            for factor, level in getPyramid(grid, gridIndex['cols'], gridIndex['rows'], boundary,
+                                            method=pyramid).items():
+                levelGrid, levelCols, levelRows, levelBoundary = level
+                LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s_%sx-%s" % (WATER_LEVEL_DIR, factor, outputSuffix))
+                if not os.path.exists(LEVEL_DIR_PATH):
+                    os.makedirs(LEVEL_DIR_PATH)
+                fileName = WATER_LEVEL_FILE.rsplit('.', 1)
+                fileName = "%s-%s.%s%s" % (fileName[0], dateAndTime, fileName[1], '.gz' if compress else '')
+                putGridFile(gridWriter, pjoin(LEVEL_DIR_PATH, fileName), levelGrid, levelCols, levelRows,
+                            levelBoundary, 250.0 * factor)
+
+        if elevation:
+            # Elevation grid shares the grid buffer of gridIndex, thus it is done after the depth grid
+            if not os.path.exists(ELEVATION_DIR_PATH):
+                os.makedirs(ELEVATION_DIR_PATH)
+            fileName = ELEVATION_FILE.rsplit('.', 1)
+            fileName = "%s-%s.%s%s" % (fileName[0], dateAndTime, fileName[1], '.gz' if compress else '')
+            elevationGrid = getGridOfValues(values['elevation'], gridIndex)
+            putGridFile(gridWriter, pjoin(ELEVATION_DIR_PATH, fileName), elevationGrid,
+                        gridIndex['cols'], gridIndex['rows'], boundary)
+            print('Write to :', fileName)
+    # -- END for loop
+    stopGridWriter(gridWriter)
+
+    floodPlainTimes = getTimesFromHours(baseDateTime, modelTimes)
+    for elementNo in FLOOD_PLAIN_CELL_MAP:
+        floodPlainFiles[elementNo].close()
+        if elementNo not in floodPlainOpts:
+            continue
+        # Save Forecast values into Database
+        opts = dict(floodPlainOpts[elementNo], fromDay=savedDays)
+        save_forecast_timeseries(adapter, (floodPlainTimes, floodPlainSeriesDict[elementNo]), date, time, opts,
+                                 loader)
+        print('Extracted Cell No', elementNo, FLOOD_PLAIN_CELL_MAP[elementNo], 'into -> ',
+              floodPlainFiles[elementNo].name)
+    if loader is not None:
+        print('%s rows inserted.\n' % closeTimeseriesLoader(loader))
+
+    if envelope is not None:
+        if not os.path.exists(ENVELOPE_DIR_PATH):
+            os.makedirs(ENVELOPE_DIR_PATH)
+        for name, grid in getEnvelopeGrids(envelope).items():
+            writeEsriGridFile(pjoin(ENVELOPE_DIR_PATH, '%s.asc%s' % (name, '.gz' if compress else '')),
+                              grid, gridIndex['cols'], gridIndex['rows'], boundary)
+        print('Write flood envelope to :', ENVELOPE_DIR_PATH)
+
+    if cubeWriter is not None:
+        closeCubeWriter(cubeWriter)
+        print('Write to :', WATER_LEVEL_DIR_PATH + CUBE_SUFFIX, 'with',
+              len(cubeWriter['header']['modelTimes']), 'timesteps')
+    if sparseWriter is not None:
+        closeSparseGridWriter(sparseWriter)
+        print('Write to :', WATER_LEVEL_DIR_PATH + SPARSE_GRID_SUFFIX, 'with',
+              len(sparseWriter['modelTimes']), 'timesteps')
 
 except Exception as e:
     print(e)
     traceback.print_exc()
+    # Exit status is checked by Run_FLO2D.py --follow
+    sys.exit(1)
 finally:
+    if pool is not None:
+        closeAdapterPool(pool)
     print('Completed processing Extracting Water Level Grid.')
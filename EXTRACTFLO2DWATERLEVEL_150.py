@@ -10,12 +10,26 @@ import copy
 from datetime import datetime, timedelta
 from os.path import join as pjoin
 
-from curwmysqladapter import MySQLAdapter
-
 import Constants
-from LIBFLO2DWATERLEVELGRID import getWaterLevelOfChannels
-from Util.LibForecastTimeseries import extractForecastTimeseries
-from Util.LibForecastTimeseries import extractForecastTimeseriesInDays
+from LIBFLO2DBASEOUT import getBaseOutCellValues
+from LIBFLO2DBASEOUT import iterBaseOutResults
+from LIBFLO2DHYCHAN import HYCHAN_COLUMNS
+from LIBFLO2DHYCHAN import extractHychanElements
+from LIBFLO2DHYCHAN import getChannelElements
+from LIBFLO2DHYCHAN import getHychanCache
+from LIBFLO2DHYCHAN import writeHychanMatrix
+from Util.LibAdapterPool import MYSQL_POOL_SIZE
+from Util.LibAdapterPool import acquireAdapter
+from Util.LibAdapterPool import closeAdapterPool
+from Util.LibAdapterPool import getAdapterPool
+from Util.LibEventIds import resolveEventIds
+from Util.LibTimeseriesLoader import TIMESERIES_BATCH_SIZE
+from Util.LibTimeseriesLoader import addTimeseries
+from Util.LibTimeseriesLoader import closeTimeseriesLoader
+from Util.LibTimeseriesLoader import flushTimeseriesLoader
+from Util.LibTimeseriesLoader import openTimeseriesLoader
+from Util.LibForecastTimeseries import getForecastTimeseriesInDays
+from Util.LibForecastTimeseries import getTimesFromHours
 from Util.Utils import getUTCOffset
 
 
@@ -35,19 +49,28 @@ Usage: ./EXTRACTFLO2DTOWATERLEVEL.py [-d YYYY-MM-DD] [-t HH:MM:SS] [-p -o -h] [-
                     Default is 'water_level-<YYYY-MM-DD>' and 'water_level_grid-<YYYY-MM-DD>' same as -d option value.
 -n  --name          Name field value of the Run table in Database. Use time format such as 'Cloud-1-<%H:%M:%S>' to replace with time(t).
 -u  --utc_offset    UTC offset of current timestamps. "+05:30" or "-10:00". Default value is "+00:00".
+-e  --element       Comma separated channel element numbers out of CHANNEL_CELL_MAP. E.g. "179,221".
+                    Default is all the elements in CHANNEL_CELL_MAP.
+-A  --all_channels  Also extract every channel element in CHAN.DAT into a single time x element file
+                    with a header row of element numbers.
+-V  --variables     Comma separated variables to extract from HYCHAN.OUT in a single pass, out of
+                    "elevation", "depth", "velocity" and "discharge" or "all". Default is "elevation".
+-w  --workers       Number of worker processes which decode HYCHAN.OUT elements and write the files. Default is 1.
+    --follow        Extract the flood plain water levels as they are written into BASE.OUT while FLO2D is still
+                    running, then extract HYCHAN.OUT once it is available. Timeseries of each day are stored
+                    into the database as soon as the day is completed.
+    --follow-timeout    Stop following when BASE.OUT does not grow for given seconds. Default is 600.
+    --follow-until  Stop following once given file exists, instead of --follow-timeout.
+                    E.g. the file which is created by Run_FLO2D.py once FLO2D is completed.
+    --cache-base-out    Build the BASE.OUT cache (BASE.OUT.npz) if there is not a valid one, thus the later
+                        extractions of the same run do not parse BASE.OUT again. Ignored with --follow.
+    --skip-flood-plain  Do not extract the flood plain water levels from BASE.OUT. E.g. when they are extracted
+                        by EXTRACTFLO2DWATERLEVELGRID.py --flood-plain in the same pass as the grids.
 """
     print(usageText)
 
 
-def isfloat(value):
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
-
-
-def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_time, my_opts):
+def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_time, my_opts, loader=None):
     print('EXTRACTFLO2DWATERLEVEL:: save_forecast_timeseries >>', my_opts)
 
     # Convert date time with offset
@@ -58,19 +81,9 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
         my_model_time = date_time.strftime('%H:%M:%S')
 
     # If there is an offset, shift by offset before proceed
-    forecast_timeseries = []
     if 'utcOffset' in my_opts:
         print('Shit by utcOffset:', my_opts['utcOffset'].resolution)
-        for item in my_timeseries:
-            forecast_timeseries.append(
-                [datetime.strptime(item[0], Constants.COMMON_DATE_TIME_FORMAT) + my_opts['utcOffset'], item[1]])
-
-        forecast_timeseries = extractForecastTimeseries(forecast_timeseries, my_model_date, my_model_time, by_day=True)
-    else:
-        forecast_timeseries = extractForecastTimeseries(my_timeseries, my_model_date, my_model_time, by_day=True)
-
-    # print(forecast_timeseries[:10])
-    extracted_timeseries = extractForecastTimeseriesInDays(forecast_timeseries)
+    extracted_timeseries = getForecastTimeseriesInDays(my_timeseries, my_model_date, my_opts.get('utcOffset'))
 
     # for ll in extractedTimeseries :
     #     print(ll)
@@ -81,7 +94,7 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
     is_station_exists = adapter.get_station({'name': station})
     if is_station_exists is None:
         print('WARNING: Station %s does not exists. Continue with others.' % station)
-        return
+        return len(extracted_timeseries)
     # TODO: Create if station does not exists.
 
     run_name = my_opts.get('run_name', 'Cloud-1')
@@ -116,18 +129,25 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
     ]
     meta_data = {
         'station': station,
-        'variable': 'WaterLevel',
-        'unit': 'm',
+        'variable': my_opts.get('variable', 'WaterLevel'),
+        'unit': my_opts.get('unit', 'm'),
         'type': types[0],
         'source': 'FLO2D',
         'name': run_name
     }
-    for i in range(0, min(len(types), len(extracted_timeseries))):
+    # Days before fromDay are already stored. E.g. the completed days while following BASE.OUT
+    days = range(my_opts.get('fromDay', 0), min(len(types), len(extracted_timeseries)))
+    meta_data_list = []
+    for i in days:
         meta_data_copy = copy.deepcopy(meta_data)
         meta_data_copy['type'] = types[i]
-        event_id = my_adapter.get_event_id(meta_data_copy)
+        meta_data_list.append(meta_data_copy)
+    # Event ids of all the days are resolved at once
+    event_ids = resolveEventIds(my_adapter, meta_data_list)
+    for i, (event_id, created) in zip(days, event_ids):
         if event_id is None:
-            event_id = my_adapter.create_event_id(meta_data_copy)
+            continue
+        if created:
             print('HASH SHA256 created: ', event_id)
         else:
             print('HASH SHA256 exists: ', event_id)
@@ -137,416 +157,468 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
 
         # for l in timeseries[:3] + timeseries[-2:] :
         #     print(l)
+        if loader is not None:
+            # Inserted along with the timeseries of the other stations. See Util.LibTimeseriesLoader
+            addTimeseries(loader, event_id, extracted_timeseries[i])
+            continue
         row_count = my_adapter.insert_timeseries(event_id, extracted_timeseries[i], force_insert)
         print('%s rows inserted.\n' % row_count)
-        # -- END OF SAVE_FORECAST_TIMESERIES
-
-
-try:
-    CONFIG = json.loads(open('CONFIG.json').read())
-
-    CWD = os.getcwd()
-    HYCHAN_OUT_FILE = 'HYCHAN.OUT'
-    BASE_OUT_FILE = 'BASE.OUT'
-    WATER_LEVEL_FILE = 'water_level.txt'
-    WATER_LEVEL_DIR = 'water_level'
-    OUTPUT_DIR = 'OUTPUT'
-    RUN_FLO2D_FILE = 'RUN_FLO2D.json'
-    UTC_OFFSET = '+00:00:00'
-
-    FLO2D_MODEL = "FLO2D"
-
-    MYSQL_HOST = "localhost"
-    MYSQL_USER = "root"
-    MYSQL_DB = "curw"
-    MYSQL_PASSWORD = ""
-
-    if 'HYCHAN_OUT_FILE' in CONFIG:
-        HYCHAN_OUT_FILE = CONFIG['HYCHAN_OUT_FILE']
-    if 'BASE_OUT_FILE' in CONFIG:
-        BASE_OUT_FILE = CONFIG['BASE_OUT_FILE']
-    if 'WATER_LEVEL_FILE' in CONFIG:
-        WATER_LEVEL_FILE = CONFIG['WATER_LEVEL_FILE']
-    if 'OUTPUT_DIR' in CONFIG:
-        OUTPUT_DIR = CONFIG['OUTPUT_DIR']
-
-    if 'FLO2D_MODEL' in CONFIG:
-        FLO2D_MODEL = CONFIG['FLO2D_MODEL']
-
-    if 'MYSQL_HOST' in CONFIG:
-        MYSQL_HOST = CONFIG['MYSQL_HOST']
-    if 'MYSQL_USER' in CONFIG:
-        MYSQL_USER = CONFIG['MYSQL_USER']
-    if 'MYSQL_DB' in CONFIG:
-        MYSQL_DB = CONFIG['MYSQL_DB']
-    if 'MYSQL_PASSWORD' in CONFIG:
-        MYSQL_PASSWORD = CONFIG['MYSQL_PASSWORD']
-
-    adapter = MySQLAdapter(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD, db=MYSQL_DB)
-    # TODO: Pass source name as a paramter to script
-
-    flo2d_source = adapter.get_source(name=FLO2D_MODEL)
+    # Number of the days which are completed, i.e. fromDay of the next call
+    return days.stop
+    # -- END OF SAVE_FORECAST_TIMESERIES
+
 
+if __name__ == '__main__':
+    # Connections of the pool are closed once the extraction is done
+    pool = None
+    # Printed on completion, even if the extraction is stopped early
+    HYCHAN_OUT_FILE_PATH = ''
+    WATER_LEVEL_FILE_PATH = ''
     try:
-        flo2d_source = json.loads(flo2d_source.get('parameters', "{}"))
-    except Exception as e:
-        print(e)
-        traceback.print_exc()
+        CONFIG = json.loads(open('CONFIG.json').read())
+
+        CWD = os.getcwd()
+        HYCHAN_OUT_FILE = 'HYCHAN.OUT'
+        CHAN_DAT_FILE = 'CHAN.DAT'
+        BASE_OUT_FILE = 'BASE.OUT'
+        WATER_LEVEL_FILE = 'water_level.txt'
+        WATER_LEVEL_DIR = 'water_level'
+        WATER_DISCHARGE_FILE = 'water_discharge.txt'
+        WATER_DISCHARGE_DIR = 'water_discharge'
+        OUTPUT_DIR = 'OUTPUT'
+        RUN_FLO2D_FILE = 'RUN_FLO2D.json'
+        UTC_OFFSET = '+00:00:00'
+
+        FLO2D_MODEL = "FLO2D"
+
+        MYSQL_HOST = "localhost"
+        MYSQL_USER = "root"
+        MYSQL_DB = "curw"
+        MYSQL_PASSWORD = ""
+
+        if 'HYCHAN_OUT_FILE' in CONFIG:
+            HYCHAN_OUT_FILE = CONFIG['HYCHAN_OUT_FILE']
+        if 'CHAN_DAT_FILE' in CONFIG:
+            CHAN_DAT_FILE = CONFIG['CHAN_DAT_FILE']
+        if 'BASE_OUT_FILE' in CONFIG:
+            BASE_OUT_FILE = CONFIG['BASE_OUT_FILE']
+        if 'WATER_LEVEL_FILE' in CONFIG:
+            WATER_LEVEL_FILE = CONFIG['WATER_LEVEL_FILE']
+        if 'WATER_DISCHARGE_FILE' in CONFIG and len(CONFIG['WATER_DISCHARGE_FILE']) > 0:
+            WATER_DISCHARGE_FILE = CONFIG['WATER_DISCHARGE_FILE']
+        if 'WATER_DISCHARGE_DIR' in CONFIG and len(CONFIG['WATER_DISCHARGE_DIR']) > 0:
+            WATER_DISCHARGE_DIR = CONFIG['WATER_DISCHARGE_DIR']
+        if 'OUTPUT_DIR' in CONFIG:
+            OUTPUT_DIR = CONFIG['OUTPUT_DIR']
+
+        if 'FLO2D_MODEL' in CONFIG:
+            FLO2D_MODEL = CONFIG['FLO2D_MODEL']
+
+        if 'MYSQL_HOST' in CONFIG:
+            MYSQL_HOST = CONFIG['MYSQL_HOST']
+        if 'MYSQL_USER' in CONFIG:
+            MYSQL_USER = CONFIG['MYSQL_USER']
+        if 'MYSQL_DB' in CONFIG:
+            MYSQL_DB = CONFIG['MYSQL_DB']
+        if 'MYSQL_PASSWORD' in CONFIG:
+            MYSQL_PASSWORD = CONFIG['MYSQL_PASSWORD']
+        MYSQL_BATCH_SIZE = TIMESERIES_BATCH_SIZE
+        if 'MYSQL_BATCH_SIZE' in CONFIG:
+            MYSQL_BATCH_SIZE = CONFIG['MYSQL_BATCH_SIZE']
+        MYSQL_WORKERS = MYSQL_POOL_SIZE - 1
+        if 'MYSQL_WORKERS' in CONFIG:
+            MYSQL_WORKERS = CONFIG['MYSQL_WORKERS']
+
+        pool = getAdapterPool(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_WORKERS + 1)
+        adapter = acquireAdapter(pool)
+        # TODO: Pass source name as a paramter to script
+
+        flo2d_source = adapter.get_source(name=FLO2D_MODEL)
 
-    CHANNEL_CELL_MAP = {}
-    if 'CHANNEL_CELL_MAP' in flo2d_source:
-        CHANNEL_CELL_MAP = flo2d_source['CHANNEL_CELL_MAP']
-    FLOOD_PLAIN_CELL_MAP = {}
-    if 'FLOOD_PLAIN_CELL_MAP' in flo2d_source:
-        FLOOD_PLAIN_CELL_MAP = flo2d_source['FLOOD_PLAIN_CELL_MAP']
-    """
-    {
-        "CHANNEL_CELL_MAP": {
-            "179": "Wellawatta",
-            "221": "Dehiwala",
-            "592": "Torington",
-            "616": "N'Street-Canal",
-            "618": "N'Street-River",
-            "684": "Dematagoda-Canal",
-            "814": "Heen Ela",
-            "1062": "Kolonnawa-Canal",
-            "991": "kittampahuwa-Out",
-            "1161": "Kittampahuwa-River",
-            "1515": "Parliament Lake Bridge-Kotte Canal",
-            "2158": "Parliament Lake-Out",
-            "2396": "Salalihini-River",
-            "2496": "Salalihini-Canal",
-            "3580": "Madiwela-Out",
-            "3673": "Ambathale"
-        },
-        "FLOOD_PLAIN_CELL_MAP": {
-            "2265": "Parliament Lake",
-            "3559": "Madiwela-US"
+        try:
+            flo2d_source = json.loads(flo2d_source.get('parameters', "{}"))
+        except Exception as e:
+            print(e)
+            traceback.print_exc()
+
+        CHANNEL_CELL_MAP = {}
+        if 'CHANNEL_CELL_MAP' in flo2d_source:
+            CHANNEL_CELL_MAP = flo2d_source['CHANNEL_CELL_MAP']
+        FLOOD_PLAIN_CELL_MAP = {}
+        if 'FLOOD_PLAIN_CELL_MAP' in flo2d_source:
+            FLOOD_PLAIN_CELL_MAP = flo2d_source['FLOOD_PLAIN_CELL_MAP']
+        """
+        {
+            "CHANNEL_CELL_MAP": {
+                "179": "Wellawatta",
+                "221": "Dehiwala",
+                "592": "Torington",
+                "616": "N'Street-Canal",
+                "618": "N'Street-River",
+                "684": "Dematagoda-Canal",
+                "814": "Heen Ela",
+                "1062": "Kolonnawa-Canal",
+                "991": "kittampahuwa-Out",
+                "1161": "Kittampahuwa-River",
+                "1515": "Parliament Lake Bridge-Kotte Canal",
+                "2158": "Parliament Lake-Out",
+                "2396": "Salalihini-River",
+                "2496": "Salalihini-Canal",
+                "3580": "Madiwela-Out",
+                "3673": "Ambathale"
+            },
+            "FLOOD_PLAIN_CELL_MAP": {
+                "2265": "Parliament Lake",
+                "3559": "Madiwela-US"
+            }
         }
-    }
-    """
-
-    ELEMENT_NUMBERS = CHANNEL_CELL_MAP.keys()
-    FLOOD_ELEMENT_NUMBERS = FLOOD_PLAIN_CELL_MAP.keys()
-    SERIES_LENGTH = 0
-    MISSING_VALUE = -999
-
-    date = ''
-    time = ''
-    path = ''
-    output_suffix = ''
-    start_date = ''
-    start_time = ''
-    flo2d_config = ''
-    run_name_default = 'Cloud-1'
-    runName = ''
-    utc_offset = ''
-    forceInsert = False
-    try:
-        opts, args = getopt.getopt(sys.argv[1:], "hF:d:t:p:o:S:T:fn:u:",
-                                   ["help", "flo2d_config=", "date=", "time=", "path=", "out=", "start_date=",
-                                    "start_time=", "name=", "forceInsert", "utc_offset="])
-    except getopt.GetoptError:
-        usage()
-        sys.exit(2)
-    for opt, arg in opts:
-        if opt in ("-h", "--help"):
+        """
+
+        ELEMENT_NUMBERS = CHANNEL_CELL_MAP.keys()
+        FLOOD_ELEMENT_NUMBERS = FLOOD_PLAIN_CELL_MAP.keys()
+        MISSING_VALUE = -999
+
+        date = ''
+        time = ''
+        path = ''
+        output_suffix = ''
+        start_date = ''
+        start_time = ''
+        flo2d_config = ''
+        run_name_default = 'Cloud-1'
+        runName = ''
+        utc_offset = ''
+        elements = ''
+        variables = 'elevation'
+        workers = 1
+        allChannels = False
+        follow = False
+        followTimeout = 600
+        followUntil = None
+        cacheBaseOut = False
+        skipFloodPlain = False
+        forceInsert = False
+        try:
+            opts, args = getopt.getopt(sys.argv[1:], "hF:d:t:p:o:S:T:fn:u:e:V:w:A",
+                                       ["help", "flo2d_config=", "date=", "time=", "path=", "out=", "start_date=",
+                                        "start_time=", "name=", "forceInsert", "utc_offset=", "element=",
+                                        "variables=", "workers=", "all_channels", "follow",
+                                        "follow-timeout=", "follow-until=", "cache-base-out", "skip-flood-plain"])
+        except getopt.GetoptError:
             usage()
-            sys.exit()
-        elif opt in ("-F", "--flo2d_config"):
-            flo2d_config = arg
-        elif opt in ("-d", "--date"):
-            date = arg
-        elif opt in ("-t", "--time"):
-            time = arg
-        elif opt in ("-p", "--path"):
-            path = arg.strip()
-        elif opt in ("-o", "--out"):
-            output_suffix = arg.strip()
-        elif opt in ("-S", "--start_date"):
-            start_date = arg.strip()
-        elif opt in ("-T", "--start_time"):
-            start_time = arg.strip()
-        elif opt in ("-n", "--name"):
-            runName = arg.strip()
-        elif opt in ("-f", "--forceInsert"):
-            forceInsert = True
-        elif opt in ("-u", "--utc_offset"):
-            utc_offset = arg.strip()
-
-    appDir = pjoin(CWD, date + '_Kelani')
-    if path:
-        appDir = pjoin(CWD, path)
-
-    # Load FLO2D Configuration file for the Model run if available
-    FLO2D_CONFIG_FILE = pjoin(appDir, RUN_FLO2D_FILE)
-    if flo2d_config:
-        FLO2D_CONFIG_FILE = pjoin(CWD, flo2d_config)
-    FLO2D_CONFIG = json.loads('{}')
-    # Check FLO2D Config file exists
-    if os.path.exists(FLO2D_CONFIG_FILE):
-        FLO2D_CONFIG = json.loads(open(FLO2D_CONFIG_FILE).read())
-
-    # Default run for current day
-    now = datetime.now()
-    if 'MODEL_STATE_DATE' in FLO2D_CONFIG and len(
-            FLO2D_CONFIG['MODEL_STATE_DATE']):  # Use FLO2D Config file data, if available
-        now = datetime.strptime(FLO2D_CONFIG['MODEL_STATE_DATE'], '%Y-%m-%d')
-    if date:
-        now = datetime.strptime(date, '%Y-%m-%d')
-    date = now.strftime("%Y-%m-%d")
-
-    if 'MODEL_STATE_TIME' in FLO2D_CONFIG and len(
-            FLO2D_CONFIG['MODEL_STATE_TIME']):  # Use FLO2D Config file data, if available
-        now = datetime.strptime('%s %s' % (date, FLO2D_CONFIG['MODEL_STATE_TIME']), '%Y-%m-%d %H:%M:%S')
-    if time:
-        now = datetime.strptime('%s %s' % (date, time), '%Y-%m-%d %H:%M:%S')
-    time = now.strftime("%H:%M:%S")
-
-    if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        start_date = start_date.strftime("%Y-%m-%d")
-    elif 'TIMESERIES_START_DATE' in FLO2D_CONFIG and len(
-            FLO2D_CONFIG['TIMESERIES_START_DATE']):  # Use FLO2D Config file data, if available
-        start_date = datetime.strptime(FLO2D_CONFIG['TIMESERIES_START_DATE'], '%Y-%m-%d')
-        start_date = start_date.strftime("%Y-%m-%d")
-    else:
-        start_date = date
-
-    if start_time:
-        start_time = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
-        start_time = start_time.strftime("%H:%M:%S")
-    elif 'TIMESERIES_START_TIME' in FLO2D_CONFIG and len(
-            FLO2D_CONFIG['TIMESERIES_START_TIME']):  # Use FLO2D Config file data, if available
-        start_time = datetime.strptime('%s %s' % (start_date, FLO2D_CONFIG['TIMESERIES_START_TIME']),
-                                       '%Y-%m-%d %H:%M:%S')
-        start_time = start_time.strftime("%H:%M:%S")
-    else:
-        start_time = datetime.strptime(start_date, '%Y-%m-%d')  # Time is set to 00:00:00
-        start_time = start_time.strftime("%H:%M:%S")
-
-    # Run Name of DB
-    if 'RUN_NAME' in FLO2D_CONFIG and len(FLO2D_CONFIG['RUN_NAME']):  # Use FLO2D Config file data, if available
-        runName = FLO2D_CONFIG['RUN_NAME']
-    if not runName:
-        runName = run_name_default
-
-    # UTC Offset
-    if 'UTC_OFFSET' in FLO2D_CONFIG and len(FLO2D_CONFIG['UTC_OFFSET']):  # Use FLO2D Config file data, if available
-        UTC_OFFSET = FLO2D_CONFIG['UTC_OFFSET']
-    if utc_offset:
-        UTC_OFFSET = utc_offset
-    utcOffset = getUTCOffset(UTC_OFFSET, default=True)
-
-    print('Extract Water Level Result of FLO2D on', date, '@', time, 'with Bast time of', start_date, '@', start_time)
-    print('With UTC Offset of ', str(utcOffset), ' <= ', UTC_OFFSET)
-
-    OUTPUT_DIR_PATH = pjoin(CWD, OUTPUT_DIR)
-    HYCHAN_OUT_FILE_PATH = pjoin(appDir, HYCHAN_OUT_FILE)
-
-    WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, date))
-    if 'FLO2D_OUTPUT_SUFFIX' in FLO2D_CONFIG and len(
-            FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']):  # Use FLO2D Config file data, if available
-        WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']))
-    if output_suffix:
-        WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, output_suffix))
-
-    print('Processing FLO2D model on', appDir)
-
-    # Check BASE.OUT file exists
-    if not os.path.exists(HYCHAN_OUT_FILE_PATH):
-        print('Unable to find file : ', HYCHAN_OUT_FILE_PATH)
-        sys.exit()
-
-    # Create OUTPUT Directory
-    if not os.path.exists(OUTPUT_DIR_PATH):
-        os.makedirs(OUTPUT_DIR_PATH)
-
-    # Calculate the size of time series
-    bufsize = 65536
-    with open(HYCHAN_OUT_FILE_PATH) as infile:
-        isWaterLevelLines = False
-        isCounting = False
-        countSeriesSize = 0  # HACK: When it comes to the end of file, unable to detect end of time series
-        while True:
-            lines = infile.readlines(bufsize)
-            if not lines or SERIES_LENGTH:
-                break
-            for line in lines:
-                if line.startswith('CHANNEL HYDROGRAPH FOR ELEMENT NO:', 5):
-                    isWaterLevelLines = True
-                elif isWaterLevelLines:
-                    cols = line.split()
-                    if len(cols) > 0 and cols[0].replace('.', '', 1).isdigit():
-                        countSeriesSize += 1
-                        isCounting = True
-                    elif isWaterLevelLines and isCounting:
-                        SERIES_LENGTH = countSeriesSize
-                        break
-
-    print('Series Length is :', SERIES_LENGTH)
-    bufsize = 65536
-    #################################################################
-    # Extract Channel Water Level elevations from HYCHAN.OUT file   #
-    #################################################################
-    print('Extract Channel Water Level Result of FLO2D HYCHAN.OUT on', date, '@', time, 'with Bast time of', start_date,
-          '@', start_time)
-    with open(HYCHAN_OUT_FILE_PATH) as infile:
-        isWaterLevelLines = False
-        isSeriesComplete = False
-        waterLevelLines = []
-        seriesSize = 0  # HACK: When it comes to the end of file, unable to detect end of time series
-        while True:
-            lines = infile.readlines(bufsize)
-            if not lines:
-                break
-            for line in lines:
-                if line.startswith('CHANNEL HYDROGRAPH FOR ELEMENT NO:', 5):
-                    seriesSize = 0
-                    elementNo = line.split()[5]
-
-                    if elementNo in ELEMENT_NUMBERS:
-                        isWaterLevelLines = True
-                        waterLevelLines.append(line)
-                    else:
-                        isWaterLevelLines = False
-
-                elif isWaterLevelLines:
-                    cols = line.split()
-                    if len(cols) > 0 and isfloat(cols[0]):
-                        seriesSize += 1
-                        waterLevelLines.append(line)
-
-                        if seriesSize == SERIES_LENGTH:
-                            isSeriesComplete = True
-
-                if isSeriesComplete:
-                    baseTime = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
-                    timeseries = []
-                    elementNo = waterLevelLines[0].split()[5]
-                    print('Extracted Cell No', elementNo, CHANNEL_CELL_MAP[elementNo])
-                    for ts in waterLevelLines[1:]:
-                        v = ts.split()
-                        if len(v) < 1:
-                            continue
-                        # Get flood level (Elevation)
-                        value = v[1]
-                        # Get flood depth (Depth)
-                        # value = v[2]
-                        if not isfloat(value):
-                            value = MISSING_VALUE
-                            continue  # If value is not present, skip
-                        if value == 'NaN':
-                            continue  # If value is NaN, skip
-                        timeStep = float(v[0])
-                        currentStepTime = baseTime + timedelta(hours=timeStep)
-                        dateAndTime = currentStepTime.strftime("%Y-%m-%d %H:%M:%S")
-                        timeseries.append([dateAndTime, value])
-
-                    # Create Directory
-                    if not os.path.exists(WATER_LEVEL_DIR_PATH):
-                        os.makedirs(WATER_LEVEL_DIR_PATH)
-                    # Get Time stamp Ref:http://stackoverflow.com/a/13685221/1461060
-                    ModelTime = float(waterLevelLines[1].split()[3])
-                    fileModelTime = datetime.strptime(date, '%Y-%m-%d')
-                    fileModelTime = fileModelTime + timedelta(hours=ModelTime)
-                    dateAndTime = fileModelTime.strftime("%Y-%m-%d_%H-%M-%S")
-                    # Create files
-                    fileName = WATER_LEVEL_FILE.rsplit('.', 1)
-                    stationName = CHANNEL_CELL_MAP[elementNo].replace(' ', '_')
-                    fileTimestamp = "%s_%s" % (date, time.replace(':', '-'))
-                    fileName = "%s-%s-%s.%s" % (fileName[0], stationName, fileTimestamp, fileName[1])
-                    WATER_LEVEL_FILE_PATH = pjoin(WATER_LEVEL_DIR_PATH, fileName)
-                    csvWriter = csv.writer(open(WATER_LEVEL_FILE_PATH, 'w'), delimiter=',', quotechar='|')
-                    csvWriter.writerows(timeseries)
-                    # Save Forecast values into Database
-                    opts = {
-                        'forceInsert': forceInsert,
-                        'station': CHANNEL_CELL_MAP[elementNo],
-                        'run_name': runName
-                    }
-                    print('>>>>>', opts)
-                    if utcOffset != timedelta():
-                        opts['utcOffset'] = utcOffset
-                    save_forecast_timeseries(adapter, timeseries, date, time, opts)
-
-                    isWaterLevelLines = False
-                    isSeriesComplete = False
-                    waterLevelLines = []
-            # -- END for loop
-        # -- END while loop
-
-    #################################################################
-    # Extract Flood Plain water elevations from BASE.OUT file       #
-    #################################################################
-    BASE_OUT_FILE_PATH = pjoin(appDir, BASE_OUT_FILE)
-    print('Extract Flood Plain Water Level Result of FLO2D on', date, '@', time, 'with Bast time of', start_date, '@',
-          start_time)
-    with open(BASE_OUT_FILE_PATH) as infile:
-        isWaterLevelLines = False
-        waterLevelLines = []
-        waterLevelSeriesDict = dict.fromkeys(FLOOD_ELEMENT_NUMBERS, [])
-        while True:
-            lines = infile.readlines(bufsize)
-
-            if not lines:
-                break
-            for line in lines:
-                if line.startswith('MODEL TIME =', 5):
-                    isWaterLevelLines = True
-                elif isWaterLevelLines and line.startswith('***CHANNEL RESULTS***', 17):
-                    waterLevels = getWaterLevelOfChannels(waterLevelLines, FLOOD_ELEMENT_NUMBERS)
-
-                    # Create Directory
-                    if not os.path.exists(WATER_LEVEL_DIR_PATH):
-                        os.makedirs(WATER_LEVEL_DIR_PATH)
-                    # Get Time stamp Ref:http://stackoverflow.com/a/13685221/1461060
-                    ModelTime = float(waterLevelLines[0].split()[3])
-                    baseTime = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
-                    currentStepTime = baseTime + timedelta(hours=ModelTime)
-                    dateAndTime = currentStepTime.strftime("%Y-%m-%d %H:%M:%S")
-
-                    for elementNo in FLOOD_ELEMENT_NUMBERS:
-                        tmpTS = waterLevelSeriesDict[elementNo][:]
-                        if elementNo in waterLevels:
-                            tmpTS.append([dateAndTime, waterLevels[elementNo]])
-                        else:
-                            tmpTS.append([dateAndTime, MISSING_VALUE])
-                        waterLevelSeriesDict[elementNo] = tmpTS
-
-                    isWaterLevelLines = False
-                    # for l in waterLevelLines :
-                    # print(l)
-                    waterLevelLines = []
-
-                if isWaterLevelLines:
-                    waterLevelLines.append(line)
-            # -- END for loop
-        # -- END while loop
-
-        # Create files
+            sys.exit(2)
+        for opt, arg in opts:
+            if opt in ("-h", "--help"):
+                usage()
+                sys.exit()
+            elif opt in ("-F", "--flo2d_config"):
+                flo2d_config = arg
+            elif opt in ("-d", "--date"):
+                date = arg
+            elif opt in ("-t", "--time"):
+                time = arg
+            elif opt in ("-p", "--path"):
+                path = arg.strip()
+            elif opt in ("-o", "--out"):
+                output_suffix = arg.strip()
+            elif opt in ("-S", "--start_date"):
+                start_date = arg.strip()
+            elif opt in ("-T", "--start_time"):
+                start_time = arg.strip()
+            elif opt in ("-n", "--name"):
+                runName = arg.strip()
+            elif opt in ("-f", "--forceInsert"):
+                forceInsert = True
+            elif opt in ("-u", "--utc_offset"):
+                utc_offset = arg.strip()
+            elif opt in ("-e", "--element"):
+                elements = arg.strip()
+            elif opt in ("-V", "--variables"):
+                variables = arg.strip()
+            elif opt in ("-w", "--workers"):
+                workers = int(arg.strip())
+            elif opt in ("-A", "--all_channels"):
+                allChannels = True
+            elif opt == "--follow":
+                follow = True
+            elif opt == "--follow-timeout":
+                followTimeout = int(arg.strip())
+            elif opt == "--follow-until":
+                followUntil = pjoin(CWD, arg.strip())
+            elif opt == "--cache-base-out":
+                cacheBaseOut = True
+            elif opt == "--skip-flood-plain":
+                skipFloodPlain = True
+
+        appDir = pjoin(CWD, date + '_Kelani')
+        if path:
+            appDir = pjoin(CWD, path)
+
+        # Load FLO2D Configuration file for the Model run if available
+        FLO2D_CONFIG_FILE = pjoin(appDir, RUN_FLO2D_FILE)
+        if flo2d_config:
+            FLO2D_CONFIG_FILE = pjoin(CWD, flo2d_config)
+        FLO2D_CONFIG = json.loads('{}')
+        # Check FLO2D Config file exists
+        if os.path.exists(FLO2D_CONFIG_FILE):
+            FLO2D_CONFIG = json.loads(open(FLO2D_CONFIG_FILE).read())
+
+        # Default run for current day
+        now = datetime.now()
+        if 'MODEL_STATE_DATE' in FLO2D_CONFIG and len(
+                FLO2D_CONFIG['MODEL_STATE_DATE']):  # Use FLO2D Config file data, if available
+            now = datetime.strptime(FLO2D_CONFIG['MODEL_STATE_DATE'], '%Y-%m-%d')
+        if date:
+            now = datetime.strptime(date, '%Y-%m-%d')
+        date = now.strftime("%Y-%m-%d")
+
+        if 'MODEL_STATE_TIME' in FLO2D_CONFIG and len(
+                FLO2D_CONFIG['MODEL_STATE_TIME']):  # Use FLO2D Config file data, if available
+            now = datetime.strptime('%s %s' % (date, FLO2D_CONFIG['MODEL_STATE_TIME']), '%Y-%m-%d %H:%M:%S')
+        if time:
+            now = datetime.strptime('%s %s' % (date, time), '%Y-%m-%d %H:%M:%S')
+        time = now.strftime("%H:%M:%S")
+
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+            start_date = start_date.strftime("%Y-%m-%d")
+        elif 'TIMESERIES_START_DATE' in FLO2D_CONFIG and len(
+                FLO2D_CONFIG['TIMESERIES_START_DATE']):  # Use FLO2D Config file data, if available
+            start_date = datetime.strptime(FLO2D_CONFIG['TIMESERIES_START_DATE'], '%Y-%m-%d')
+            start_date = start_date.strftime("%Y-%m-%d")
+        else:
+            start_date = date
+
+        if start_time:
+            start_time = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
+            start_time = start_time.strftime("%H:%M:%S")
+        elif 'TIMESERIES_START_TIME' in FLO2D_CONFIG and len(
+                FLO2D_CONFIG['TIMESERIES_START_TIME']):  # Use FLO2D Config file data, if available
+            start_time = datetime.strptime('%s %s' % (start_date, FLO2D_CONFIG['TIMESERIES_START_TIME']),
+                                           '%Y-%m-%d %H:%M:%S')
+            start_time = start_time.strftime("%H:%M:%S")
+        else:
+            start_time = datetime.strptime(start_date, '%Y-%m-%d')  # Time is set to 00:00:00
+            start_time = start_time.strftime("%H:%M:%S")
+
+        # Run Name of DB
+        if 'RUN_NAME' in FLO2D_CONFIG and len(FLO2D_CONFIG['RUN_NAME']):  # Use FLO2D Config file data, if available
+            runName = FLO2D_CONFIG['RUN_NAME']
+        if not runName:
+            runName = run_name_default
+
+        # UTC Offset
+        if 'UTC_OFFSET' in FLO2D_CONFIG and len(FLO2D_CONFIG['UTC_OFFSET']):  # Use FLO2D Config file data, if available
+            UTC_OFFSET = FLO2D_CONFIG['UTC_OFFSET']
+        if utc_offset:
+            UTC_OFFSET = utc_offset
+        utcOffset = getUTCOffset(UTC_OFFSET, default=True)
+
+        print('Extract Water Level Result of FLO2D on', date, '@', time,
+              'with Bast time of', start_date, '@', start_time)
+        print('With UTC Offset of ', str(utcOffset), ' <= ', UTC_OFFSET)
+
+        OUTPUT_DIR_PATH = pjoin(CWD, OUTPUT_DIR)
+        HYCHAN_OUT_FILE_PATH = pjoin(appDir, HYCHAN_OUT_FILE)
+
+        outputSuffix = date
+        if 'FLO2D_OUTPUT_SUFFIX' in FLO2D_CONFIG and len(
+                FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']):  # Use FLO2D Config file data, if available
+            outputSuffix = FLO2D_CONFIG['FLO2D_OUTPUT_SUFFIX']
+        if output_suffix:
+            outputSuffix = output_suffix
+        WATER_LEVEL_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (WATER_LEVEL_DIR, outputSuffix))
+
+        # Variables which extract from HYCHAN.OUT in a single pass, with their output files and Database meta data
+        VARIABLES = list(HYCHAN_COLUMNS.keys()) if variables == 'all' else \
+            [variable for variable in variables.replace(' ', '').split(',') if variable in HYCHAN_COLUMNS]
+        VARIABLE_OUTPUTS = {
+            'elevation': {'dir': WATER_LEVEL_DIR, 'file': WATER_LEVEL_FILE, 'variable': 'WaterLevel', 'unit': 'm'},
+            'depth': {'dir': 'water_depth', 'file': 'water_depth.txt'},
+            'velocity': {'dir': 'water_velocity', 'file': 'water_velocity.txt'},
+            'discharge': {'dir': WATER_DISCHARGE_DIR, 'file': WATER_DISCHARGE_FILE,
+                          'variable': 'Discharge', 'unit': 'm3/s'}
+        }
+        print('Extract variables of HYCHAN.OUT :', VARIABLES)
+
+        # Extract only the given channel elements (out of CHANNEL_CELL_MAP), if specified
+        if skipFloodPlain:
+            FLOOD_ELEMENT_NUMBERS = []
+
+        if elements:
+            ELEMENT_NUMBERS = [elementNo for elementNo in elements.replace(' ', '').split(',') if elementNo]
+            unknownElements = [elementNo for elementNo in ELEMENT_NUMBERS if elementNo not in CHANNEL_CELL_MAP]
+            if unknownElements:
+                print('Unknown channel element numbers :', unknownElements,
+                      'Available elements :', list(CHANNEL_CELL_MAP.keys()))
+                usage()
+                sys.exit(2)
+
+        print('Processing FLO2D model on', appDir)
+
+        # Create OUTPUT Directory
+        if not os.path.exists(OUTPUT_DIR_PATH):
+            os.makedirs(OUTPUT_DIR_PATH)
+
+        #################################################################
+        # Extract Flood Plain water elevations from BASE.OUT file       #
+        #################################################################
+        BASE_OUT_FILE_PATH = pjoin(appDir, BASE_OUT_FILE)
+        print('Extract Flood Plain Water Level Result of FLO2D on', date, '@', time,
+              'with Bast time of', start_date, '@', start_time)
+        if len(FLOOD_ELEMENT_NUMBERS) and not os.path.exists(WATER_LEVEL_DIR_PATH):
+            os.makedirs(WATER_LEVEL_DIR_PATH)
+        # NOTE: Flood plain is extracted before the channels (HYCHAN.OUT), since BASE.OUT is written while FLO2D
+        # is running and HYCHAN.OUT only once the run is completed. Thus with --follow, the flood plain timesteps are
+        # extracted and stored as FLO2D writes them, and the channels once the run is completed.
+        # Open the files upfront, thus timesteps are available on the files while following BASE.OUT
+        waterLevelFiles = {}
         for elementNo in FLOOD_ELEMENT_NUMBERS:
             fileName = WATER_LEVEL_FILE.rsplit('.', 1)
-            stationName = FLOOD_PLAIN_CELL_MAP[elementNo].replace(' ', '_')
             fileTimestamp = "%s_%s" % (date, time.replace(':', '-'))
             fileName = "%s-%s-%s.%s" % \
                        (fileName[0], FLOOD_PLAIN_CELL_MAP[elementNo].replace(' ', '_'), fileTimestamp, fileName[1])
-            WATER_LEVEL_FILE_PATH = pjoin(WATER_LEVEL_DIR_PATH, fileName)
-            csvWriter = csv.writer(open(WATER_LEVEL_FILE_PATH, 'w'), delimiter=',', quotechar='|')
-            csvWriter.writerows(waterLevelSeriesDict[elementNo])
-            # Save Forecast values into Database
-            opts = {
+            waterLevelFiles[elementNo] = open(pjoin(WATER_LEVEL_DIR_PATH, fileName), 'w')
+
+        baseTime = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
+        modelTimes = []
+        waterLevelSeriesDict = {elementNo: [] for elementNo in FLOOD_ELEMENT_NUMBERS}
+        waterLevelOpts = {}
+        for elementNo in FLOOD_ELEMENT_NUMBERS:
+            waterLevelOpts[elementNo] = {
                 'forceInsert': forceInsert,
                 'station': FLOOD_PLAIN_CELL_MAP[elementNo],
                 'run_name': runName
             }
             if utcOffset != timedelta():
-                opts['utcOffset'] = utcOffset
-            save_forecast_timeseries(adapter, waterLevelSeriesDict[elementNo], date, time, opts)
-            print('Extracted Cell No', elementNo, FLOOD_PLAIN_CELL_MAP[elementNo], 'into -> ', fileName)
-
-except Exception as e:
-    traceback.print_exc()
-    print(e)
-finally:
-    print('Completed processing', HYCHAN_OUT_FILE_PATH, ' to ', WATER_LEVEL_FILE_PATH)
+                waterLevelOpts[elementNo]['utcOffset'] = utcOffset
+        # Timeseries of all the stations are inserted in batches
+        loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
+        # While following, the timeseries of each day are stored once the day is completed. Days before savedDays
+        # are already stored.
+        savedDays = 0
+        stepDay = None
+        # BASE.OUT is not read if there aren't flood plain stations to extract
+        baseOutResults = []
+        if len(FLOOD_ELEMENT_NUMBERS):
+            baseOutResults = iterBaseOutResults(BASE_OUT_FILE_PATH, follow, idleTimeout=followTimeout,
+                                                buildCache=cacheBaseOut, stopFile=followUntil)
+        for ModelTime, cells, values in baseOutResults:
+            waterLevels = getBaseOutCellValues(cells, values['elevation'], FLOOD_ELEMENT_NUMBERS)
+            # Get Time stamp Ref:http://stackoverflow.com/a/13685221/1461060
+            currentStepTime = baseTime + timedelta(hours=ModelTime)
+            dateAndTime = currentStepTime.strftime("%Y-%m-%d %H:%M:%S")
+
+            modelTimes.append(ModelTime)
+            for elementNo in FLOOD_ELEMENT_NUMBERS:
+                waterLevel = waterLevels[elementNo] if elementNo in waterLevels else MISSING_VALUE
+                waterLevelSeriesDict[elementNo].append(waterLevel)
+                csv.writer(waterLevelFiles[elementNo], delimiter=',', quotechar='|').writerow([dateAndTime, waterLevel])
+                if follow:
+                    waterLevelFiles[elementNo].flush()
+            if follow:
+                print('Extracted Flood Plain Water Levels at', dateAndTime)
+                # A day is completed once a timestep of the next day is written. Same as the days of the database.
+                day = (currentStepTime + utcOffset).date()
+                if stepDay is not None and day != stepDay:
+                    # Timestep of the next day is left out, along with its day. See getForecastTimeseriesInDays
+                    waterLevelTimes = getTimesFromHours(baseTime, modelTimes)
+                    days = savedDays
+                    for elementNo in FLOOD_ELEMENT_NUMBERS:
+                        opts = dict(waterLevelOpts[elementNo], fromDay=savedDays)
+                        days = save_forecast_timeseries(adapter, (waterLevelTimes, waterLevelSeriesDict[elementNo]),
+                                                        date, time, opts, loader)
+                    savedDays = max(savedDays, days)
+                    flushTimeseriesLoader(loader)
+                    print('Stored Flood Plain Water Levels until', stepDay)
+                stepDay = day
+        # -- END for loop
+
+        waterLevelTimes = getTimesFromHours(baseTime, modelTimes)
+        for elementNo in FLOOD_ELEMENT_NUMBERS:
+            waterLevelFiles[elementNo].close()
+            # Save Forecast values into Database
+            opts = dict(waterLevelOpts[elementNo], fromDay=savedDays)
+            save_forecast_timeseries(adapter, (waterLevelTimes, waterLevelSeriesDict[elementNo]), date, time, opts,
+                                     loader)
+            print('Extracted Cell No', elementNo, FLOOD_PLAIN_CELL_MAP[elementNo], 'into -> ',
+                  waterLevelFiles[elementNo].name)
+        print('%s rows inserted.\n' % closeTimeseriesLoader(loader))
+
+        # Check HYCHAN.OUT file exists. HYCHAN.OUT is written once the FLO2D run is completed.
+        if not os.path.exists(HYCHAN_OUT_FILE_PATH):
+            print('Unable to find file : ', HYCHAN_OUT_FILE_PATH)
+            sys.exit()
+
+        #################################################################
+        # Extract Channel Water Level elevations from HYCHAN.OUT file   #
+        #################################################################
+        print('Extract Channel Water Level Result of FLO2D HYCHAN.OUT on', date, '@', time,
+              'with Bast time of', start_date, '@', start_time)
+        baseTime = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
+        # Output CSV files of each element for each variable
+        elementOutputFiles = {}
+        for elementNo in ELEMENT_NUMBERS:
+            elementOutputFiles[elementNo] = {}
+            for variable in VARIABLES:
+                VARIABLE_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (VARIABLE_OUTPUTS[variable]['dir'], outputSuffix))
+                # Create Directory
+                if not os.path.exists(VARIABLE_DIR_PATH):
+                    os.makedirs(VARIABLE_DIR_PATH)
+                fileName = VARIABLE_OUTPUTS[variable]['file'].rsplit('.', 1)
+                stationName = CHANNEL_CELL_MAP[elementNo].replace(' ', '_')
+                fileTimestamp = "%s_%s" % (date, time.replace(':', '-'))
+                fileName = "%s-%s-%s.%s" % (fileName[0], stationName, fileTimestamp, fileName[1])
+                elementOutputFiles[elementNo][variable] = pjoin(VARIABLE_DIR_PATH, fileName)
+
+        # Decode the rows once for all the variables and create files, on the worker processes
+        hychanCache = getHychanCache(HYCHAN_OUT_FILE_PATH, workers=workers)
+        loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
+        for elementNo, variableTimeseries in extractHychanElements(HYCHAN_OUT_FILE_PATH, elementOutputFiles, baseTime,
+                                                                   workers, hychanCache):
+            print('Extracted Cell No', elementNo, CHANNEL_CELL_MAP[elementNo])
+            for variable in VARIABLES:
+                timeseries = variableTimeseries[variable]
+                variableOutput = VARIABLE_OUTPUTS[variable]
+                WATER_LEVEL_FILE_PATH = elementOutputFiles[elementNo][variable]
+                # Save Forecast values into Database
+                if 'variable' not in variableOutput:
+                    continue
+                opts = {
+                    'forceInsert': forceInsert,
+                    'station': CHANNEL_CELL_MAP[elementNo],
+                    'run_name': runName,
+                    'variable': variableOutput['variable'],
+                    'unit': variableOutput['unit']
+                }
+                print('>>>>>', opts)
+                if utcOffset != timedelta():
+                    opts['utcOffset'] = utcOffset
+                save_forecast_timeseries(adapter, timeseries, date, time, opts, loader)
+        print('%s rows inserted.\n' % closeTimeseriesLoader(loader))
+
+        # Extract every channel element of CHAN.DAT into a single time x element file for each variable
+        if allChannels:
+            CHAN_DAT_FILE_PATH = pjoin(appDir, CHAN_DAT_FILE)
+            if not os.path.exists(CHAN_DAT_FILE_PATH):
+                print('Unable to find file : ', CHAN_DAT_FILE_PATH)
+                sys.exit()
+            channelElements = getChannelElements(CHAN_DAT_FILE_PATH)
+            for variable in VARIABLES:
+                VARIABLE_DIR_PATH = pjoin(OUTPUT_DIR_PATH, "%s-%s" % (VARIABLE_OUTPUTS[variable]['dir'], outputSuffix))
+                if not os.path.exists(VARIABLE_DIR_PATH):
+                    os.makedirs(VARIABLE_DIR_PATH)
+                fileName = VARIABLE_OUTPUTS[variable]['file'].rsplit('.', 1)
+                fileTimestamp = "%s_%s" % (date, time.replace(':', '-'))
+                fileName = "%s-all_channels-%s.csv" % (fileName[0], fileTimestamp)
+                columns = writeHychanMatrix(pjoin(VARIABLE_DIR_PATH, fileName), hychanCache, channelElements,
+                                            variable, baseTime, MISSING_VALUE)
+                print('Extracted', len(columns), 'of', len(channelElements), 'channel elements into ->', fileName)
+
+    except Exception as e:
+        traceback.print_exc()
+        print(e)
+    finally:
+        if pool is not None:
+            closeAdapterPool(pool)
+        print('Completed processing', HYCHAN_OUT_FILE_PATH, ' to ', WATER_LEVEL_FILE_PATH)
@@ -0,0 +1,339 @@
+#!/usr/bin/python3
+
+import bisect
+import json
+import mmap
+import os
+import re
+import time
+
+import numpy as np
+
+from LIBFLO2DCACHE import loadCache
+from LIBFLO2DCACHE import saveCache
+from LIBFLO2DDECODE import decodeNumericRows
+
+BASE_OUT_TIMESTEP_HEADER = 'MODEL TIME ='
+BASE_OUT_CHANNEL_RESULTS = '***CHANNEL RESULTS***'
+BASE_OUT_INDEX_SUFFIX = '.idx'
+# Column index of each variable in the flood plain rows of a timestep block. Column 0 is the cell number.
+BASE_OUT_COLUMNS = {
+    'elevation': 1,
+    'depth': 2
+}
+# Flood plain rows of a timestep block start after the "MODEL TIME =" line and 5 more lines,
+# and end on the first empty line
+BASE_OUT_SKIP_LINES = 6
+BASE_OUT_EMPTY_LINE = re.compile(rb'\n\r?\n')
+
+
+def findMarkerLine(buffer, marker, column, start=0):
+    """
+    Find the start of the first line of buffer, from start, which has the marker at the given column.
+    E.g. findMarkerLine(buffer, b'MODEL TIME =', 5)
+
+    :return: Offset of the line or -1 if there isn't such a line
+    """
+    while True:
+        k = buffer.find(marker, start)
+        if k < 0:
+            return -1
+        lineStart = buffer.rfind(b'\n', 0, k) + 1
+        if k - lineStart == column:
+            return lineStart
+        start = k + 1
+
+
+def decodeBaseOutRows(block):
+    """
+    Decode the flood plain rows of a "MODEL TIME =" block into a float64 array (cells x columns) in one step.
+    Rows which do not have the same number of valid values as the first row (e.g. a truncated row) are skipped.
+    See decodeNumericRows
+
+    :param bytes block: "MODEL TIME =" block
+    :return: numpy array of shape (cells, columns)
+    """
+    dataStart = 0
+    for i in range(BASE_OUT_SKIP_LINES):
+        dataStart = block.find(b'\n', dataStart) + 1
+        if not dataStart:
+            return np.empty((0, len(BASE_OUT_COLUMNS) + 1))
+    emptyLine = BASE_OUT_EMPTY_LINE.search(block, dataStart - 1)
+    data = block[dataStart:emptyLine.start() + 1 if emptyLine else len(block)]
+    if not data.strip():
+        return np.empty((0, len(BASE_OUT_COLUMNS) + 1))
+
+    return decodeNumericRows(data)
+
+
+def isInTimeWindow(modelTime, startTime=None, endTime=None):
+    return (startTime is None or modelTime >= startTime) and (endTime is None or modelTime <= endTime)
+
+
+def isFollowStopped(stopFile):
+    return stopFile is not None and os.path.exists(stopFile)
+
+
+def iterBaseOutTimesteps(baseOutFilePath, follow=False, pollInterval=10, idleTimeout=600, bufsize=1048576,
+                         startTime=None, endTime=None, stopFile=None):
+    """
+    Stream BASE.OUT and yield each "MODEL TIME =" block once the block is complete,
+    i.e. when the "***CHANNEL RESULTS***" line of the block has been read.
+    The flood plain rows of the block are decoded at once into a float array (see decodeBaseOutRows),
+    and only the current block is kept in memory. Thus memory usage does not depend on the length of the run.
+
+    :param string baseOutFilePath: Path of BASE.OUT file
+    :param boolean follow: Keep reading new timesteps while FLO2D is still writing BASE.OUT (like `tail -f`),
+    until BASE.OUT does not grow for idleTimeout seconds. Also wait for BASE.OUT to be created.
+    :param int pollInterval: Seconds to wait before checking for new content of BASE.OUT, in follow mode
+    :param int idleTimeout: Seconds to wait for BASE.OUT to grow before stop following
+    :param int bufsize: Read buffer size
+    :param float startTime: Skip the timesteps before given model time (in hours) without decoding them
+    :param float endTime: Stop after given model time (in hours)
+    :param string stopFile: Follow BASE.OUT until this file exists (e.g. created once FLO2D is completed),
+    instead of until idleTimeout. The rest of BASE.OUT is read before stop.
+    :return: Generator of (modelTime, cells, values) where modelTime is in hours, cells is the int64 array of
+    cell numbers and values is a dict of variable -> float64 array of cells, for each of BASE_OUT_COLUMNS
+    """
+    idleSince = time.time()
+    while follow and not os.path.exists(baseOutFilePath) and not isFollowStopped(stopFile) and \
+            (stopFile is not None or time.time() - idleSince < idleTimeout):
+        time.sleep(pollInterval)
+    if not os.path.exists(baseOutFilePath):
+        print('Unable to find file : ', baseOutFilePath)
+        return
+
+    header = BASE_OUT_TIMESTEP_HEADER.encode()
+    channelResults = BASE_OUT_CHANNEL_RESULTS.encode()
+    with open(baseOutFilePath, 'rb') as infile:
+        buffer = b''
+        # Offset of the buffer which is not processed yet
+        position = 0
+        idleSince = time.time()
+        following = follow
+        while True:
+            blockStart = findMarkerLine(buffer, header, 5, position)
+            blockEnd = findMarkerLine(buffer, channelResults, 17, blockStart) if blockStart > -1 else -1
+            if blockEnd > -1:
+                position = blockEnd
+                lineEnd = buffer.find(b'\n', blockStart)
+                modelTime = float(buffer[blockStart:lineEnd].split()[3])
+                if endTime is not None and modelTime > endTime:
+                    return
+                if not isInTimeWindow(modelTime, startTime, endTime):
+                    continue
+                data = decodeBaseOutRows(buffer[blockStart:blockEnd])
+                values = {variable: data[:, column] if column < data.shape[1] else np.full(len(data), np.nan)
+                          for variable, column in BASE_OUT_COLUMNS.items()}
+                yield modelTime, data[:, 0].astype(np.int64), values
+                continue
+
+            chunk = infile.read(bufsize)
+            if not chunk:
+                if following and isFollowStopped(stopFile):
+                    # Read once more, the timesteps which are written before the stop file was created
+                    following = False
+                    continue
+                if following and (stopFile is not None or time.time() - idleSince < idleTimeout):
+                    time.sleep(pollInterval)
+                    continue
+                break
+            idleSince = time.time()
+            # Keep only the current block, or the last line which might be the start of the next block
+            keepFrom = blockStart if blockStart > -1 else max(position, buffer.rfind(b'\n') + 1)
+            buffer = buffer[keepFrom:] + chunk
+            position = 0
+        # -- END while loop
+
+
+def buildBaseOutIndex(baseOutFilePath):
+    """
+    Build the byte offset index of BASE.OUT "MODEL TIME =" blocks, by only looking for the block markers.
+    E.g. {'size': 3256411, 'mtime': 1508332213.5, 'times': [0.25, 0.5, ...], 'offsets': [[0, 82451], ...]}
+    """
+    stat = os.stat(baseOutFilePath)
+    header = BASE_OUT_TIMESTEP_HEADER.encode()
+    channelResults = BASE_OUT_CHANNEL_RESULTS.encode()
+    times = []
+    offsets = []
+    if stat.st_size:
+        with open(baseOutFilePath, 'rb') as infile:
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                blockStart = findMarkerLine(buffer, header, 5)
+                while blockStart > -1:
+                    blockEnd = findMarkerLine(buffer, channelResults, 17, blockStart)
+                    if blockEnd < 0:
+                        break
+                    times.append(float(buffer[blockStart:buffer.find(b'\n', blockStart)].split()[3]))
+                    offsets.append([blockStart, blockEnd])
+                    blockStart = findMarkerLine(buffer, header, 5, blockEnd)
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'times': times,
+        'offsets': offsets
+    }
+
+
+def getBaseOutIndex(baseOutFilePath, rebuild=False):
+    """
+    Get the byte offset index of BASE.OUT timesteps from the sidecar file (BASE.OUT.idx).
+    The index is rebuilt and stored again if BASE.OUT size or modified time has been changed.
+    """
+    index_file_path = baseOutFilePath + BASE_OUT_INDEX_SUFFIX
+    stat = os.stat(baseOutFilePath)
+    if not rebuild and os.path.exists(index_file_path):
+        with open(index_file_path) as index_file:
+            index = json.load(index_file)
+        if index.get('size') == stat.st_size and index.get('mtime') == stat.st_mtime:
+            return index
+        print('BASE.OUT index is outdated. Rebuilding :', index_file_path)
+
+    index = buildBaseOutIndex(baseOutFilePath)
+    try:
+        with open(index_file_path, 'w') as index_file:
+            json.dump(index, index_file)
+    except OSError as e:
+        print('WARNING: Unable to store BASE.OUT index :', index_file_path, e)
+
+    return index
+
+
+def readBaseOutTimesteps(baseOutFilePath, startTime=None, endTime=None, index=None):
+    """
+    Read the timesteps of BASE.OUT within the time window by seeking to them via the byte offset index,
+    instead of parsing the timesteps before the window. E.g. seek to the model state time after the warm-up period.
+
+    :param string baseOutFilePath: Path of BASE.OUT file
+    :param float startTime: Model time (in hours) of the first timestep. If None, start from the first timestep.
+    :param float endTime: Model time (in hours) of the last timestep. If None, read until the last timestep.
+    :param dict index: Byte offset index. Default is loaded with getBaseOutIndex.
+    :return: Generator of (modelTime, cells, values). See iterBaseOutTimesteps
+    """
+    if index is None:
+        index = getBaseOutIndex(baseOutFilePath)
+    times = index['times']
+    first = 0 if startTime is None else bisect.bisect_left(times, startTime)
+    last = len(times) if endTime is None else bisect.bisect_right(times, endTime)
+    if first >= last:
+        return
+
+    with open(baseOutFilePath, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for step in range(first, last):
+                start, end = index['offsets'][step]
+                data = decodeBaseOutRows(buffer[start:end])
+                values = {variable: data[:, column] if column < data.shape[1] else np.full(len(data), np.nan)
+                          for variable, column in BASE_OUT_COLUMNS.items()}
+                yield times[step], data[:, 0].astype(np.int64), values
+
+
+def buildBaseOutCache(baseOutFilePath):
+    """
+    Decode all the timesteps of BASE.OUT into columnar arrays.
+    Cells are taken from the first timestep. If a cell is missing on a timestep, its value is NaN.
+
+    :return: dict with 'times' (hours), 'cells' and a (timesteps x cells) array for each of BASE_OUT_COLUMNS
+    """
+    times = []
+    cells = None
+    cellIndex = None
+    series = {}
+    for modelTime, blockCells, values in iterBaseOutTimesteps(baseOutFilePath):
+        if cells is None:
+            cells = blockCells
+            cellIndex = {cellNo: k for k, cellNo in enumerate(cells.tolist())}
+            series = {variable: np.empty((64, len(cells))) for variable in BASE_OUT_COLUMNS}
+        step = len(times)
+        times.append(modelTime)
+        for variable in BASE_OUT_COLUMNS:
+            if step >= len(series[variable]):
+                series[variable] = np.concatenate((series[variable], np.empty_like(series[variable])))
+            if np.array_equal(blockCells, cells):
+                series[variable][step] = values[variable]
+                continue
+            series[variable][step] = np.nan
+            for cellNo, value in zip(blockCells.tolist(), values[variable].tolist()):
+                if cellNo in cellIndex:
+                    series[variable][step, cellIndex[cellNo]] = value
+
+    if cells is None:
+        cells = np.empty(0, dtype=np.int64)
+    cache = {
+        'times': np.array(times, dtype=np.float64),
+        'cells': cells
+    }
+    for variable in BASE_OUT_COLUMNS:
+        cache[variable] = series[variable][:len(times)] if len(times) else np.empty((0, 0))
+
+    return cache
+
+
+def getBaseOutCache(baseOutFilePath, rebuild=False):
+    """
+    Get the decoded timesteps of BASE.OUT from the cache file (BASE.OUT.npz), instead of parsing the text.
+    The cache is built and stored if it does not exist or BASE.OUT has been changed. See LIBFLO2DCACHE.loadCache
+
+    :return: dict of arrays. See buildBaseOutCache
+    """
+    cache = None if rebuild else loadCache(baseOutFilePath)
+    if cache is None:
+        print('Building BASE.OUT cache of', baseOutFilePath)
+        cache = buildBaseOutCache(baseOutFilePath)
+        saveCache(baseOutFilePath, cache)
+
+    return cache
+
+
+def iterBaseOutResults(baseOutFilePath, follow=False, pollInterval=10, idleTimeout=600, startTime=None, endTime=None,
+                       buildCache=False, stopFile=None):
+    """
+    Iterate through the decoded timesteps of BASE.OUT.
+    The timesteps are taken from the BASE.OUT cache, if a valid cache already exists. Otherwise BASE.OUT is streamed
+    (see iterBaseOutTimesteps), or if a time window is given, only the timesteps of the window are decoded
+    by seeking to them (see readBaseOutTimesteps). While following BASE.OUT, each timestep is decoded
+    as soon as it is written, since the cache can only be built on a completed run.
+
+    :param float startTime: Model time (in hours) of the first timestep. E.g. model state time after warm-up period
+    :param float endTime: Model time (in hours) of the last timestep
+    :param boolean buildCache: Build the BASE.OUT cache (see getBaseOutCache) if there isn't a valid one,
+    for the later reads of the same run
+    :param string stopFile: While following, stop once this file exists. See iterBaseOutTimesteps
+    :return: Generator of (modelTime, cells, values) where values is a dict of variable -> float64 array of cells
+    """
+    if follow:
+        for modelTime, cells, values in iterBaseOutTimesteps(baseOutFilePath, follow, pollInterval, idleTimeout,
+                                                             startTime=startTime, endTime=endTime, stopFile=stopFile):
+            yield modelTime, cells, values
+        return
+
+    if not os.path.exists(baseOutFilePath):
+        print('Unable to find file : ', baseOutFilePath)
+        return
+    cache = getBaseOutCache(baseOutFilePath) if buildCache else loadCache(baseOutFilePath)
+    if cache is None:
+        if startTime is not None or endTime is not None:
+            timesteps = readBaseOutTimesteps(baseOutFilePath, startTime, endTime)
+        else:
+            timesteps = iterBaseOutTimesteps(baseOutFilePath)
+        for modelTime, cells, values in timesteps:
+            yield modelTime, cells, values
+        return
+    for t, modelTime in enumerate(cache['times'].tolist()):
+        if isInTimeWindow(modelTime, startTime, endTime):
+            yield modelTime, cache['cells'], {variable: cache[variable][t] for variable in BASE_OUT_COLUMNS}
+
+
+def getBaseOutCellValues(cells, values, cellNumbers):
+    """
+    Get the values of given set of cells out of a decoded timestep. Cells without a valid value are skipped.
+
+    :param cells: Cell numbers of the timestep
+    :param values: float64 array of a variable of the timestep. E.g. values['elevation'] of iterBaseOutResults
+    :param cellNumbers: Cell numbers (as strings) which need to extract. E.g. FLOOD_PLAIN_CELL_MAP keys
+    :return: dict of cellNo (as string) -> value
+    """
+    selected = np.flatnonzero(np.isin(cells, [int(cellNo) for cellNo in cellNumbers]))
+    selected = selected[np.isfinite(values[selected])]
+    return dict(zip([str(cellNo) for cellNo in cells[selected].tolist()], values[selected].tolist()))
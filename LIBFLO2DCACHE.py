@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+
+import hashlib
+import os
+
+import numpy as np
+
+# Cache of the parsed FLO2D output is stored next to the output file. E.g. HYCHAN.OUT -> HYCHAN.OUT.npz
+CACHE_SUFFIX = '.npz'
+CACHE_KEY_FIELDS = ('sourceSize', 'sourceMtime', 'sourceHash')
+
+
+def getFileHash(filePath, bufsize=1048576):
+    """
+    Get the SHA256 hash of the content of given file.
+    """
+    sha256 = hashlib.sha256()
+    with open(filePath, 'rb') as infile:
+        while True:
+            block = infile.read(bufsize)
+            if not block:
+                break
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def getCacheFilePath(sourceFilePath):
+    return sourceFilePath + CACHE_SUFFIX
+
+
+def loadCache(sourceFilePath, verifyHash=False):
+    """
+    Load the cached columnar arrays of given FLO2D output file.
+    The cache is valid if the size and modified time of the source file are same as when the cache was created.
+    If only the modified time has been changed (e.g. copied the run directory), the content hash is compared.
+
+    :param string sourceFilePath: Path of the FLO2D output file. E.g. HYCHAN.OUT
+    :param boolean verifyHash: Always compare the content hash. Use for small files such as CADPTS.DAT
+    :return: dict of name -> numpy array, or None if there isn't a valid cache
+    """
+    cacheFilePath = getCacheFilePath(sourceFilePath)
+    if not os.path.exists(cacheFilePath) or not os.path.exists(sourceFilePath):
+        return None
+    try:
+        with np.load(cacheFilePath, allow_pickle=False) as npz:
+            cache = {name: npz[name] for name in npz.files}
+    except Exception as e:
+        print('WARNING: Unable to load cache :', cacheFilePath, e)
+        return None
+    if any(field not in cache for field in CACHE_KEY_FIELDS):
+        return None
+
+    stat = os.stat(sourceFilePath)
+    if int(cache['sourceSize']) != stat.st_size:
+        print('Cache is outdated :', cacheFilePath)
+        return None
+    if (verifyHash or float(cache['sourceMtime']) != stat.st_mtime) and \
+            str(cache['sourceHash']) != getFileHash(sourceFilePath):
+        print('Cache is outdated :', cacheFilePath)
+        return None
+
+    return cache
+
+
+def saveCache(sourceFilePath, arrays):
+    """
+    Store the parsed columnar arrays of given FLO2D output file next to it, along with the size, modified time
+    and content hash of the file which are used to validate the cache.
+
+    :param string sourceFilePath: Path of the FLO2D output file. E.g. HYCHAN.OUT
+    :param dict arrays: name -> numpy array
+    """
+    cacheFilePath = getCacheFilePath(sourceFilePath)
+    stat = os.stat(sourceFilePath)
+    cache = dict(arrays)
+    cache['sourceSize'] = np.array(stat.st_size)
+    cache['sourceMtime'] = np.array(stat.st_mtime)
+    cache['sourceHash'] = np.array(getFileHash(sourceFilePath))
+    try:
+        # Write into a temporary file first, thus a partially written cache is never loaded
+        tmpFilePath = cacheFilePath + '.tmp'
+        with open(tmpFilePath, 'wb') as outfile:
+            np.savez(outfile, **cache)
+        os.replace(tmpFilePath, cacheFilePath)
+    except OSError as e:
+        print('WARNING: Unable to store cache :', cacheFilePath, e)
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+
+import io
+
+import numpy as np
+
+# Characters of the numeric rows of the FLO2D output files. E.g. '0.25 -1.2E+01 NaN'
+NUMERIC_CHARS = b'0123456789.+-eE \t\r\nNa'
+
+
+def decodeNumericRows(data):
+    """
+    Decode whitespace separated numeric rows into a float64 2-D array (rows x columns) with a single C-level parse.
+    Used by the HYCHAN.OUT and BASE.OUT decoders.
+    The rows are parsed with np.loadtxt only if all the characters are in NUMERIC_CHARS. Otherwise (e.g. overflowed
+    '*****' values or a truncated row) they are parsed with np.genfromtxt, where invalid values are decoded as NaN
+    and rows which do not have the same number of values as the first row are skipped.
+
+    :param bytes data: Numeric rows, starting with a row. E.g. timestep rows of a HYCHAN.OUT element block
+    :return: numpy array of shape (rows, columns)
+    """
+    lineEnd = data.find(b'\n')
+    numCols = len(data[:lineEnd if lineEnd > -1 else len(data)].split())
+    if not data.translate(None, NUMERIC_CHARS):
+        try:
+            return np.loadtxt(io.BytesIO(data), dtype=np.float64, comments=None, ndmin=2)
+        except ValueError:
+            # Rows with different number of values
+            pass
+    return np.genfromtxt(io.BytesIO(data), dtype=np.float64, usecols=range(numCols), invalid_raise=False, ndmin=2)
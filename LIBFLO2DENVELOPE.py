@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+import numpy as np
+
+# Depths (in meters) of the flood depth thresholds, for which the duration above the threshold is computed
+ENVELOPE_DEPTH_THRESHOLDS = [0.5, 1.0]
+
+
+def openEnvelope(size, thresholds=None, startTime=None):
+    """
+    Create the running flood envelope of the grids, to be updated with updateEnvelope for each timestep.
+
+    :param int size: Number of the cells of the flattened grid, i.e. rows * cols
+    :param list thresholds: Flood depth thresholds in meters. Default is ENVELOPE_DEPTH_THRESHOLDS
+    :param float startTime: Model time (in hours) of the start of the time window.
+    Each timestep accounts for the time since the previous timestep, or since startTime for the first timestep.
+    :return: dict of the envelope state
+    """
+    thresholds = ENVELOPE_DEPTH_THRESHOLDS if thresholds is None else thresholds
+    return {
+        'lastTime': startTime,
+        'maxDepth': np.full(size, np.nan),
+        'peakTime': np.full(size, np.nan),
+        'firstWetTime': np.full(size, np.nan),
+        'thresholds': list(thresholds),
+        'durations': [np.zeros(size) for threshold in thresholds]
+    }
+
+
+def updateEnvelope(envelope, modelTime, grid):
+    """
+    Update the envelope with the grid of a timestep.
+
+    :param float modelTime: Model time in hours
+    :param grid: float64 array of the flattened grid, where the cells without a value are NaN.
+    E.g. from LIBFLO2DWATERLEVELGRID.getGridOfValues
+    """
+    maxDepth = envelope['maxDepth']
+    peaked = (grid > maxDepth) | (np.isnan(maxDepth) & ~np.isnan(grid))
+    maxDepth[peaked] = grid[peaked]
+    envelope['peakTime'][peaked] = modelTime
+    envelope['firstWetTime'][np.isnan(envelope['firstWetTime']) & (grid > 0)] = modelTime
+
+    lastTime = envelope['lastTime']
+    interval = modelTime - lastTime if lastTime is not None and modelTime > lastTime else 0.0
+    for threshold, duration in zip(envelope['thresholds'], envelope['durations']):
+        duration[grid > threshold] += interval
+    envelope['lastTime'] = modelTime
+
+
+def getEnvelopeGrids(envelope):
+    """
+    Get the flood envelope grids. The cells which never had a value are NaN.
+
+    :return: dict of name -> float64 array of the flattened grid.
+    'max_depth' (m), 'peak_time' and 'first_wet_time' (model time in hours, NaN if never wet) and
+    'duration_above_<threshold>' (hours) for each threshold
+    """
+    maxDepth = envelope['maxDepth']
+    seen = ~np.isnan(maxDepth)
+    grids = {
+        'max_depth': maxDepth,
+        'peak_time': np.where(maxDepth > 0, envelope['peakTime'], np.nan),
+        'first_wet_time': envelope['firstWetTime']
+    }
+    for threshold, duration in zip(envelope['thresholds'], envelope['durations']):
+        grids['duration_above_%s' % threshold] = np.where(seen, duration, np.nan)
+
+    return grids
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+
+import datetime
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from Util.LibForecastTimeseries import getTimesFromHours
+
+# Water depth cube of a run, in a single file: (timesteps x rows x cols) grids split into chunks of
+# CUBE_TIME_CHUNK timesteps and CUBE_TILE_SIZE x CUBE_TILE_SIZE cells, each compressed with zlib.
+# Layout: CUBE_MAGIC, compressed chunks, JSON header (coordinates, time axis and the chunk table),
+# header length as 8 bytes little endian unsigned integer, CUBE_MAGIC.
+CUBE_SUFFIX = '.cube'
+CUBE_MAGIC = b'FLO2DCUBE1'
+CUBE_DTYPE = '<f8'
+CUBE_TIME_CHUNK = 24
+CUBE_TILE_SIZE = 64
+CUBE_COMPRESS_LEVEL = 6
+
+
+def openCubeWriter(cubeFilePath, boudary, cols, rows, baseTime, gap=250.0, missingVal=-9,
+                   timeChunk=CUBE_TIME_CHUNK, tileSize=CUBE_TILE_SIZE):
+    """
+    Create a water depth cube file and return the writer to be used with appendCubeTimestep and closeCubeWriter.
+    The coordinate header is same as of the Esri grid. See LIBFLO2DWATERLEVELGRID.getEsriGridHeader
+
+    :param boudary: Grid boundary returned from getGridBoudary
+    :param datetime baseTime: Base time of the FLO2D model run, i.e. model time 0
+    :return: dict of the writer state
+    """
+    cubeFile = open(cubeFilePath + '.tmp', 'wb')
+    cubeFile.write(CUBE_MAGIC)
+    return {
+        'filePath': cubeFilePath,
+        'file': cubeFile,
+        'header': {
+            'ncols': cols,
+            'nrows': rows,
+            'xllcorner': boudary['long_min'] - 125,
+            'yllcorner': boudary['lat_min'] - 125,
+            'cellsize': gap,
+            'NODATA_value': missingVal,
+            'dtype': CUBE_DTYPE,
+            'baseTime': baseTime.strftime('%Y-%m-%d %H:%M:%S'),
+            'modelTimes': [],
+            'timeChunk': timeChunk,
+            'tileSize': tileSize,
+            'chunks': []
+        },
+        'buffer': np.empty((timeChunk, rows, cols), dtype=CUBE_DTYPE),
+        'buffered': 0
+    }
+
+
+def flushCubeWriter(writer):
+    header, buffered = writer['header'], writer['buffered']
+    if not buffered:
+        return
+    t0 = len(header['modelTimes']) - buffered
+    tileSize = header['tileSize']
+    for r0 in range(0, header['nrows'], tileSize):
+        for c0 in range(0, header['ncols'], tileSize):
+            tile = np.ascontiguousarray(writer['buffer'][:buffered, r0:r0 + tileSize, c0:c0 + tileSize])
+            data = zlib.compress(tile.tobytes(), CUBE_COMPRESS_LEVEL)
+            header['chunks'].append([t0, r0, c0, writer['file'].tell(), len(data)])
+            writer['file'].write(data)
+    writer['buffered'] = 0
+
+
+def appendCubeTimestep(writer, modelTime, grid):
+    """
+    Append the grid of a timestep into the cube.
+
+    :param float modelTime: Model time in hours
+    :param grid: float64 array of rows x cols (or flattened). NaN values are stored as NODATA_value.
+    """
+    header = writer['header']
+    values = writer['buffer'][writer['buffered']]
+    np.copyto(values, np.reshape(grid, values.shape))
+    values[np.isnan(values)] = header['NODATA_value']
+    header['modelTimes'].append(float(modelTime))
+    writer['buffered'] += 1
+    if writer['buffered'] == header['timeChunk']:
+        flushCubeWriter(writer)
+
+
+def closeCubeWriter(writer):
+    """
+    Write the remaining timesteps and the header. The cube file is replaced only once it is complete.
+    """
+    flushCubeWriter(writer)
+    header = json.dumps(writer['header']).encode()
+    writer['file'].write(header)
+    writer['file'].write(struct.pack('<Q', len(header)))
+    writer['file'].write(CUBE_MAGIC)
+    writer['file'].close()
+    os.replace(writer['filePath'] + '.tmp', writer['filePath'])
+
+
+def openCube(cubeFilePath):
+    """
+    Memory map the cube file and read its header. Chunks are only decompressed when they are read.
+
+    :return: dict with 'header', 'times' (datetime64) and the memory mapped 'buffer'. Close with closeCube.
+    """
+    with open(cubeFilePath, 'rb') as infile:
+        buffer = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    footer = len(CUBE_MAGIC) + 8
+    if buffer[:len(CUBE_MAGIC)] != CUBE_MAGIC or buffer[-len(CUBE_MAGIC):] != CUBE_MAGIC:
+        buffer.close()
+        raise ValueError('Invalid water depth cube file : %s' % cubeFilePath)
+    headerLength = struct.unpack('<Q', buffer[-footer:-len(CUBE_MAGIC)])[0]
+    header = json.loads(buffer[-footer - headerLength:-footer].decode())
+    baseTime = datetime.datetime.strptime(header['baseTime'], '%Y-%m-%d %H:%M:%S')
+
+    return {
+        'header': header,
+        'times': getTimesFromHours(baseTime, header['modelTimes']),
+        'buffer': buffer,
+        'chunks': {(t0, r0, c0): (offset, length) for t0, r0, c0, offset, length in header['chunks']}
+    }
+
+
+def closeCube(cube):
+    cube['buffer'].close()
+
+
+def readCubeChunk(cube, t0, r0, c0):
+    header = cube['header']
+    offset, length = cube['chunks'][(t0, r0, c0)]
+    shape = (min(header['timeChunk'], len(header['modelTimes']) - t0),
+             min(header['tileSize'], header['nrows'] - r0),
+             min(header['tileSize'], header['ncols'] - c0))
+    data = zlib.decompress(cube['buffer'][offset:offset + length])
+    return np.frombuffer(data, dtype=header['dtype']).reshape(shape)
+
+
+def readCubeTimestep(cube, step):
+    """
+    Read the grid of a timestep, by decompressing only the chunks of that timestep.
+
+    :param int step: Index of the timestep on cube['times']
+    :return: float64 array of rows x cols. Same as the values of the Esri grid of the timestep.
+    """
+    header = cube['header']
+    timeChunk, tileSize = header['timeChunk'], header['tileSize']
+    t0 = step - step % timeChunk
+    grid = np.empty((header['nrows'], header['ncols']))
+    for r0 in range(0, header['nrows'], tileSize):
+        for c0 in range(0, header['ncols'], tileSize):
+            tile = readCubeChunk(cube, t0, r0, c0)
+            grid[r0:r0 + tile.shape[1], c0:c0 + tile.shape[2]] = tile[step - t0]
+
+    return grid
+
+
+def readCubeSeries(cube, rows, cols):
+    """
+    Read the time series of given set of cells, by decompressing only the chunks which contain the cells.
+    Each chunk is decompressed once, even if it contains many of the cells.
+
+    :param rows: Row index (j) of the cells on the grid. E.g. from LIBFLO2DWATERLEVELGRID.getCellGrid
+    :param cols: Column index (i) of the cells on the grid
+    :return: float64 array of timesteps x cells
+    """
+    header = cube['header']
+    timeChunk, tileSize = header['timeChunk'], header['tileSize']
+    rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+    series = np.empty((len(header['modelTimes']), len(rows)))
+    tileRows, tileCols = rows - rows % tileSize, cols - cols % tileSize
+    for r0, c0 in sorted(set(zip(tileRows.tolist(), tileCols.tolist()))):
+        selected = np.flatnonzero((tileRows == r0) & (tileCols == c0))
+        for t0 in range(0, len(header['modelTimes']), timeChunk):
+            tile = readCubeChunk(cube, t0, r0, c0)
+            series[t0:t0 + len(tile), selected] = tile[:, rows[selected] - r0, cols[selected] - c0]
+
+    return series
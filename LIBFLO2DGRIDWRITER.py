@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+import queue
+import threading
+
+from LIBFLO2DWATERLEVELGRID import writeEsriGridFile
+
+# Number of grids which can wait to be written. The parser blocks when the queue is full, thus memory is bounded.
+GRID_WRITER_QUEUE_SIZE = 8
+
+
+def gridWriterWorker(writer):
+    while True:
+        task = writer['queue'].get()
+        try:
+            if task is None:
+                return
+            writeEsriGridFile(*task)
+        except Exception as e:
+            writer['errors'].append(e)
+        finally:
+            writer['queue'].task_done()
+
+
+def startGridWriter(workers=1, queueSize=GRID_WRITER_QUEUE_SIZE):
+    """
+    Start the threads which format and write the grid files, while the parser decodes the next timesteps.
+
+    :param int workers: Number of writer threads. If 0, the grids are written on putGridFile itself.
+    :param int queueSize: Number of grids which can wait to be written, before putGridFile blocks.
+    :return: dict of the writer state. Stop with stopGridWriter.
+    """
+    writer = {
+        'queue': queue.Queue(maxsize=max(queueSize, 1)),
+        'threads': [],
+        'errors': []
+    }
+    for i in range(workers):
+        thread = threading.Thread(target=gridWriterWorker, args=(writer,), daemon=True)
+        thread.start()
+        writer['threads'].append(thread)
+
+    return writer
+
+
+def putGridFile(writer, filePath, grid, cols, rows, boudary, gap=250.0, missingVal=-9):
+    """
+    Queue the grid to be written into the file as an Esri grid. See LIBFLO2DWATERLEVELGRID.writeEsriGridFile
+    The grid is copied, thus the caller can reuse its buffer.
+    """
+    if writer['errors']:
+        raise writer['errors'][0]
+    task = (filePath, grid.copy(), cols, rows, boudary, gap, missingVal)
+    if not writer['threads']:
+        writeEsriGridFile(*task)
+        return
+    writer['queue'].put(task)
+
+
+def stopGridWriter(writer):
+    """
+    Wait until all the queued grids are written and stop the threads.
+    Raise the first error of the writer threads, if any.
+    """
+    for thread in writer['threads']:
+        writer['queue'].put(None)
+    for thread in writer['threads']:
+        thread.join()
+    if writer['errors']:
+        raise writer['errors'][0]
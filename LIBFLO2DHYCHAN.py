@@ -0,0 +1,411 @@
+#!/usr/bin/python3
+
+import csv
+import json
+import mmap
+import multiprocessing
+import os
+import numpy as np
+
+from LIBFLO2DCACHE import loadCache
+from LIBFLO2DCACHE import saveCache
+from LIBFLO2DDECODE import decodeNumericRows
+from Util.LibForecastTimeseries import formatTimeseries
+from Util.LibForecastTimeseries import getTimesFromHours
+
+HYCHAN_ELEMENT_HEADER = 'CHANNEL HYDROGRAPH FOR ELEMENT NO:'
+HYCHAN_INDEX_SUFFIX = '.idx'
+# Column index of each variable in the timestep rows of HYCHAN.OUT. Column 0 is the model time in hours.
+HYCHAN_COLUMNS = {
+    'elevation': 1,
+    'depth': 2,
+    'velocity': 3,
+    'discharge': 4
+}
+# Channel element lines of CHAN.DAT start with the cross section shape. Rectangular, Variable area, Trapezoidal, Natural
+CHAN_DAT_SHAPES = ('R', 'V', 'T', 'N')
+
+
+def isTimeStepRow(line):
+    """
+    Check whether given HYCHAN.OUT line is a timestep row of an element block.
+    E.g. '    0.25    1.234    0.456 ...' -> True, '    TIME    ELEV ...' -> False
+    Works with both str and bytes lines.
+    """
+    cols = line.split(None, 1)
+    if len(cols) < 1:
+        return False
+    dot = b'.' if isinstance(line, bytes) else '.'
+    return cols[0].replace(dot, dot[:0], 1).isdigit()
+
+
+def getChannelElements(chanDatFilePath):
+    """
+    Get all the channel element numbers of the channel network from CHAN.DAT, in the order of CHAN.DAT.
+    E.g. 'R              2158         0.040 ...' -> '2158'
+
+    :param string chanDatFilePath: Path of CHAN.DAT file
+    :return: list of element numbers as strings
+    """
+    elements = []
+    with open(chanDatFilePath) as infile:
+        for line in infile:
+            cols = line.split()
+            if len(cols) > 1 and cols[0] in CHAN_DAT_SHAPES and cols[1] not in elements:
+                elements.append(cols[1])
+
+    return elements
+
+
+def scanHychanElements(hychanFilePath, elements=None, bufsize=65536):
+    """
+    Read HYCHAN.OUT in a single pass and yield each "CHANNEL HYDROGRAPH FOR ELEMENT NO:" block
+    as (elementNo, start, end, rows) once the block is complete.
+    A block is complete when the timestep rows end, i.e. on the first non timestep line after them,
+    on the next element header or at the end of the file. Thus no need to know the series length in advance.
+
+    :param string hychanFilePath: Path of HYCHAN.OUT file
+    :param elements: Element numbers (as strings) which need to extract. If None, yield all the elements.
+    :param int bufsize: Read buffer size
+    :return: Generator of (elementNo, start, end, rows) where start, end are the byte range of the block
+    and rows are the timestep lines of the element
+    """
+    header = HYCHAN_ELEMENT_HEADER.encode()
+    with open(hychanFilePath, 'rb') as infile:
+        elementNo = None
+        start = end = 0
+        rows = []
+        pos = 0
+        while True:
+            lines = infile.readlines(bufsize)
+            if not lines:
+                break
+            for line in lines:
+                if line.startswith(header, 5):
+                    if elementNo is not None and len(rows):
+                        yield elementNo, start, end, rows
+                    elementNo = line.split()[5].decode()
+                    start = pos
+                    rows = []
+                    if elements is not None and elementNo not in elements:
+                        elementNo = None
+                elif elementNo is not None:
+                    if isTimeStepRow(line):
+                        rows.append(line.decode())
+                        end = pos + len(line)
+                    elif len(rows):
+                        # End of the timeseries of current element
+                        yield elementNo, start, end, rows
+                        elementNo = None
+                        rows = []
+                pos += len(line)
+            # -- END for loop
+        # -- END while loop
+        if elementNo is not None and len(rows):
+            yield elementNo, start, end, rows
+
+
+def iterHychanElements(hychanFilePath, elements=None, bufsize=65536):
+    """
+    Read HYCHAN.OUT in a single pass and yield (elementNo, rows) for each element block.
+    See scanHychanElements.
+    """
+    for elementNo, start, end, rows in scanHychanElements(hychanFilePath, elements, bufsize):
+        yield elementNo, rows
+
+
+def buildHychanIndex(hychanFilePath, bufsize=65536):
+    """
+    Build the byte offset index of HYCHAN.OUT element blocks.
+    E.g. {'size': 215348, 'mtime': 1508332213.5, 'elements': {'179': [52, 12180], ...}}
+    """
+    stat = os.stat(hychanFilePath)
+    elements = {}
+    for elementNo, start, end, rows in scanHychanElements(hychanFilePath, bufsize=bufsize):
+        elements[elementNo] = [start, end]
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'elements': elements
+    }
+
+
+def getHychanIndex(hychanFilePath, rebuild=False):
+    """
+    Get the byte offset index of HYCHAN.OUT element blocks from the sidecar file (HYCHAN.OUT.idx).
+    The index is rebuilt and stored again if HYCHAN.OUT size or modified time has been changed.
+    """
+    index_file_path = hychanFilePath + HYCHAN_INDEX_SUFFIX
+    stat = os.stat(hychanFilePath)
+    if not rebuild and os.path.exists(index_file_path):
+        with open(index_file_path) as index_file:
+            index = json.load(index_file)
+        if index.get('size') == stat.st_size and index.get('mtime') == stat.st_mtime:
+            return index
+        print('HYCHAN index is outdated. Rebuilding :', index_file_path)
+
+    index = buildHychanIndex(hychanFilePath)
+    try:
+        with open(index_file_path, 'w') as index_file:
+            json.dump(index, index_file)
+    except OSError as e:
+        print('WARNING: Unable to store HYCHAN index :', index_file_path, e)
+
+    return index
+
+
+def decodeHychanBlock(block):
+    """
+    Decode the timestep rows of an element block into a float64 2-D array (timesteps x columns) in one step.
+    Missing or invalid values (e.g. overflowed '*****' values) are decoded as NaN. See decodeNumericRows
+
+    :param bytes block: Element block of HYCHAN.OUT, i.e. the byte range stored in HYCHAN index
+    :return: numpy array of shape (timesteps, columns)
+    """
+    # Skip the element header and the column titles
+    dataStart = 0
+    while dataStart < len(block):
+        lineEnd = block.find(b'\n', dataStart) + 1 or len(block)
+        if isTimeStepRow(block[dataStart:lineEnd]):
+            break
+        dataStart = lineEnd
+    data = block[dataStart:]
+    if not data.strip():
+        return np.empty((0, len(HYCHAN_COLUMNS) + 1))
+
+    return decodeNumericRows(data)
+
+
+def readHychanElements(hychanFilePath, elements=None, index=None):
+    """
+    Read the element blocks of HYCHAN.OUT by seeking to them via the byte offset index,
+    instead of scanning the whole file, and decode them with decodeHychanBlock.
+
+    :param string hychanFilePath: Path of HYCHAN.OUT file
+    :param elements: Element numbers (as strings) which need to extract. If None, yield all the elements.
+    :param dict index: Byte offset index. Default is loaded with getHychanIndex.
+    :return: Generator of (elementNo, data) in the order of the elements in HYCHAN.OUT,
+    where data is a float64 array of timesteps x columns
+    """
+    if index is None:
+        index = getHychanIndex(hychanFilePath)
+    blocks = index['elements']
+    if elements is None:
+        elements = blocks.keys()
+    selected = sorted((blocks[elementNo][0], blocks[elementNo][1], elementNo)
+                      for elementNo in elements if elementNo in blocks)
+    if not len(selected):
+        return
+
+    with open(hychanFilePath, 'rb') as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for start, end, elementNo in selected:
+                yield elementNo, decodeHychanBlock(buffer[start:end])
+
+
+def getHychanTimeseries(data, baseTime, variables=('elevation',)):
+    """
+    Get the timeseries of each given variable out of the decoded timestep rows of an element.
+    Timesteps which do not have a valid value for a variable are skipped on that variable's timeseries.
+    Timestamps are kept as datetime64 arrays, which are formatted only when writing into files or the database.
+
+    :param data: Decoded timestep rows of an element. E.g. data returned from readHychanElements
+    :param datetime baseTime: Base time of the FLO2D model output
+    :param variables: Variables out of HYCHAN_COLUMNS. E.g. ('elevation', 'discharge')
+    :return: dict of variable -> (times, values) where times is a datetime64 array and values is a float64 array
+    """
+    timeseries = {}
+    for variable in variables:
+        column = HYCHAN_COLUMNS[variable]
+        if column >= data.shape[1]:
+            # If value is not present, skip
+            timeseries[variable] = (getTimesFromHours(baseTime, []), np.empty(0))
+            continue
+        # If value is not valid or NaN, skip
+        valid = np.isfinite(data[:, column]) & np.isfinite(data[:, 0])
+        timeseries[variable] = (getTimesFromHours(baseTime, data[valid, 0]), data[valid, column])
+
+    return timeseries
+
+
+def decodeHychanElement(task):
+    """
+    Decode an element block of HYCHAN.OUT. Used as the worker of buildHychanCache.
+
+    :param tuple task: (hychanFilePath, elementNo, start, end)
+    :return: (elementNo, data) where data is a float64 array of timesteps x columns
+    """
+    hychanFilePath, elementNo, start, end = task
+    with open(hychanFilePath, 'rb') as infile:
+        infile.seek(start)
+        data = decodeHychanBlock(infile.read(end - start))
+
+    return elementNo, data
+
+
+def buildHychanCache(hychanFilePath, workers=1, index=None):
+    """
+    Decode all the element blocks of HYCHAN.OUT into columnar arrays, on a pool of worker processes if workers > 1.
+    The timestep rows of all the elements are stacked into a single array, in the order of the elements in HYCHAN.OUT.
+    Rows of element elements[k] are data[offsets[k]:offsets[k + 1]].
+
+    :return: dict with 'elements', 'offsets' and 'data' arrays
+    """
+    if index is None:
+        index = getHychanIndex(hychanFilePath)
+    blocks = index['elements']
+    tasks = [(hychanFilePath, elementNo, blocks[elementNo][0], blocks[elementNo][1]) for elementNo in blocks]
+    tasks.sort(key=lambda task: task[2])
+
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            decoded = pool.map(decodeHychanElement, tasks)
+    else:
+        decoded = [decodeHychanElement(task) for task in tasks]
+
+    numCols = max([data.shape[1] for elementNo, data in decoded] + [len(HYCHAN_COLUMNS) + 1])
+    offsets = np.zeros(len(decoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(data) for elementNo, data in decoded])
+    # If an element does not have all the columns, fill missing values with NaN
+    data = np.full((offsets[-1], numCols), np.nan)
+    for k, (elementNo, elementData) in enumerate(decoded):
+        data[offsets[k]:offsets[k + 1], :elementData.shape[1]] = elementData
+
+    return {
+        'elements': np.array([elementNo for elementNo, elementData in decoded], dtype=str),
+        'offsets': offsets,
+        'data': data
+    }
+
+
+def getHychanCache(hychanFilePath, rebuild=False, workers=1):
+    """
+    Get the decoded element blocks of HYCHAN.OUT from the cache file (HYCHAN.OUT.npz), instead of parsing the text.
+    The cache is built and stored if it does not exist or HYCHAN.OUT has been changed. See LIBFLO2DCACHE.loadCache
+
+    :return: dict with 'elements', 'offsets' and 'data' arrays. See buildHychanCache
+    """
+    cache = None if rebuild else loadCache(hychanFilePath)
+    if cache is None:
+        print('Building HYCHAN cache of', hychanFilePath)
+        cache = buildHychanCache(hychanFilePath, workers)
+        saveCache(hychanFilePath, cache)
+
+    return cache
+
+
+def iterHychanCache(cache, elements=None):
+    """
+    Iterate through the decoded element blocks of the HYCHAN cache.
+
+    :param dict cache: Cache returned from getHychanCache
+    :param elements: Element numbers (as strings) which need to extract. If None, yield all the elements.
+    :return: Generator of (elementNo, data) in the order of the elements in HYCHAN.OUT
+    """
+    offsets = cache['offsets']
+    for k, elementNo in enumerate(cache['elements'].tolist()):
+        if elements is None or elementNo in elements:
+            yield elementNo, cache['data'][offsets[k]:offsets[k + 1]]
+
+
+def extractHychanElement(task):
+    """
+    Write the timeseries of each variable of an element into its CSV file.
+    Used as the worker of extractHychanElements, thus it only depends on the given task.
+
+    :param tuple task: (elementNo, data, baseTime, outputFiles)
+    where data is the decoded timestep rows of the element and outputFiles is a dict of variable -> CSV file path
+    :return: (elementNo, timeseries) where timeseries is the dict returned from getHychanTimeseries
+    """
+    elementNo, data, baseTime, outputFiles = task
+    timeseries = getHychanTimeseries(data, baseTime, list(outputFiles.keys()))
+    for variable, filePath in outputFiles.items():
+        with open(filePath, 'w') as outfile:
+            csv.writer(outfile, delimiter=',', quotechar='|').writerows(formatTimeseries(*timeseries[variable]))
+
+    return elementNo, timeseries
+
+
+def extractHychanElements(hychanFilePath, elementOutputFiles, baseTime, workers=1, cache=None):
+    """
+    Write the CSV files of the given elements of HYCHAN.OUT, on a pool of worker processes if workers > 1.
+    The decoded element blocks are taken from the HYCHAN cache, thus HYCHAN.OUT is only parsed once.
+    The results are returned in the order of the elements in HYCHAN.OUT, irrespective of the number of workers.
+    NOTE: With workers > 1, the calling script should be guarded with `if __name__ == '__main__':`,
+    since the worker processes import the main module on Windows.
+
+    :param string hychanFilePath: Path of HYCHAN.OUT file
+    :param dict elementOutputFiles: elementNo -> {variable: CSV file path}
+    :param datetime baseTime: Base time of the FLO2D model output
+    :param int workers: Number of worker processes
+    :param dict cache: Decoded element blocks. Default is loaded with getHychanCache.
+    :return: Generator of (elementNo, timeseries)
+    """
+    if cache is None:
+        cache = getHychanCache(hychanFilePath, workers=workers)
+    tasks = [(elementNo, data, baseTime, elementOutputFiles[elementNo])
+             for elementNo, data in iterHychanCache(cache, elementOutputFiles)]
+
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            for result in pool.imap(extractHychanElement, tasks):
+                yield result
+    else:
+        for task in tasks:
+            yield extractHychanElement(task)
+
+
+def getHychanMatrix(cache, elements, variable):
+    """
+    Get the values of a variable of the given elements as a single time x element matrix.
+    Timesteps are the union of the timesteps of the elements. Missing values are NaN.
+
+    :param dict cache: Cache returned from getHychanCache
+    :param elements: Element numbers (as strings). E.g. getChannelElements of CHAN.DAT
+    :param string variable: Variable out of HYCHAN_COLUMNS
+    :return: (times, columns, matrix) where times are the model times in hours, columns are the element numbers
+    which are available in HYCHAN.OUT (in the order of elements) and matrix is a float64 array of times x columns
+    """
+    elementData = dict(iterHychanCache(cache, elements))
+    columns = [elementNo for elementNo in elements if elementNo in elementData]
+    if not len(columns):
+        return np.empty(0), columns, np.empty((0, 0))
+
+    times = np.unique(np.concatenate([elementData[elementNo][:, 0] for elementNo in columns]))
+    times = times[np.isfinite(times)]
+    matrix = np.full((len(times), len(columns)), np.nan)
+    column = HYCHAN_COLUMNS[variable]
+    for k, elementNo in enumerate(columns):
+        data = elementData[elementNo]
+        data = data[np.isfinite(data[:, 0])]
+        if column < data.shape[1]:
+            matrix[np.searchsorted(times, data[:, 0]), k] = data[:, column]
+
+    return times, columns, matrix
+
+
+def writeHychanMatrix(filePath, cache, elements, variable, baseTime, missingValue=-999):
+    """
+    Write the values of a variable of the given elements into a single CSV file of time x element,
+    with a header row of element numbers. E.g.
+    Time,2158,2051,5401
+    2017-01-01 00:15:00,1.234,0.56,-999
+
+    :param string filePath: Output CSV file path
+    :param dict cache: Cache returned from getHychanCache
+    :param elements: Element numbers (as strings). E.g. getChannelElements of CHAN.DAT
+    :param string variable: Variable out of HYCHAN_COLUMNS
+    :param datetime baseTime: Base time of the FLO2D model output
+    :param missingValue: Value which is written for the missing values
+    :return: Element numbers which are written into the file
+    """
+    times, columns, matrix = getHychanMatrix(cache, elements, variable)
+    matrix[~np.isfinite(matrix)] = missingValue
+    with open(filePath, 'w') as outfile:
+        csvWriter = csv.writer(outfile, delimiter=',', quotechar='|')
+        csvWriter.writerow(['Time'] + columns)
+        for timestamp, values in formatTimeseries(getTimesFromHours(baseTime, times), matrix):
+            csvWriter.writerow([timestamp] + values)
+
+    return columns
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+import warnings
+
+import numpy as np
+
+# Cell size of each level of the pyramid, as a multiple of the cell size of the grid
+PYRAMID_LEVELS = [2, 4, 8]
+PYRAMID_METHODS = {
+    'max': np.nanmax,
+    'mean': np.nanmean
+}
+
+
+def getPyramidLevel(grid, cols, rows, boudary, factor, method='max', gap=250.0):
+    """
+    Downsample the grid into a grid of factor times larger cells, by aggregating each factor x factor block of cells.
+    Cells without a value (NaN) are ignored, and a block without any value is NaN.
+    The coarse grid is aligned to the top left corner of the grid, thus the grid is padded on the right and bottom.
+
+    :param grid: float64 array of rows * cols (or rows x cols). E.g. from LIBFLO2DWATERLEVELGRID.getGridOfValues
+    :param boudary: Grid boundary returned from getGridBoudary
+    :param int factor: E.g. 2 for a grid of 500m cells out of a grid of 250m cells
+    :param string method: Aggregation of the cells of a block. 'max' or 'mean'
+    :return: (grid, cols, rows, boudary) of the coarse grid, where grid is flattened. The boundary is adjusted thus
+    the Esri grid header of the coarse grid (see LIBFLO2DWATERLEVELGRID.getEsriGridHeader) has the right corner.
+    """
+    levelCols, levelRows = -(-cols // factor), -(-rows // factor)
+    padded = np.full((levelRows * factor, levelCols * factor), np.nan)
+    padded[:rows, :cols] = np.reshape(grid, (rows, cols))
+    blocks = padded.reshape(levelRows, factor, levelCols, factor)
+    with warnings.catch_warnings():
+        # All NaN blocks are expected. E.g. outside of the mesh
+        warnings.simplefilter('ignore', RuntimeWarning)
+        level = PYRAMID_METHODS[method](blocks, axis=(1, 3))
+
+    levelBoudary = dict(boudary)
+    levelBoudary['lat_min'] = boudary['lat_min'] + rows * gap - levelRows * factor * gap
+    return level.reshape(-1), levelCols, levelRows, levelBoudary
+
+
+def getPyramid(grid, cols, rows, boudary, levels=None, method='max', gap=250.0):
+    """
+    Get the levels of the pyramid of the grid. See getPyramidLevel
+
+    :param list levels: Factors of the levels. Default is PYRAMID_LEVELS
+    :return: dict of factor -> (grid, cols, rows, boudary)
+    """
+    levels = PYRAMID_LEVELS if levels is None else levels
+    return {factor: getPyramidLevel(grid, cols, rows, boudary, factor, method, gap) for factor in levels}
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+import datetime
+import os
+
+import numpy as np
+
+from Util.LibForecastTimeseries import getTimesFromHours
+
+# Wet cells of the water depth grids of a run, in a single file. Only the cells which differ from the dry grid
+# (i.e. 0 on the cells of the mesh and NODATA elsewhere) are stored per timestep, as (flat grid index, value) pairs.
+# Pairs of timestep k are index[offsets[k]:offsets[k + 1]] and values[offsets[k]:offsets[k + 1]].
+SPARSE_GRID_SUFFIX = '.wet.npz'
+
+
+def openSparseGridWriter(sparseFilePath, boudary, cols, rows, baseTime, dryIndex, gap=250.0, missingVal=-9):
+    """
+    Create the writer of the wet cells file, to be used with appendSparseGridTimestep and closeSparseGridWriter.
+    The coordinate header is same as of the Esri grid. See LIBFLO2DWATERLEVELGRID.getEsriGridHeader
+
+    :param boudary: Grid boundary returned from getGridBoudary
+    :param datetime baseTime: Base time of the FLO2D model run, i.e. model time 0
+    :param dryIndex: Flat grid index of the cells of the mesh, which are 0 on the dry grid. E.g. gridIndex['index']
+    :return: dict of the writer state
+    """
+    dryIndex = np.asarray(dryIndex, dtype=np.int64)
+    dryGrid = np.full(rows * cols, np.nan)
+    dryGrid[dryIndex[dryIndex > -1]] = 0.0
+    return {
+        'filePath': sparseFilePath,
+        'header': {
+            'ncols': np.array(cols),
+            'nrows': np.array(rows),
+            'xllcorner': np.array(boudary['long_min'] - 125),
+            'yllcorner': np.array(boudary['lat_min'] - 125),
+            'cellsize': np.array(gap),
+            'NODATA_value': np.array(missingVal),
+            'baseTime': np.array(baseTime.strftime('%Y-%m-%d %H:%M:%S'))
+        },
+        'dryGrid': dryGrid,
+        'modelTimes': [],
+        'index': [],
+        'values': []
+    }
+
+
+def appendSparseGridTimestep(writer, modelTime, grid):
+    """
+    Append the wet cells of the grid of a timestep.
+
+    :param float modelTime: Model time in hours
+    :param grid: float64 array of rows * cols (or rows x cols), where the cells without a value are NaN.
+    E.g. from LIBFLO2DWATERLEVELGRID.getGridOfValues
+    """
+    grid = np.reshape(grid, -1)
+    dryGrid = writer['dryGrid']
+    changed = np.flatnonzero((grid != dryGrid) & ~(np.isnan(grid) & np.isnan(dryGrid)))
+    writer['modelTimes'].append(float(modelTime))
+    writer['index'].append(changed.astype(np.int32))
+    writer['values'].append(grid[changed])
+
+
+def closeSparseGridWriter(writer):
+    """
+    Store the wet cells of all the timesteps into the file (compressed .npz).
+    """
+    offsets = np.zeros(len(writer['index']) + 1, dtype=np.int64)
+    np.cumsum([len(index) for index in writer['index']], out=offsets[1:])
+    arrays = dict(writer['header'])
+    arrays['modelTimes'] = np.array(writer['modelTimes'], dtype=np.float64)
+    arrays['dryIndex'] = np.flatnonzero(writer['dryGrid'] == 0).astype(np.int32)
+    arrays['offsets'] = offsets
+    arrays['index'] = np.concatenate(writer['index']) if len(writer['index']) else np.empty(0, dtype=np.int32)
+    arrays['values'] = np.concatenate(writer['values']) if len(writer['values']) else np.empty(0)
+    with open(writer['filePath'] + '.tmp', 'wb') as outfile:
+        np.savez_compressed(outfile, **arrays)
+    os.replace(writer['filePath'] + '.tmp', writer['filePath'])
+
+
+def openSparseGrid(sparseFilePath):
+    """
+    Load the wet cells file.
+
+    :return: dict of arrays, along with 'times' (datetime64) of the timesteps
+    """
+    with np.load(sparseFilePath, allow_pickle=False) as npz:
+        sparse = {name: npz[name] for name in npz.files}
+    baseTime = datetime.datetime.strptime(str(sparse['baseTime']), '%Y-%m-%d %H:%M:%S')
+    sparse['times'] = getTimesFromHours(baseTime, sparse['modelTimes'])
+    return sparse
+
+
+def getDryGrid(sparse):
+    rows, cols, missingVal = int(sparse['nrows']), int(sparse['ncols']), float(sparse['NODATA_value'])
+    dryGrid = np.full(rows * cols, missingVal)
+    dryGrid[sparse['dryIndex']] = 0.0
+    return dryGrid
+
+
+def readSparseGridTimestep(sparse, step):
+    """
+    Re-expand the wet cells of a timestep into the dense grid.
+
+    :param int step: Index of the timestep on sparse['times']
+    :return: float64 array of rows x cols. Same as the values of the Esri grid of the timestep.
+    """
+    grid = getDryGrid(sparse)
+    start, end = sparse['offsets'][step], sparse['offsets'][step + 1]
+    grid[sparse['index'][start:end]] = sparse['values'][start:end]
+    grid[np.isnan(grid)] = float(sparse['NODATA_value'])
+    return grid.reshape(int(sparse['nrows']), int(sparse['ncols']))
+
+
+def readSparseGridSeries(sparse, rows, cols):
+    """
+    Re-expand the time series of given set of cells, with a single pass over the wet cells of all the timesteps.
+
+    :param rows: Row index (j) of the cells on the grid. E.g. from LIBFLO2DWATERLEVELGRID.getCellGrid
+    :param cols: Column index (i) of the cells on the grid
+    :return: float64 array of timesteps x cells
+    """
+    positions = np.asarray(rows, dtype=np.int64) * int(sparse['ncols']) + np.asarray(cols, dtype=np.int64)
+    # Same cell might be requested more than once
+    uniquePositions, inverse = np.unique(positions, return_inverse=True)
+    series = np.tile(getDryGrid(sparse)[uniquePositions], (len(sparse['modelTimes']), 1))
+    if len(uniquePositions):
+        # Timestep of each wet cell pair, and the requested cell of the pair if any
+        steps = np.repeat(np.arange(len(sparse['modelTimes'])), np.diff(sparse['offsets']))
+        found = np.minimum(np.searchsorted(uniquePositions, sparse['index']), len(uniquePositions) - 1)
+        selected = np.flatnonzero(uniquePositions[found] == sparse['index'])
+        series[steps[selected], found[selected]] = sparse['values'][selected]
+    series[np.isnan(series)] = float(sparse['NODATA_value'])
+    return series[:, inverse.reshape(-1)]
@@ -1,13 +1,23 @@
 #!/usr/bin/python3
 
-import os, json, datetime, sys, math, numbers
+import os, json, datetime, sys, math, numbers, glob, gzip
 from os.path import join as pjoin
 
+import numpy as np
+
+from LIBFLO2DCACHE import loadCache
+from LIBFLO2DCACHE import saveCache
+
 SKIP_META_LINES = 6
 # FLO2D cells to longitude, latitude mapping file location
 CADPTS_DAT_FILE = 'META_FLO2D/CADPTS.DAT'
 CWD = os.getcwd()
 CADPTS_DAT_FILE_PATH = pjoin(CWD, CADPTS_DAT_FILE)
+# Alternate meshes in META_FLO2D, which can be used instead of CADPTS.DAT
+CADPTS_DAT_FILES = ['CADPTS.DAT', 'CADPTS_SLD.DAT', 'CADPTS_KADAWALA.DAT']
+# Esri grid files can be plain or gzip compressed. E.g. water_level_grid-2017-05-27_00-15-00.asc.gz
+ESRI_GRID_SUFFIXES = ['.asc', '.asc.gz']
+GZIP_COMPRESS_LEVEL = 6
 
 def getWaterLevelGrid(lines) :
     waterLevels = []
@@ -23,53 +33,89 @@ def getWaterLevelGrid(lines) :
     return waterLevels
 
 
-def getGridBoudary(gap=250.0) :
-    "longitude  -> x : larger value" 
-    "latitude   -> y : smaller value"
+def buildMesh(cadptsFilePath=None, gap=250.0) :
+    """
+    Compile the FLO2D mesh of CADPTS.DAT into arrays.
+    E.g. '1          397199.000   492500.000' -> cell: 1, x (longitude): 397199.0, y (latitude): 492500.0
 
-    long_min = 1000000000.0
-    lat_min = 1000000000.0
-    long_max = 0.0
-    lat_max = 0.0
+    :param cadptsFilePath: Path of CADPTS.DAT file. Default is META_FLO2D/CADPTS.DAT
+    :param gap: Cell size of the grid
+    :return: dict with 'cells', 'x', 'y', (i, j) index of the cells on the grid, grid dimensions 'cols', 'rows',
+    the boundary ('long_min', 'lat_min', 'long_max', 'lat_max') and 'gap'
+    """
+    cadpts = np.loadtxt(cadptsFilePath or CADPTS_DAT_FILE_PATH, ndmin=2)
+    x, y = cadpts[:, 1], cadpts[:, 2]
+    long_min, lat_min, long_max, lat_max = x.min(), y.min(), x.max(), y.max()
+    cols = int(math.ceil((long_max - long_min) / gap)) + 1
+    rows = int(math.ceil((lat_max - lat_min) / gap)) + 1
+
+    return {
+        'cells': cadpts[:, 0].astype(np.int64),
+        'x': x,
+        'y': y,
+        'i': ((x - long_min) / gap).astype(np.int64),
+        'j': rows - ((y - lat_min) / gap).astype(np.int64) - 1,
+        'cols': np.array(cols),
+        'rows': np.array(rows),
+        'long_min': np.array(long_min),
+        'lat_min': np.array(lat_min),
+        'long_max': np.array(long_max),
+        'lat_max': np.array(lat_max),
+        'gap': np.array(gap)
+    }
 
-    with open(CADPTS_DAT_FILE_PATH) as f:
-        lines = f.readlines()
-        for line in lines :
-            values = line.split()
-            long_min = min(long_min, float(values[1]))
-            lat_min = min(lat_min, float(values[2]))
 
-            long_max = max(long_max, float(values[1]))
-            lat_max = max(lat_max, float(values[2]))
+def getMesh(cadptsFilePath=None, gap=250.0, rebuild=False) :
+    """
+    Get the compiled FLO2D mesh from the cache file next to CADPTS.DAT (e.g. CADPTS.DAT.npz).
+    The cache is rebuilt if the hash of CADPTS.DAT has been changed. See buildMesh
+
+    :param cadptsFilePath: Path of CADPTS.DAT file. Default is META_FLO2D/CADPTS.DAT
+    """
+    cadptsFilePath = cadptsFilePath or CADPTS_DAT_FILE_PATH
+    mesh = None if rebuild else loadCache(cadptsFilePath, verifyHash=True)
+    if mesh is None or float(mesh['gap']) != gap :
+        mesh = buildMesh(cadptsFilePath, gap)
+        saveCache(cadptsFilePath, mesh)
+
+    return mesh
+
+
+def getGridBoudary(gap=250.0, cadptsFilePath=None, mesh=None) :
+    "longitude  -> x : larger value" 
+    "latitude   -> y : smaller value"
+    "mesh       -> Mesh which is already loaded with getMesh. Otherwise it is loaded from cadptsFilePath"
 
+    if mesh is None :
+        mesh = getMesh(cadptsFilePath, gap)
     return {
-        'long_min': long_min,
-        'lat_min': lat_min,
-        'long_max': long_max,
-        'lat_max': lat_max
+        'long_min': float(mesh['long_min']),
+        'lat_min': float(mesh['lat_min']),
+        'long_max': float(mesh['long_max']),
+        'lat_max': float(mesh['lat_max'])
     }
 
 
-def getCellGrid(boudary, gap=250.0) :
-    CellMap = {}
+def getCellGrid(boudary, gap=250.0, cadptsFilePath=None, mesh=None) :
+    "mesh       -> Mesh which is already loaded with getMesh. Otherwise it is loaded from cadptsFilePath"
+    # Mesh is loaded (and the hash of CADPTS.DAT verified) only once
+    if mesh is None :
+        mesh = getMesh(cadptsFilePath, gap)
 
     cols = int(math.ceil((boudary['long_max'] - boudary['long_min']) / gap)) + 1
     rows = int(math.ceil((boudary['lat_max'] - boudary['lat_min']) / gap)) + 1
 
-    with open(CADPTS_DAT_FILE_PATH) as f:
-        lines = f.readlines()
-        for line in lines :
-            v = line.split()
-            i = int((float(v[1]) - boudary['long_min']) / gap)
-            j = int((float(v[2]) - boudary['lat_min']) / gap)
-            if not isinstance(i, numbers.Integral) or not isinstance(j, numbers.Integral) :
-                print('### WARNING i: %d, j: %d, cols: %d, rows: %d' % (i, j, cols, rows))
-            if (i >= cols or j >= rows) :
-                print('### WARNING i: %d, j: %d, cols: %d, rows: %d' % (i, j, cols, rows))
-            if i >= 0 or j >= 0 :
-                CellMap[int(v[0])] = (i, rows - j -1)
+    if boudary == getGridBoudary(gap, mesh=mesh) :
+        # Same as the boundary of the mesh, thus use the precomputed (i, j) index
+        i, j = mesh['i'], rows - mesh['j'] - 1
+    else :
+        i = ((mesh['x'] - boudary['long_min']) / gap).astype(np.int64)
+        j = ((mesh['y'] - boudary['lat_min']) / gap).astype(np.int64)
+    for k in np.flatnonzero((i >= cols) | (j >= rows)).tolist() :
+        print('### WARNING i: %d, j: %d, cols: %d, rows: %d' % (i[k], j[k], cols, rows))
 
-    return CellMap
+    selected = (i >= 0) | (j >= 0)
+    return dict(zip(mesh['cells'][selected].tolist(), zip(i[selected].tolist(), (rows - j[selected] - 1).tolist())))
 
 
 def getEsriGrid(waterLevels, boudary, CellMap, gap=250.0, missingVal=-9) :
@@ -103,12 +149,7 @@ def getEsriGrid(waterLevels, boudary, CellMap, gap=250.0, missingVal=-9) :
             print(boudary)
         Grid[j][i] = float(v[1])
 
-    EsriGrid.append('%s\t%s\n' % ('ncols', cols))
-    EsriGrid.append('%s\t%s\n' % ('nrows', rows))
-    EsriGrid.append('%s\t%s\n' % ('xllcorner', boudary['long_min'] - 125))
-    EsriGrid.append('%s\t%s\n' % ('yllcorner', boudary['lat_min'] - 125))
-    EsriGrid.append('%s\t%s\n' % ('cellsize', gap))
-    EsriGrid.append('%s\t%s\n' % ('NODATA_value', missingVal))
+    EsriGrid.extend(getEsriGridHeader(boudary, cols, rows, gap, missingVal))
 
     for j in range(0, rows) :
         arr = []
@@ -120,6 +161,144 @@ def getEsriGrid(waterLevels, boudary, CellMap, gap=250.0, missingVal=-9) :
     return EsriGrid
 
 
+def getEsriGridHeader(boudary, cols, rows, gap=250.0, missingVal=-9) :
+    return [
+        '%s\t%s\n' % ('ncols', cols),
+        '%s\t%s\n' % ('nrows', rows),
+        '%s\t%s\n' % ('xllcorner', boudary['long_min'] - 125),
+        '%s\t%s\n' % ('yllcorner', boudary['lat_min'] - 125),
+        '%s\t%s\n' % ('cellsize', gap),
+        '%s\t%s\n' % ('NODATA_value', missingVal)
+    ]
+
+
+def getGridIndex(cells, boudary, CellMap, gap=250.0) :
+    """
+    Precompute the position of each cell on the flattened Esri grid, to be used with getEsriGridOfValues.
+    Cells which are not in CellMap or out of the grid are skipped.
+
+    :param cells: Cell numbers in the order of the values. E.g. cells of LIBFLO2DBASEOUT.iterBaseOutResults
+    :param boudary: Grid boundary returned from getGridBoudary
+    :param CellMap: Cell positions returned from getCellGrid
+    :return: dict with 'cells', 'cols', 'rows', 'index' (flat position of each cell or -1) and
+    'grid' (preallocated float64 grid)
+    """
+    cols = int(math.ceil((boudary['long_max'] - boudary['long_min']) / gap)) + 1
+    rows = int(math.ceil((boudary['lat_max'] - boudary['lat_min']) / gap)) + 1
+
+    index = np.full(len(cells), -1, dtype=np.int64)
+    for k, cellNo in enumerate(np.asarray(cells).tolist()) :
+        if int(cellNo) in CellMap :
+            i, j = CellMap[int(cellNo)]
+            if (i >= cols or j >= rows) :
+                print('i: %d, j: %d, cols: %d, rows: %d' % (i, j, cols, rows))
+                print(boudary)
+                continue
+            index[k] = j * cols + i
+
+    return {
+        'cells': np.array(cells, dtype=np.int64),
+        'cols': cols,
+        'rows': rows,
+        'index': index,
+        'grid': np.empty(rows * cols)
+    }
+
+
+def getGridOfValues(values, gridIndex) :
+    """
+    Scatter the values of the cells into the flattened grid of gridIndex with a single assignment.
+
+    :param values: float64 array of the cells of gridIndex
+    :param gridIndex: Cell positions returned from getGridIndex
+    :return: float64 array of rows * cols, where the cells without a value are NaN
+    """
+    index, grid = gridIndex['index'], gridIndex['grid']
+    grid.fill(np.nan)
+    valid = index > -1
+    grid[index[valid]] = values[valid]
+    return grid
+
+
+def getEsriGridOfValues(values, gridIndex, boudary, gap=250.0, missingVal=-9) :
+    """
+    Same as getEsriGrid, but scatter the values of the cells into the grid with a single assignment
+    and format each distinct value only once.
+
+    :param values: float64 array of the cells of gridIndex. Cells with NaN are set to missingVal.
+    :param gridIndex: Cell positions returned from getGridIndex
+    :return: Lines of the Esri grid
+    """
+    grid = getGridOfValues(values, gridIndex)
+    return getEsriGridOfGrid(grid, gridIndex['cols'], gridIndex['rows'], boudary, gap, missingVal)
+
+
+def getEsriGridOfGrid(grid, cols, rows, boudary, gap=250.0, missingVal=-9) :
+    """
+    Format the flattened grid into the Esri grid, by formatting each distinct value only once.
+
+    :param grid: float64 array of rows * cols. Cells with NaN are set to missingVal.
+    :return: Lines of the Esri grid
+    """
+    uniqueValues, inverse = np.unique(grid, return_inverse=True)
+    labels = np.array([str(missingVal) if math.isnan(x) else str(x) for x in uniqueValues.tolist()])
+    gridText = labels[inverse.reshape(-1)].reshape(rows, cols).tolist()
+
+    EsriGrid = getEsriGridHeader(boudary, cols, rows, gap, missingVal)
+    EsriGrid.extend('%s\n' % ' '.join(row) for row in gridText)
+    return EsriGrid
+
+
+def openGridFile(filePath, mode='rt') :
+    """
+    Open the grid file, which is gzip compressed if the file name ends with '.gz'.
+    """
+    if filePath.endswith('.gz') :
+        return gzip.open(filePath, mode, compresslevel=GZIP_COMPRESS_LEVEL) if 'w' in mode else gzip.open(filePath, mode)
+    return open(filePath, mode)
+
+
+def writeEsriGridFile(filePath, grid, cols, rows, boudary, gap=250.0, missingVal=-9) :
+    """
+    Format the flattened grid into the Esri grid and write into the file. See getEsriGridOfGrid
+    The file is gzip compressed if the file name ends with '.gz'.
+    """
+    EsriGrid = getEsriGridOfGrid(grid, cols, rows, boudary, gap, missingVal)
+    with openGridFile(filePath, 'wt') as file :
+        file.writelines(EsriGrid)
+
+
+def readEsriGridFile(filePath) :
+    """
+    Read the values of the Esri grid file, either plain or gzip compressed.
+
+    :return: float64 array of rows x cols
+    """
+    with openGridFile(filePath, 'rt') as file :
+        return np.loadtxt(file, skiprows=SKIP_META_LINES, ndmin=2)
+
+
+def getEsriGridFiles(dirPath, fileName) :
+    """
+    Get the timestamped Esri grid files of the directory, either plain or gzip compressed.
+    E.g. getEsriGridFiles(dirPath, 'water_level_grid') -> water_level_grid-2017-05-27_00-15-00.asc(.gz)
+    If both the plain and compressed files exist for a timestamp, the plain file is used.
+
+    :return: list of (datetime, filePath) sorted by the time
+    """
+    gridFiles = {}
+    for suffix in reversed(ESRI_GRID_SUFFIXES) :
+        for filePath in glob.glob(os.path.join(dirPath, '%s-*%s' % (fileName, suffix))) :
+            dateTimeStr = os.path.basename(filePath)[len(fileName) + 1:-len(suffix)]
+            try :
+                dateTime = datetime.datetime.strptime(dateTimeStr, '%Y-%m-%d_%H-%M-%S')
+            except ValueError :
+                continue
+            gridFiles[dateTime] = filePath
+
+    return sorted(gridFiles.items())
+
+
 def getWaterLevelOfChannels(lines, channels=None):
     """
      Get Water Levels of given set of channels
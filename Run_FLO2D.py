@@ -4,6 +4,8 @@ import argparse
 import datetime
 import os
 import shutil
+import subprocess
+import sys
 import traceback
 from distutils.dir_util import copy_tree
 
@@ -15,6 +17,8 @@ try:
     OUTFLOW_DAT_FILE = 'OUTFLOW.DAT'
     RAINCELL_DAT_FILE = 'RAINCELL.DAT'
     RUN_FLO2D_FILE = 'RUN_FLO2D.json'
+    # Created in the model dir once FLOPRO.exe is completed, thus the extractor stops following BASE.OUT
+    FLO2D_COMPLETED_FILE = 'FLO2D.completed'
 
     FLO2D_TEMPLATE = os.path.join(root_dir, 'Template')
     FLO2D_RUN_FOR_PROJECT = os.path.join(root_dir, 'RunForProjectFolder')
@@ -22,6 +26,8 @@ try:
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--date", help="Date in YYYY-MM. Default is current date.")
     parser.add_argument("--model-dir", help="FLO2D model directory.")
+    parser.add_argument("--follow", action='store_true',
+                        help="Extract the water level grids from BASE.OUT while FLO2D is running.")
     args = parser.parse_args()
     print('Commandline Options:', args)
 
@@ -70,8 +76,27 @@ try:
         print('Directory not copied. Error: %s' % e)
     else:
         print('>>>>>', appDir)
+        FLO2D_COMPLETED_FILE_PATH = os.path.join(appDir, FLO2D_COMPLETED_FILE)
+        extractor = None
+        if args.follow:
+            # Extractor follows BASE.OUT until FLO2D_COMPLETED_FILE is created
+            extractorArgs = [sys.executable, os.path.join(root_dir, 'EXTRACTFLO2DWATERLEVELGRID.py'),
+                             '-d', date, '-p', appDir, '--follow', '--follow-until', FLO2D_COMPLETED_FILE_PATH]
+            print('Start extracting water level grids:', extractorArgs)
+            extractor = subprocess.Popen(extractorArgs, cwd=root_dir)
         os.chdir(appDir)
-        os.system(os.path.join(appDir, 'FLOPRO.exe'))
+        try:
+            status = os.system(os.path.join(appDir, 'FLOPRO.exe'))
+            print('FLO2D exit status:', status)
+        finally:
+            if extractor is not None:
+                open(FLO2D_COMPLETED_FILE_PATH, 'w').close()
+        if extractor is not None:
+            returnCode = extractor.wait()
+            if returnCode != 0:
+                print('ERROR: Extracting water level grids failed with exit code', returnCode, extractorArgs)
+            else:
+                print('Extracted water level grids')
 
 except ValueError:
     raise ValueError("Incorrect data format, should be YYYY-MM-DD")
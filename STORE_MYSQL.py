@@ -1,11 +1,35 @@
 #!/usr/bin/python3
 
-from curwmysqladapter import MySQLAdapter, Station
+from curwmysqladapter import Station
 import sys, traceback, csv, json, datetime, getopt, glob, os, copy
 import numpy as np
 
+from LIBFLO2DBASEOUT import getBaseOutCache
 from LIBFLO2DWATERLEVELGRID import getGridBoudary
 from LIBFLO2DWATERLEVELGRID import getCellGrid
+from LIBFLO2DWATERLEVELGRID import getMesh
+from LIBFLO2DWATERLEVELGRID import CADPTS_DAT_FILES
+from LIBFLO2DWATERLEVELGRID import getEsriGridFiles
+from LIBFLO2DWATERLEVELGRID import readEsriGridFile
+from LIBFLO2DGRIDCUBE import CUBE_SUFFIX
+from LIBFLO2DGRIDCUBE import closeCube
+from LIBFLO2DGRIDCUBE import openCube
+from LIBFLO2DGRIDCUBE import readCubeSeries
+from LIBFLO2DSPARSEGRID import SPARSE_GRID_SUFFIX
+from LIBFLO2DSPARSEGRID import openSparseGrid
+from LIBFLO2DSPARSEGRID import readSparseGridSeries
+from Util.LibAdapterPool import MYSQL_POOL_SIZE
+from Util.LibAdapterPool import acquireAdapter
+from Util.LibAdapterPool import closeAdapterPool
+from Util.LibAdapterPool import getAdapterPool
+from Util.LibEventIds import getEventIdsWithTimeseries
+from Util.LibEventIds import resolveEventIds
+from Util.LibStations import syncFLO2DStations
+from Util.LibTimeseriesLoader import TIMESERIES_BATCH_SIZE
+from Util.LibTimeseriesLoader import addTimeseries
+from Util.LibTimeseriesLoader import closeTimeseriesLoader
+from Util.LibTimeseriesLoader import openTimeseriesLoader
+from Util.LibForecastTimeseries import formatTimes
 
 def usage() :
     usageText = """
@@ -14,12 +38,18 @@ Usage: ./STORE_MYSQL.py [-d YYYY-MM-DD] [-h]
 -h  --help          Show usage
 -d  --date          Date in YYYY-MM-DD. Default is current date.
 -t  --time          Time which need to run the forecast in HH:MM:SS format.
+-S  --start_date    Base Date of FLO2D model output in YYYY-MM-DD format, along with --flo2d-path.
+                    Default is TIMESERIES_START_DATE of RUN_FLO2D.json of the model, otherwise same as -d option value.
+-T  --start_time    Base Time of FLO2D model output in HH:MM:SS format, along with --flo2d-path.
+                    Default is TIMESERIES_START_TIME of RUN_FLO2D.json of the model, otherwise 00:00:00.
 -f  --force         Force insert timeseries. If timeseries exists, delete existing data and replace with new data.
 -r  --rainfall      Store rainfall specifically. Ignore others if not mentioned.
 -e  --discharge     Store discharge(emission) specifically. Ignore others if not mentioned.
 -w  --waterlevel    Store waterlevel specifically. Ignore others if not mentioned.
 -g  --waterlevelgrid    Store waterlevel grid specifically. Ignore others if not mentioned.
-    --flo2d-stations    Store FLO2D model stations
+    --flo2d-stations    Store FLO2D model stations of the cells of the mesh (see --mesh) which are not stored yet
+    --all-meshes        Along with --flo2d-stations, store the stations of all the FLO2D meshes in META_FLO2D.
+                        E.g. CADPTS.DAT, CADPTS_SLD.DAT. Cells are identified by the cell number across the meshes.
     --wl-out-suffix Suffix for 'water_level-<SUFFIX>' output directories. 
                     Default is 'water_level-<YYYY-MM-DD>' same as -d option value.
     --rainfall-path     Directory path which contains the Rainfall timeseries.
@@ -28,9 +58,23 @@ Usage: ./STORE_MYSQL.py [-d YYYY-MM-DD] [-h]
                         E.g: '<waterlevel-path>/water_level-2017-05-27'.
     --waterlevelgrid-path   Directory path which contains the WaterLevel timeseries directories.
                             E.g: '<waterlevelgrid-path>/water_level_grid-2017-05-27'.
+                            If the water depth cube '<waterlevelgrid-path>/water_level_grid-2017-05-27.cube'
+                            exists, the WaterLevel grid is read from it instead. Same for the wet cells file
+                            '<waterlevelgrid-path>/water_level_grid-2017-05-27.wet.npz'.
+    --wl-grid-sparse    Store only the wet cells (depth > 0) of the WaterLevel grid. Dry cells are not stored.
+    --flo2d-path    FLO2D model directory which contains BASE.OUT. If given, the WaterLevel grid is read from
+                    the cache of BASE.OUT instead of parsing the WaterLevel grid files. Timesteps are stored from
+                    the model state time, which is MODEL_STATE_DATE and MODEL_STATE_TIME of RUN_FLO2D.json of
+                    the model unless -d and -t are given.
+    --batch-size    Number of rows which are inserted in a single transaction, with multi-row inserts of the
+                    timeseries of many stations. Default is %s. If 0, each timeseries is inserted on its own.
+    --db-workers    Number of threads which insert the batches concurrently, each on its own database connection.
+                    Default is %s. If 0, the batches are inserted one after the other.
+    --mesh          FLO2D mesh file in META_FLO2D which is used for WaterLevel grid. E.g. CADPTS_SLD.DAT.
+                    Default is CADPTS.DAT
 -n                  New Line character -> None, '', '\\n', '\\r', and '\\r\\n'. Default is '\\n'.
 """
-    print(usageText)
+    print(usageText % (TIMESERIES_BATCH_SIZE, MYSQL_POOL_SIZE - 1))
 
 try :
     # print('Config :: ', CONFIG)
@@ -47,12 +91,15 @@ try :
     WATER_LEVEL_DIR_NAME = 'water_level'
     WATER_LEVEL_GRID_DIR_NAME = 'water_level_grid'
     CADPTS_DAT_FILE = './META_FLO2D/CADPTS.DAT'
+    BASE_OUT_FILE = 'BASE.OUT'
+    RUN_FLO2D_FILE = 'RUN_FLO2D.json'
     
     OUTPUT_DIR = './OUTPUT'
     RF_DIR_PATH = '/mnt/disks/wrf-mod/OUTPUT/'
     DIS_OUTPUT_DIR = OUTPUT_DIR
     WL_OUTPUT_DIR = OUTPUT_DIR
     WL_GRID_OUTPUT_DIR = OUTPUT_DIR
+    FLO2D_MODEL_PATH = ''
 
     DIS_RESOLUTION = 24 # In 1 hours
     RF_RESOLUTION = 24 # In 1 hours
@@ -64,6 +111,8 @@ try :
     MYSQL_USER="root"
     MYSQL_DB="curw"
     MYSQL_PASSWORD=""
+    MYSQL_BATCH_SIZE = TIMESERIES_BATCH_SIZE
+    MYSQL_WORKERS = MYSQL_POOL_SIZE - 1
 
     if 'DISCHARGE_CSV_FILE' in CONFIG :
         DISCHARGE_CSV_FILE = CONFIG['DISCHARGE_CSV_FILE']
@@ -71,6 +120,10 @@ try :
         RAIN_CSV_FILE = CONFIG['RAIN_CSV_FILE']
     if 'RF_DIR_PATH' in CONFIG :
         RF_DIR_PATH = CONFIG['RF_DIR_PATH']
+    if 'CADPTS_DAT_FILE' in CONFIG :
+        CADPTS_DAT_FILE = './META_FLO2D/%s' % CONFIG['CADPTS_DAT_FILE']
+    if 'BASE_OUT_FILE' in CONFIG :
+        BASE_OUT_FILE = CONFIG['BASE_OUT_FILE']
     if 'OUTPUT_DIR' in CONFIG :
         OUTPUT_DIR = CONFIG['OUTPUT_DIR']
         DIS_OUTPUT_DIR = OUTPUT_DIR
@@ -85,9 +138,15 @@ try :
         MYSQL_DB = CONFIG['MYSQL_DB']
     if 'MYSQL_PASSWORD' in CONFIG :
         MYSQL_PASSWORD = CONFIG['MYSQL_PASSWORD']
+    if 'MYSQL_BATCH_SIZE' in CONFIG :
+        MYSQL_BATCH_SIZE = CONFIG['MYSQL_BATCH_SIZE']
+    if 'MYSQL_WORKERS' in CONFIG :
+        MYSQL_WORKERS = CONFIG['MYSQL_WORKERS']
 
     date = ''
     time = ''
+    start_date = ''
+    start_time = ''
     forceInsert = False
     allInsert = True
     rainfallInsert = False
@@ -95,12 +154,15 @@ try :
     waterlevelInsert = False
     waterlevelGridInsert = False
     flo2dStationsInsert = False
+    flo2dStationsAllMeshes = False
     waterlevelOutSuffix = ''
+    waterlevelGridSparse = False
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hd:t:frewgn:", [
-            "help", "date=", "time=", "force",
+        opts, args = getopt.getopt(sys.argv[1:], "hd:t:S:T:frewgn:", [
+            "help", "date=", "time=", "start_date=", "start_time=", "force",
             "rainfall", "discharge", "waterlevel", "waterlevelgrid", "flo2d-stations",
-            "wl-out-suffix=", "rainfall-path=", "discharge-path=", "waterlevel-path=", "waterlevelgrid-path="
+            "wl-out-suffix=", "rainfall-path=", "discharge-path=", "waterlevel-path=", "waterlevelgrid-path=",
+            "flo2d-path=", "mesh=", "wl-grid-sparse", "batch-size=", "db-workers=", "all-meshes"
         ])
     except getopt.GetoptError:          
         usage()                        
@@ -113,6 +175,10 @@ try :
             date = arg
         elif opt in ("-t", "--time"):
             time = arg
+        elif opt in ("-S", "--start_date"):
+            start_date = arg.strip()
+        elif opt in ("-T", "--start_time"):
+            start_time = arg.strip()
         elif opt in ("-f", "--force"):
             forceInsert = True
         elif opt in ("-r", "--rainfall"):
@@ -139,12 +205,50 @@ try :
         elif opt in ("--waterlevelgrid-path"):
             WL_GRID_OUTPUT_DIR = arg
             print('WARN: Using custom WaterLevel Grid Path :', WL_GRID_OUTPUT_DIR)
+        elif opt in ("--flo2d-path"):
+            FLO2D_MODEL_PATH = arg
+            print('WARN: Using FLO2D model Path :', FLO2D_MODEL_PATH)
+        elif opt == "--wl-grid-sparse":
+            waterlevelGridSparse = True
+        elif opt == "--all-meshes":
+            flo2dStationsAllMeshes = True
+        elif opt == "--batch-size":
+            MYSQL_BATCH_SIZE = int(arg)
+        elif opt == "--db-workers":
+            MYSQL_WORKERS = int(arg)
+        elif opt == "--mesh":
+            CADPTS_DAT_FILE = './META_FLO2D/%s' % arg
         elif opt in ("-n"):
             NEW_LINE = arg
 
     if rainfallInsert or dischargeInsert or waterlevelInsert or waterlevelGridInsert or flo2dStationsInsert :
         allInsert = False
 
+    # Model state time and base time of the FLO2D run of --flo2d-path, same as EXTRACTFLO2DWATERLEVELGRID.py
+    FLO2D_CONFIG = {}
+    if FLO2D_MODEL_PATH and os.path.exists(os.path.join(FLO2D_MODEL_PATH, RUN_FLO2D_FILE)) :
+        FLO2D_CONFIG = json.loads(open(os.path.join(FLO2D_MODEL_PATH, RUN_FLO2D_FILE)).read())
+    modelStateTime = datetime.datetime.now()
+    if 'MODEL_STATE_DATE' in FLO2D_CONFIG and len(FLO2D_CONFIG['MODEL_STATE_DATE']) :
+        modelStateTime = datetime.datetime.strptime(FLO2D_CONFIG['MODEL_STATE_DATE'], '%Y-%m-%d')
+    if date :
+        modelStateTime = datetime.datetime.strptime(date, '%Y-%m-%d')
+    modelStateDate = modelStateTime.strftime("%Y-%m-%d")
+    if 'MODEL_STATE_TIME' in FLO2D_CONFIG and len(FLO2D_CONFIG['MODEL_STATE_TIME']) :
+        modelStateTime = datetime.datetime.strptime('%s %s' % (modelStateDate, FLO2D_CONFIG['MODEL_STATE_TIME']), '%Y-%m-%d %H:%M:%S')
+    if time :
+        modelStateTime = datetime.datetime.strptime('%s %s' % (modelStateDate, time), '%Y-%m-%d %H:%M:%S')
+
+    if not start_date and 'TIMESERIES_START_DATE' in FLO2D_CONFIG and len(FLO2D_CONFIG['TIMESERIES_START_DATE']) :
+        start_date = FLO2D_CONFIG['TIMESERIES_START_DATE']
+    if not start_date :
+        start_date = modelStateDate
+    if not start_time and 'TIMESERIES_START_TIME' in FLO2D_CONFIG and len(FLO2D_CONFIG['TIMESERIES_START_TIME']) :
+        start_time = FLO2D_CONFIG['TIMESERIES_START_TIME']
+    if not start_time :
+        start_time = '00:00:00'
+    flo2dBaseTime = datetime.datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M:%S')
+
     # Default run for current day
     now = datetime.datetime.now()
     if date :
@@ -200,11 +304,15 @@ def storeDischarge(adapter):
     dischargeMeta['start_date'] = startDateTime.strftime("%Y-%m-%d %H:%M:%S")
     dischargeMeta['end_date'] = endDateTime.strftime("%Y-%m-%d %H:%M:%S")
 
+    dischargeMetaList = []
     for i in range(0, 6) :
         dischargeMeta['type'] = types[i]
-        eventId = adapter.get_event_id(dischargeMeta)
+        dischargeMetaList.append(copy.deepcopy(dischargeMeta))
+    loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
+    for i, (eventId, created) in enumerate(resolveEventIds(adapter, dischargeMetaList)) :
         if eventId is None :
-            eventId = adapter.create_event_id(dischargeMeta)
+            continue
+        if created :
             print('HASH SHA256 created: ', eventId)
         else :
             print('HASH SHA256 exists: ', eventId)
@@ -214,8 +322,8 @@ def storeDischarge(adapter):
         
         # for l in timeseries[:3] + timeseries[-2:] :
         #     print(l)
-        rowCount = adapter.insert_timeseries(eventId, timeseries[i*DIS_RESOLUTION:(i+1)*DIS_RESOLUTION], forceInsert)
-        print('%s rows inserted.\n' % rowCount)
+        addTimeseries(loader, eventId, timeseries[i*DIS_RESOLUTION:(i+1)*DIS_RESOLUTION])
+    print('Discharge > %s rows inserted.\n' % closeTimeseriesLoader(loader))
 
 
 def storeRainfall(adapter):
@@ -230,6 +338,7 @@ def storeRainfall(adapter):
         'name': 'Cloud-1',
     }
 
+    loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
     for station in stations :
         for filename in glob.glob(os.path.join(RF_DIR_PATH, '%s-%s*.txt' % (station, date))):
             if not os.path.exists(filename):
@@ -250,11 +359,14 @@ def storeRainfall(adapter):
             rainfallMeta['start_date'] = startDateTime.strftime("%Y-%m-%d %H:%M:%S")
             rainfallMeta['end_date'] = endDateTime.strftime("%Y-%m-%d %H:%M:%S")
 
+            rainfallMetaList = []
             for i in range(0, 3) :
                 rainfallMeta['type'] = types[i]
-                eventId = adapter.get_event_id(rainfallMeta)
+                rainfallMetaList.append(copy.deepcopy(rainfallMeta))
+            for i, (eventId, created) in enumerate(resolveEventIds(adapter, rainfallMetaList)) :
                 if eventId is None :
-                    eventId = adapter.create_event_id(rainfallMeta)
+                    continue
+                if created :
                     print('HASH SHA256 created: ', eventId)
                 else :
                     print('HASH SHA256 exists: ', eventId)
@@ -264,8 +376,8 @@ def storeRainfall(adapter):
                 
                 # for l in timeseries[:3] + timeseries[-2:] :
                 #     print(l)
-                rowCount = adapter.insert_timeseries(eventId, timeseries[i*RF_RESOLUTION:(i+1)*RF_RESOLUTION], forceInsert)
-                print('%s rows inserted.\n' % rowCount)
+                addTimeseries(loader, eventId, timeseries[i*RF_RESOLUTION:(i+1)*RF_RESOLUTION])
+    print('Rainfall > %s rows inserted.\n' % closeTimeseriesLoader(loader))
 
 
 def storeWaterlevel(adapter):
@@ -312,6 +424,7 @@ def storeWaterlevel(adapter):
         print('Discharge > Unable to find dir : ', WATER_LEVEL_DIR_PATH)
         return
 
+    loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
     for station in stations :
         for filename in glob.glob(os.path.join(WATER_LEVEL_DIR_PATH, '%s-%s-*.txt' % (WATER_LEVEL_DIR_NAME, station.replace(' ', '_')))):
             if not os.path.exists(filename):
@@ -332,80 +445,59 @@ def storeWaterlevel(adapter):
             waterlevelMeta['start_date'] = startDateTime.strftime("%Y-%m-%d %H:%M:%S")
             waterlevelMeta['end_date'] = endDateTime.strftime("%Y-%m-%d %H:%M:%S")
 
+            waterlevelMetaList = []
             for i in range(0, 6) :
                 waterlevelMeta['type'] = types[i]
-                eventId = adapter.get_event_id(waterlevelMeta)
+                waterlevelMetaList.append(copy.deepcopy(waterlevelMeta))
+            eventIds = resolveEventIds(adapter, waterlevelMetaList)
+            # Existing runs which already have timeseries of the day are checked at once. Not needed with --force.
+            withTimeseries = set()
+            if not forceInsert :
+                dailyTimeseriesList = [timeseries[i*WL_RESOLUTION:(i+1)*WL_RESOLUTION] for i in range(0, 6)]
+                withTimeseries = getEventIdsWithTimeseries(adapter, [
+                    (eventId, dailyTimeseries[0][0], dailyTimeseries[-1][0])
+                    for dailyTimeseries, (eventId, created) in zip(dailyTimeseriesList, eventIds)
+                    if eventId is not None and not created and dailyTimeseries])
+            for i, (eventId, created) in enumerate(eventIds) :
                 if eventId is None :
-                    eventId = adapter.create_event_id(waterlevelMeta)
+                    continue
+                if created :
                     print('HASH SHA256 created: ', eventId)
                 else :
                     print('HASH SHA256 exists: ', eventId)
-                    waterlevelMetaQuery = copy.deepcopy(metaData)
-                    waterlevelMetaQuery['station'] = station
-                    waterlevelMetaQuery['type'] = types[i]
-
-                    dailyTimeseries = timeseries[i*WL_RESOLUTION:(i+1)*WL_RESOLUTION]
-                    dailyStartDateTime = datetime.datetime.strptime(dailyTimeseries[0][0], '%Y-%m-%d %H:%M:%S')
-                    dailyEndDateTime = datetime.datetime.strptime(dailyTimeseries[-1][0], '%Y-%m-%d %H:%M:%S')
-                    opts = {
-                        'from': dailyStartDateTime.strftime("%Y-%m-%d %H:%M:%S"),
-                        'to': dailyEndDateTime.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    existingTimeseries = adapter.retrieve_timeseries(waterlevelMetaQuery, opts)
-                    if len(existingTimeseries[0]['timeseries']) > 0 and not forceInsert:
+                    if eventId in withTimeseries :
                         print('Timeseries already exists. User --force to update the existing.\n')
                         continue
                 
                 # for l in timeseries[:3] + timeseries[-2:] :
                 #     print(l)
-                rowCount = adapter.insert_timeseries(eventId, timeseries[i*WL_RESOLUTION:(i+1)*WL_RESOLUTION], forceInsert)
-                print('%s rows inserted.\n' % rowCount)
+                addTimeseries(loader, eventId, timeseries[i*WL_RESOLUTION:(i+1)*WL_RESOLUTION])
+    print('Waterlevel > %s rows inserted.\n' % closeTimeseriesLoader(loader))
 
 def storeFLO2DStations(adapter):
     print('\nStoring FLO2D Stations :::')
 
-    CADPTS_DAT_FILE_PATH = os.path.join(ROOT_DIR, CADPTS_DAT_FILE)
-    bufsize = 65536
-    stationIDOffset = 1000
-    with open(CADPTS_DAT_FILE_PATH) as infile:
-        num_stations = 0
-        while True:
-            lines = infile.readlines(bufsize)
-
-            if not lines:
-                break
-            for line in lines:
-                s = line.split()
-                if len(s) > 0 :
-                    cellId = int(s[0])
-                    station = [Station.FLO2D, 'flo2d_%s' % (stationIDOffset + cellId), 'FLO2D %s' % cellId, s[1], s[2], 0, 'FLO2D Virtual Station']
-                    print('FLO2D Cell:', cellId, 'with latitude: %s, longitude: %s -> inserted as `FLO2D %s`' % (s[1], s[2], cellId))
-
-                    is_station_exists = adapter.get_station({'name': 'flo2d_%s' % (stationIDOffset + cellId)})
-                    if is_station_exists is None:
-                        adapter.create_station(station)
-                        num_stations += 1
-
-        print('%s stations inserted.\n' % num_stations)
+    meshFiles = [CADPTS_DAT_FILE]
+    if flo2dStationsAllMeshes :
+        meshFiles += [os.path.join(os.path.dirname(CADPTS_DAT_FILE), meshFile) for meshFile in CADPTS_DAT_FILES]
+    for meshFile in dict.fromkeys(os.path.normpath(meshFile) for meshFile in meshFiles) :
+        CADPTS_DAT_FILE_PATH = os.path.join(ROOT_DIR, meshFile)
+        if not os.path.exists(CADPTS_DAT_FILE_PATH) :
+            print('FLO2D Stations > Unable to find file : ', CADPTS_DAT_FILE_PATH)
+            continue
+        # Cells which already have a station (e.g. out of another mesh) are not inserted again
+        mesh = getMesh(CADPTS_DAT_FILE_PATH)
+        numStations, numExisting = syncFLO2DStations(adapter, Station.FLO2D, mesh['cells'].tolist(),
+                                                     mesh['x'].tolist(), mesh['y'].tolist())
+        print('%s > %s stations inserted, %s stations exist.\n' % (meshFile, numStations, numExisting))
 
 def storeWaterlevelGrid(adapter):
     print('\nStoring Waterlevel Grid :::')
 
     CADPTS_DAT_FILE_PATH = os.path.join(ROOT_DIR, CADPTS_DAT_FILE)
-    bufsize = 65536
-    stationIDOffset = 1000
-    CELLS = []
-    with open(CADPTS_DAT_FILE_PATH) as infile:
-        while True:
-            lines = infile.readlines(bufsize)
-
-            if not lines:
-                break
-            for line in lines:
-                s = line.split()
-                if len(s) > 0 :
-                    cellId = int(s[0])
-                    CELLS.append(cellId)
+    # Cells of the mesh are loaded from the cache next to CADPTS.DAT
+    mesh = getMesh(CADPTS_DAT_FILE_PATH)
+    CELLS = mesh['cells'].tolist()
 
     types = [
         'Forecast-0-d',
@@ -424,33 +516,91 @@ def storeWaterlevelGrid(adapter):
         'name': 'Cloud-WL-Grid',
     }
 
-    WATER_LEVEL_GRID_DIR_PATH = os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix))
-    if not os.path.exists(WATER_LEVEL_GRID_DIR_PATH):
-        print('Discharge > Unable to find dir : ', WATER_LEVEL_GRID_DIR_PATH)
-        return
-
-    boundary    = getGridBoudary()
-    CellGrid    = getCellGrid(boundary)
     waterLevelGridSeriesDict = dict.fromkeys(CELLS, [])
 
-    for fileName in sorted(glob.glob(os.path.join(WATER_LEVEL_GRID_DIR_PATH, '%s-*.asc' % (WATER_LEVEL_GRID_DIR_NAME)))) :
-        if not os.path.exists(fileName):
-            print('Discharge > Unable to find file : ', fileName)
-            break
+    BASE_OUT_FILE_PATH = os.path.join(FLO2D_MODEL_PATH, BASE_OUT_FILE)
+    if FLO2D_MODEL_PATH and os.path.exists(BASE_OUT_FILE_PATH) :
+        # Read the depths from the cache of BASE.OUT instead of parsing the grid files
+        print('Waterlevel Grid > Reading from cache of', BASE_OUT_FILE_PATH)
+        cache = getBaseOutCache(BASE_OUT_FILE_PATH)
+        print('Waterlevel Grid > Base time', flo2dBaseTime, 'and model state time', modelStateTime)
+        steps = []
+        dateTimes = []
+        for step, modelTime in enumerate(cache['times'].tolist()) :
+            dateTime = flo2dBaseTime + datetime.timedelta(hours=modelTime)
+            # Same as the grid files, which are only created from the model state time
+            if dateTime >= modelStateTime :
+                steps.append(step)
+                dateTimes.append(dateTime.strftime("%Y-%m-%d %H:%M:%S"))
+        depths = cache['depth'][steps]
+        cellIndex = {cellNo: k for k, cellNo in enumerate(cache['cells'].tolist())}
+        for cellNo in CELLS :
+            values = [WL_GRID_MISSING_VALUE] * len(dateTimes)
+            if cellNo in cellIndex :
+                values = depths[:, cellIndex[cellNo]]
+                values = np.where(np.isfinite(values), values, WL_GRID_MISSING_VALUE).tolist()
+            waterLevelGridSeriesDict[cellNo] = [list(row) for row in zip(dateTimes, values)]
+    elif os.path.exists(os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix, CUBE_SUFFIX))) :
+        # Read the time series of all the cells from the water depth cube at once
+        WATER_LEVEL_GRID_CUBE_PATH = os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix, CUBE_SUFFIX))
+        print('Waterlevel Grid > Reading from water depth cube', WATER_LEVEL_GRID_CUBE_PATH)
+        boundary    = getGridBoudary(mesh=mesh)
+        CellGrid    = getCellGrid(boundary, mesh=mesh)
+        cube = openCube(WATER_LEVEL_GRID_CUBE_PATH)
+        try :
+            series = readCubeSeries(cube, [CellGrid[cellNo][1] for cellNo in CELLS], [CellGrid[cellNo][0] for cellNo in CELLS])
+        finally :
+            closeCube(cube)
+        # Time axis is formatted once for all the cells
+        dateTimes = formatTimes(cube['times'])
+        for k, cellNo in enumerate(CELLS) :
+            waterLevelGridSeriesDict[cellNo] = [list(row) for row in zip(dateTimes, series[:, k].tolist())]
+    elif os.path.exists(os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix, SPARSE_GRID_SUFFIX))) :
+        # Re-expand the time series of all the cells from the wet cells at once
+        WATER_LEVEL_GRID_SPARSE_PATH = os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix, SPARSE_GRID_SUFFIX))
+        print('Waterlevel Grid > Reading from wet cells file', WATER_LEVEL_GRID_SPARSE_PATH)
+        boundary    = getGridBoudary(mesh=mesh)
+        CellGrid    = getCellGrid(boundary, mesh=mesh)
+        sparse = openSparseGrid(WATER_LEVEL_GRID_SPARSE_PATH)
+        series = readSparseGridSeries(sparse, [CellGrid[cellNo][1] for cellNo in CELLS], [CellGrid[cellNo][0] for cellNo in CELLS])
+        # Time axis is formatted once for all the cells
+        dateTimes = formatTimes(sparse['times'])
+        for k, cellNo in enumerate(CELLS) :
+            waterLevelGridSeriesDict[cellNo] = [list(row) for row in zip(dateTimes, series[:, k].tolist())]
+    else :
+        WATER_LEVEL_GRID_DIR_PATH = os.path.join(WL_GRID_OUTPUT_DIR, '%s-%s' % (WATER_LEVEL_GRID_DIR_NAME, waterlevelOutSuffix))
+        if not os.path.exists(WATER_LEVEL_GRID_DIR_PATH):
+            print('Discharge > Unable to find dir : ', WATER_LEVEL_GRID_DIR_PATH)
+            return
+
+        boundary    = getGridBoudary(mesh=mesh)
+        CellGrid    = getCellGrid(boundary, mesh=mesh)
+
+        # Both plain (.asc) and gzip compressed (.asc.gz) grid files are accepted
+        gridFiles = getEsriGridFiles(WATER_LEVEL_GRID_DIR_PATH, WATER_LEVEL_GRID_DIR_NAME)
+        cellCols = np.array([CellGrid[cellNo][0] for cellNo in CELLS], dtype=np.int64)
+        cellRows = np.array([CellGrid[cellNo][1] for cellNo in CELLS], dtype=np.int64)
+        # Values of all the cells are gathered into a single (timesteps x cells) matrix, one row per grid file
+        series = np.empty((len(gridFiles), len(CELLS)))
+        steps = 0
+        for dateTime, fileName in gridFiles :
+            if not os.path.exists(fileName):
+                print('Discharge > Unable to find file : ', fileName)
+                break
 
-        # Extract time from fileName
-        ascFileName = fileName.rsplit('/', 1)[-1]
-        dateTimeStr = ascFileName[len(WATER_LEVEL_GRID_DIR_NAME)+1:-4]
-        dateTime = datetime.datetime.strptime(dateTimeStr, '%Y-%m-%d_%H-%M-%S')
+            ascFileName = os.path.basename(fileName)
+            ascii_grid = readEsriGridFile(fileName)
+            series[steps] = ascii_grid[cellRows, cellCols]
+            steps += 1
+            print('Scanned Waterlevel Grid file :', ascFileName)
 
-        ascii_grid = np.loadtxt(fileName, skiprows=6)
-        for cellNo in CELLS :
-            i, j = CellGrid[cellNo]
-            tmpTS = waterLevelGridSeriesDict[cellNo][:]
-            tmpTS.append([dateTime.strftime("%Y-%m-%d %H:%M:%S"), ascii_grid[j][i] ])
-            waterLevelGridSeriesDict[cellNo] = tmpTS
-        print('Scanned Waterlevel Grid file :', ascFileName)
+        # Time axis is formatted once for all the cells
+        dateTimes = formatTimes(np.array([dateTime for dateTime, fileName in gridFiles[:steps]], dtype='datetime64[s]'))
+        for k, cellNo in enumerate(CELLS) :
+            waterLevelGridSeriesDict[cellNo] = [list(row) for row in zip(dateTimes, series[:steps, k].tolist())]
 
+    # Daily timeseries of all the cells are collected first, thus the event ids are resolved at once
+    runs = []
     for station in CELLS :
         timeseries = waterLevelGridSeriesDict[station]
 
@@ -472,48 +622,59 @@ def storeWaterlevelGrid(adapter):
 
         for i in range(0, 6) :
             waterlevelGridMeta['type'] = types[i]
-            eventId = adapter.get_event_id(waterlevelGridMeta)
-            if eventId is None :
-                eventId = adapter.create_event_id(waterlevelGridMeta)
-                print('HASH SHA256 created: ', eventId)
-            else :
-                print('HASH SHA256 exists: ', eventId)
-                waterlevelGridMetaQuery = copy.deepcopy(metaData)
-                waterlevelGridMetaQuery['station'] = 'FLO2D %s' % station
-                waterlevelGridMetaQuery['type'] = types[i]
-
-                dailyTimeseries = timeseries[i*WL_GRID_RESOLUTION:(i+1)*WL_GRID_RESOLUTION]
-                dailyStartDateTime = datetime.datetime.strptime(dailyTimeseries[0][0], '%Y-%m-%d %H:%M:%S')
-                dailyEndDateTime = datetime.datetime.strptime(dailyTimeseries[-1][0], '%Y-%m-%d %H:%M:%S')
-                opts = {
-                    'from': dailyStartDateTime.strftime("%Y-%m-%d %H:%M:%S"),
-                    'to': dailyEndDateTime.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                existingTimeseries = adapter.retrieve_timeseries(waterlevelGridMetaQuery, opts)
-                if len(existingTimeseries[0]['timeseries']) > 0 and not forceInsert:
-                    print('Timeseries already exists. User --force to update the existing.\n')
+            dailyTimeseries = timeseries[i*WL_GRID_RESOLUTION:(i+1)*WL_GRID_RESOLUTION]
+            if waterlevelGridSparse :
+                # Only the wet rows are stored. Missing rows of the day are dry.
+                dailyTimeseries = [row for row in dailyTimeseries if row[1] > 0]
+                if not dailyTimeseries :
                     continue
+            runs.append([station, i, copy.deepcopy(waterlevelGridMeta), dailyTimeseries])
+
+    eventIds = resolveEventIds(adapter, [run[2] for run in runs])
+    # Existing runs which already have timeseries of the day are checked at once. Not needed with --force.
+    withTimeseries = set()
+    if not forceInsert :
+        withTimeseries = getEventIdsWithTimeseries(adapter, [
+            (eventId, dailyTimeseries[0][0], dailyTimeseries[-1][0])
+            for (station, i, waterlevelGridMeta, dailyTimeseries), (eventId, created) in zip(runs, eventIds)
+            if eventId is not None and not created and dailyTimeseries])
+    loader = openTimeseriesLoader(adapter, MYSQL_BATCH_SIZE, forceInsert, pool, MYSQL_WORKERS)
+    for (station, i, waterlevelGridMeta, dailyTimeseries), (eventId, created) in zip(runs, eventIds) :
+        if eventId is None :
+            continue
+        if created :
+            print('HASH SHA256 created: ', eventId)
+        else :
+            print('HASH SHA256 exists: ', eventId)
+            if eventId in withTimeseries :
+                print('Timeseries already exists. User --force to update the existing.\n')
+                continue
 
-            # for l in timeseries[:3] + timeseries[-2:] :
-            #     print(l)
-            rowCount = adapter.insert_timeseries(eventId, timeseries[i*WL_GRID_RESOLUTION:(i+1)*WL_GRID_RESOLUTION], forceInsert)
-            print('%s rows inserted.\n' % rowCount)
-
+        # for l in timeseries[:3] + timeseries[-2:] :
+        #     print(l)
+        addTimeseries(loader, eventId, dailyTimeseries)
+    print('Waterlevel Grid > %s rows inserted.\n' % closeTimeseriesLoader(loader))
 
 
-adapter = MySQLAdapter(host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD, db=MYSQL_DB)
 
-if rainfallInsert or allInsert :
-    storeRainfall(adapter)
+# Connection of the lookups, and a connection for each of the threads which insert the timeseries.
+# The adapter is used until the end, then all the connections are closed along with the pool.
+pool = getAdapterPool(MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_WORKERS + 1)
+adapter = acquireAdapter(pool)
+try :
+    if rainfallInsert or allInsert :
+        storeRainfall(adapter)
 
-if dischargeInsert or allInsert :
-    storeDischarge(adapter)
+    if dischargeInsert or allInsert :
+        storeDischarge(adapter)
 
-if waterlevelInsert or allInsert :
-    storeWaterlevel(adapter)
+    if waterlevelInsert or allInsert :
+        storeWaterlevel(adapter)
 
-if waterlevelGridInsert or allInsert :
-    storeWaterlevelGrid(adapter)
+    if waterlevelGridInsert or allInsert :
+        storeWaterlevelGrid(adapter)
 
-if flo2dStationsInsert :
-    storeFLO2DStations(adapter)
+    if flo2dStationsInsert :
+        storeFLO2DStations(adapter)
+finally :
+    closeAdapterPool(pool)
@@ -181,6 +181,20 @@ class StoreHandler(BaseHTTPRequestHandler):
 
                 if run_config.get('RUN_NAME'):
                     exec_list = exec_list + ['-name', run_config.get('RUN_NAME')]
+                # Write a single water depth cube file instead of a directory of grid files
+                if run_config.get('CUBE'):
+                    exec_list = exec_list + ['-cube', "True"]
+                # Write only the wet cells of each timestep into a single file
+                if run_config.get('SPARSE'):
+                    exec_list = exec_list + ['-sparse', "True"]
+                if run_config.get('GRID_WORKERS'):
+                    exec_list = exec_list + ['-workers', str(run_config.get('GRID_WORKERS'))]
+                # Write gzip compressed grid files (.asc.gz)
+                if run_config.get('GRID_GZIP'):
+                    exec_list = exec_list + ['-gzip', "True"]
+                # Also write the grids downsampled to 2x, 4x and 8x cell size ("max" or "mean")
+                if run_config.get('GRID_PYRAMID'):
+                    exec_list = exec_list + ['-pyramid', run_config.get('GRID_PYRAMID')]
 
                 print('exec List:', exec_list)
 
@@ -228,6 +242,15 @@ class StoreHandler(BaseHTTPRequestHandler):
 
                 if run_config.get('RUN_NAME'):
                     exec_list = exec_list + ['-name', run_config.get('RUN_NAME')]
+                # Extract other HYCHAN.OUT variables (e.g. 'elevation,discharge') in the same pass
+                if run_config.get('VARIABLES'):
+                    exec_list = exec_list + ['-variables', run_config.get('VARIABLES')]
+                # Number of worker processes which decode HYCHAN.OUT elements
+                if run_config.get('WORKERS'):
+                    exec_list = exec_list + ['-workers', str(run_config.get('WORKERS'))]
+                # Extract every channel element in CHAN.DAT into a single time x element file
+                if run_config.get('ALL_CHANNELS'):
+                    exec_list = exec_list + ['-all_channels', "True"]
                 # TODO: Handle passing forceInsert
                 exec_list = exec_list + ['-forceInsert', "True"]
 
@@ -277,6 +300,12 @@ class StoreHandler(BaseHTTPRequestHandler):
 
                 if run_config.get('RUN_NAME'):
                     exec_list = exec_list + ['-name', run_config.get('RUN_NAME')]
+                # Number of worker processes which decode HYCHAN.OUT elements
+                if run_config.get('WORKERS'):
+                    exec_list = exec_list + ['-workers', str(run_config.get('WORKERS'))]
+                # Extract every channel element in CHAN.DAT into a single time x element file
+                if run_config.get('ALL_CHANNELS'):
+                    exec_list = exec_list + ['-all_channels', "True"]
                 # TODO: Handle passing forceInsert
                 exec_list = exec_list + ['-forceInsert', "True"]
 
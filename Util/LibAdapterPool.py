@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+
+import queue
+import threading
+
+# Maximum number of connections of a pool
+MYSQL_POOL_SIZE = 5
+
+# Pools of the process, by connection parameters
+ADAPTER_POOLS = {}
+ADAPTER_POOLS_LOCK = threading.Lock()
+
+
+def getAdapterPool(host, user, password, db, size=MYSQL_POOL_SIZE):
+    """
+    Get the pool of MySQLAdapters (i.e. connections) of the database. Same pool is returned for the same
+    connection parameters within the process. Adapters are only connected when they are acquired.
+    Close the pool with closeAdapterPool once the process is done with the database.
+
+    :param int size: Maximum number of adapters of the pool. acquireAdapter blocks once all of them are in use.
+    If the pool already exists with a smaller size, it is grown to the size.
+    :return: dict of the pool state
+    """
+    with ADAPTER_POOLS_LOCK:
+        key = (host, user, db)
+        if key not in ADAPTER_POOLS:
+            ADAPTER_POOLS[key] = {
+                'params': {'host': host, 'user': user, 'password': password, 'db': db},
+                'size': max(size, 1),
+                'idle': queue.LifoQueue(),
+                'adapters': [],
+                'lock': threading.Lock()
+            }
+        pool = ADAPTER_POOLS[key]
+    with pool['lock']:
+        pool['size'] = max(pool['size'], size)
+    return pool
+
+
+def acquireAdapter(pool):
+    """
+    Take an adapter of the pool for the exclusive use of the caller. Give it back with releaseAdapter.
+    Adapters are kept connected while they are idle, until closeAdapterPool.
+    """
+    try:
+        return pool['idle'].get_nowait()
+    except queue.Empty:
+        pass
+    with pool['lock']:
+        if len(pool['adapters']) < pool['size']:
+            # Only the users of the database need the adapter
+            from curwmysqladapter import MySQLAdapter
+            adapter = MySQLAdapter(**pool['params'])
+            pool['adapters'].append(adapter)
+            return adapter
+    return pool['idle'].get()
+
+
+def releaseAdapter(pool, adapter):
+    pool['idle'].put(adapter)
+
+
+def closeAdapterPool(pool):
+    """
+    Close the connections of all the adapters of the pool, including the adapters which are not released.
+    Thus a script can acquire its adapter once and close the pool at the end. The pool can be used again,
+    with new connections.
+    """
+    with pool['lock']:
+        for adapter in pool['adapters']:
+            adapter.close()
+        pool['adapters'] = []
+        pool['idle'] = queue.LifoQueue()
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+
+import hashlib
+import json
+
+# Fields of the metadata which identify a run (i.e. the event id). Same as MySQLAdapter
+EVENT_META_KEYS = ['station', 'variable', 'unit', 'type', 'source', 'name']
+# Lookup tables of the fields of a run, as (metadata key, table, name column). See createEventIds
+EVENT_META_TABLES = [
+    ('station', 'station', 'name'),
+    ('variable', 'variable', 'variable'),
+    ('unit', 'unit', 'unit'),
+    ('type', 'type', 'type'),
+    ('source', 'source', 'source')
+]
+# Maximum number of values in a single `IN (...)` query
+EVENT_ID_QUERY_SIZE = 1000
+
+# Event ids which are known to exist in the database, for the lifetime of the process
+KNOWN_EVENT_IDS = set()
+
+
+def getEventId(meta_data):
+    """
+    Compute the event id of the metadata locally, without querying the database.
+    Same as the SHA256 hash of MySQLAdapter.get_event_id and create_event_id.
+
+    :param meta_data: dict with station, variable, unit, type, source and name. Other keys are ignored.
+    :return: Event id as a hex string
+    """
+    hash_data = {key: meta_data[key] for key in EVENT_META_KEYS}
+    return hashlib.sha256(json.dumps(hash_data, sort_keys=True).encode('ascii')).hexdigest()
+
+
+def getExistingEventIds(adapter, event_ids):
+    """
+    Query which of the event ids exist in the `run` table, EVENT_ID_QUERY_SIZE ids per query.
+
+    :return: set of the existing event ids
+    """
+    existing = set()
+    with adapter.connection.cursor() as cursor:
+        for k in range(0, len(event_ids), EVENT_ID_QUERY_SIZE):
+            chunk = event_ids[k:k + EVENT_ID_QUERY_SIZE]
+            sql = "SELECT `id` FROM `run` WHERE `id` IN (%s)" % ', '.join(['%s'] * len(chunk))
+            cursor.execute(sql, chunk)
+            existing.update(row['id'] for row in cursor.fetchall())
+
+    return existing
+
+
+def getEventIdsWithTimeseries(adapter, event_ranges):
+    """
+    Query which of the events already have timeseries within a time range, EVENT_ID_QUERY_SIZE events of the
+    same time range per query. Bulk replacement of MySQLAdapter.retrieve_timeseries for each event.
+
+    :param event_ranges: list of (event id, from, to) where from and to are in '%Y-%m-%d %H:%M:%S' format
+    :return: set of the event ids which have timeseries within their time range
+    """
+    events_by_range = {}
+    for event_id, start, end in event_ranges:
+        events_by_range.setdefault((start, end), []).append(event_id)
+
+    with_timeseries = set()
+    with adapter.connection.cursor() as cursor:
+        for (start, end), event_ids in events_by_range.items():
+            event_ids = list(dict.fromkeys(event_ids))
+            for k in range(0, len(event_ids), EVENT_ID_QUERY_SIZE):
+                chunk = event_ids[k:k + EVENT_ID_QUERY_SIZE]
+                sql = "SELECT DISTINCT `id` FROM `data` WHERE `id` IN (%s) AND `time` BETWEEN %%s AND %%s" % \
+                      ', '.join(['%s'] * len(chunk))
+                cursor.execute(sql, chunk + [start, end])
+                with_timeseries.update(row['id'] for row in cursor.fetchall())
+
+    return with_timeseries
+
+
+def createEventIds(adapter, meta_data_dict):
+    """
+    Create the runs of the metadata with a single batched insert into the `run` table, instead of
+    MySQLAdapter.create_event_id for each metadata. This is the only function which writes the runs, thus the only one
+    which depends on the schema of the curw database (same as MySQLAdapter.create_event_id):
+    - `run` (`id`, `name`, `station`, `variable`, `unit`, `type`, `source`, `start_date`, `end_date`)
+    - `station`, `variable`, `unit`, `type` and `source` of a run are the `id` of the lookup tables of EVENT_META_TABLES,
+      i.e. `station` (`id`, `name`), `variable` (`id`, `variable`), `unit` (`id`, `unit`), `type` (`id`, `type`)
+      and `source` (`id`, `source`)
+    Runs are not created for the metadata whose station, variable, unit, type or source does not exist.
+
+    :param meta_data_dict: dict of event id -> metadata
+    :return: set of the created event ids
+    """
+    if not meta_data_dict:
+        return set()
+    # Ids of the station, variable, unit, type and source names, with a query per lookup table
+    meta_ids = {}
+    with adapter.connection.cursor() as cursor:
+        for key, table, column in EVENT_META_TABLES:
+            names = sorted(set(meta_data[key] for meta_data in meta_data_dict.values()))
+            meta_ids[key] = {}
+            for k in range(0, len(names), EVENT_ID_QUERY_SIZE):
+                chunk = names[k:k + EVENT_ID_QUERY_SIZE]
+                sql = "SELECT `id`, `%s` AS `name` FROM `%s` WHERE `%s` IN (%s)" % \
+                      (column, table, column, ', '.join(['%s'] * len(chunk)))
+                cursor.execute(sql, chunk)
+                meta_ids[key].update((row['name'], row['id']) for row in cursor.fetchall())
+
+    rows = []
+    for event_id, meta_data in meta_data_dict.items():
+        missing = [key for key, table, column in EVENT_META_TABLES if meta_data[key] not in meta_ids[key]]
+        if missing:
+            print('Unable to create event id for', meta_data, 'Unknown', missing)
+            continue
+        rows.append((event_id, meta_data['name'], meta_ids['station'][meta_data['station']],
+                     meta_ids['variable'][meta_data['variable']], meta_ids['unit'][meta_data['unit']],
+                     meta_ids['type'][meta_data['type']], meta_ids['source'][meta_data['source']],
+                     meta_data.get('start_date'), meta_data.get('end_date')))
+
+    if rows:
+        with adapter.connection.cursor() as cursor:
+            sql = "INSERT INTO `run` (`id`, `name`, `station`, `variable`, `unit`, `type`, `source`, " \
+                  "`start_date`, `end_date`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+            cursor.executemany(sql, rows)
+        adapter.connection.commit()
+
+    return set(row[0] for row in rows)
+
+
+def resolveEventIds(adapter, meta_data_list, create=True):
+    """
+    Bulk replacement of MySQLAdapter.get_event_id followed by create_event_id for a list of metadata.
+    Event ids are computed locally, the existing ones are fetched at once and the missing ones are created
+    with a single batched insert. Event ids which are known to exist are not queried again by the process.
+
+    :param meta_data_list: list of metadata dicts. See getEventId
+    :param bool create: Create the runs which do not exist
+    :return: list of (event id, created) for each metadata, where event id is None if the run does not exist
+    (and not created), and created is True if the run is created by this call
+    """
+    event_ids = [getEventId(meta_data) for meta_data in meta_data_list]
+    unknown = [event_id for event_id in dict.fromkeys(event_ids) if event_id not in KNOWN_EVENT_IDS]
+    if unknown:
+        KNOWN_EVENT_IDS.update(getExistingEventIds(adapter, unknown))
+
+    created = set()
+    if create:
+        missing = {}
+        for event_id, meta_data in zip(event_ids, meta_data_list):
+            if event_id not in KNOWN_EVENT_IDS and event_id not in missing:
+                missing[event_id] = meta_data
+        created = createEventIds(adapter, missing)
+        KNOWN_EVENT_IDS.update(created)
+
+    return [(event_id if event_id in KNOWN_EVENT_IDS else None, event_id in created) for event_id in event_ids]
@@ -2,7 +2,10 @@
 
 from datetime import datetime
 import copy
+import numpy as np
 import Constants
+from Util.LibEventIds import resolveEventIds
+from Util.LibTimeseriesLoader import addTimeseries
 
 
 def extractForecastTimeseries(timeseries, extract_date, extract_time, by_day=False):
@@ -59,7 +62,84 @@ def extractForecastTimeseriesInDays(timeseries):
     return new_timeseries
 
 
-def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_time, my_opts):
+def getTimesFromHours(base_time, hours):
+    """
+    Get the timestamps of the model times at once. Same as base_time + timedelta(hours=hour) for each hour.
+
+    :param datetime base_time: Base time of the model output
+    :param hours: Model times in hours
+    :return: datetime64[us] array
+    """
+    offsets = np.round(np.asarray(hours, dtype=np.float64) * 3600e6).astype(np.int64).astype('timedelta64[us]')
+    return np.datetime64(base_time, 'us') + offsets
+
+
+def getTimeseriesArrays(timeseries):
+    """
+    Get the timestamps and values of a timeseries as arrays.
+    Timestamps are parsed by numpy in a single step, instead of strptime of each row.
+
+    :param timeseries: (times, values) arrays or list of [<%Y-%m-%d %H:%M:%S> or datetime, value] rows
+    :return: (times, values) where times is a datetime64[s] array
+    """
+    if isinstance(timeseries, tuple):
+        times, values = timeseries
+        return np.asarray(times, dtype='datetime64[s]'), np.asarray(values)
+    if not len(timeseries):
+        return np.empty(0, dtype='datetime64[s]'), []
+    times = np.array([row[0] for row in timeseries], dtype='datetime64[s]')
+    return times, [row[1] for row in timeseries]
+
+
+def formatTimes(times):
+    """
+    Format the timestamps into <%Y-%m-%d %H:%M:%S> strings at once.
+
+    :param times: datetime64 array
+    :return: list of strings
+    """
+    return np.char.replace(np.datetime_as_string(times.astype('datetime64[s]')), 'T', ' ').tolist()
+
+
+def formatTimeseries(times, values):
+    """
+    Format the timestamps into <%Y-%m-%d %H:%M:%S> strings at once and create the timeseries rows.
+
+    :param times: datetime64 array
+    :param values: array or list of values
+    :return: list of [<%Y-%m-%d %H:%M:%S>, value] rows
+    """
+    timestamps = formatTimes(times)
+    values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    return [list(row) for row in zip(timestamps, values)]
+
+
+def getForecastTimeseriesInDays(timeseries, extract_date, utc_offset=None):
+    """
+    Same as extractForecastTimeseries by day followed by extractForecastTimeseriesInDays,
+    but on the timestamps as datetime64 arrays. Timestamps are only formatted into strings on the returned rows.
+
+    :param timeseries: (times, values) arrays or list of [<%Y-%m-%d %H:%M:%S> or datetime, value] rows
+    :param extract_date: Extract the timeseries from this date onwards. In YYYY-MM-DD format.
+    :param timedelta utc_offset: Shift the timestamps by the offset before extracting
+    :return: list of timeseries for each day
+    """
+    times, values = getTimeseriesArrays(timeseries)
+    if utc_offset:
+        times = times + np.timedelta64(int(utc_offset.total_seconds()), 's')
+
+    after = np.flatnonzero(times >= np.datetime64(extract_date, 's'))
+    start = after[0] if len(after) else len(times)
+    times, values = times[start:], values[start:]
+
+    # Divide at the change of the day. Same as extractForecastTimeseriesInDays, the last day is left out.
+    days = times.astype('datetime64[D]')
+    ends = (np.flatnonzero(days[1:] != days[:-1]) + 1).tolist()
+    starts = [0] + ends[:-1]
+    return [formatTimeseries(times[i:j], values[i:j]) for i, j in zip(starts, ends)]
+
+
+def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_time, my_opts, loader=None):
     print('LibForecastTimeseries:: save_forecast_timeseries')
 
     # Convert date time with offset
@@ -69,19 +149,8 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
         my_model_date = date_time.strftime('%Y-%m-%d')
         my_model_time = date_time.strftime('%H:%M:%S')
 
-    # If there is an offset, shift by offset before proceed
-    forecast_timeseries = []
-    if 'utcOffset' in my_opts:
-        for item in my_timeseries:
-            forecast_timeseries.append(
-                [datetime.strptime(item[0], Constants.COMMON_DATE_TIME_FORMAT) + my_opts['utcOffset'], item[1]])
-
-        forecast_timeseries = extractForecastTimeseries(my_timeseries, my_model_date, my_model_time, by_day=True)
-    else:
-        forecast_timeseries = extractForecastTimeseries(my_timeseries, my_model_date, my_model_time, by_day=True)
-
-    # print(forecastTimeseries[:10])
-    extracted_timeseries = extractForecastTimeseriesInDays(forecast_timeseries)
+    # NOTE: Only the extract date is shifted by the offset, not the timestamps of the timeseries
+    extracted_timeseries = getForecastTimeseriesInDays(my_timeseries, my_model_date)
 
     # for ll in extractedTimeseries :
     #     print(ll)
@@ -132,12 +201,19 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
         'source': source,
         'name': run_name
     }
-    for i in range(0, min(len(types), len(extracted_timeseries))):
+    # Days before fromDay are already stored. E.g. the completed days while following BASE.OUT
+    days = range(my_opts.get('fromDay', 0), min(len(types), len(extracted_timeseries)))
+    meta_data_list = []
+    for i in days:
         meta_data_copy = copy.deepcopy(meta_data)
         meta_data_copy['type'] = types[i]
-        event_id = my_adapter.get_event_id(meta_data_copy)
+        meta_data_list.append(meta_data_copy)
+    # Event ids of all the days are resolved at once
+    event_ids = resolveEventIds(my_adapter, meta_data_list)
+    for i, (event_id, created) in zip(days, event_ids):
         if event_id is None:
-            event_id = my_adapter.create_event_id(meta_data_copy)
+            continue
+        if created:
             print('HASH SHA256 created: ', event_id)
         else:
             print('HASH SHA256 exists: ', event_id)
@@ -147,6 +223,12 @@ def save_forecast_timeseries(my_adapter, my_timeseries, my_model_date, my_model_
 
         # for l in timeseries[:3] + timeseries[-2:] :
         #     print(l)
+        if loader is not None:
+            # Inserted along with the timeseries of the other stations. See Util.LibTimeseriesLoader
+            addTimeseries(loader, event_id, extracted_timeseries[i])
+            continue
         row_count = my_adapter.insert_timeseries(event_id, extracted_timeseries[i], force_insert)
         print('%s rows inserted.\n' % row_count)
-        # -- END OF SAVE_FORECAST_TIMESERIES
+    # Number of the days which are completed, i.e. fromDay of the next call
+    return days.stop
+    # -- END OF SAVE_FORECAST_TIMESERIES
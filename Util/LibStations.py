@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+# Station id of a FLO2D cell is 'flo2d_<FLO2D_STATION_ID_OFFSET + cell number>', and its name is 'FLO2D <cell number>'
+FLO2D_STATION_ID_OFFSET = 1000
+FLO2D_STATION_DESCRIPTION = 'FLO2D Virtual Station'
+# Number of stations of a single multi-row INSERT statement
+STATION_INSERT_ROWS = 1000
+
+
+def getFLO2DStation(cellId, latitude, longitude):
+    """
+    Station of a FLO2D cell, in the form of MySQLAdapter.create_station (without the station type)
+
+    :return: [stationId, name, latitude, longitude, resolution, description]
+    """
+    return ['flo2d_%s' % (FLO2D_STATION_ID_OFFSET + cellId), 'FLO2D %s' % cellId, latitude, longitude, 0,
+            FLO2D_STATION_DESCRIPTION]
+
+
+def getStationIdRange(stationType):
+    """
+    Range of the `id` of the stations of the type. Each type owns the ids from its value up to the next type.
+
+    :param stationType: curwmysqladapter.Station. E.g. Station.FLO2D
+    :return: (first id, end id)
+    """
+    higher = [station.value for station in type(stationType) if station.value > stationType.value]
+    return stationType.value, min(higher) if higher else stationType.value + 100000
+
+
+def getExistingStationIds(adapter, stationIdPrefix):
+    """
+    Get the `stationId` of all the stations which start with the prefix, with a single query.
+
+    :param string stationIdPrefix: E.g. 'flo2d_'
+    :return: set of stationId
+    """
+    pattern = stationIdPrefix.replace('\\', '\\\\').replace('_', '\\_').replace('%', '\\%') + '%'
+    with adapter.connection.cursor() as cursor:
+        cursor.execute("SELECT `stationId` FROM `station` WHERE `stationId` LIKE %s", (pattern,))
+        return set(row['stationId'] for row in cursor.fetchall())
+
+
+def createStations(adapter, stationType, stations):
+    """
+    Create the stations of the type with multi-row inserts of STATION_INSERT_ROWS stations, a transaction each.
+    Same as MySQLAdapter.create_station, the `id` of the stations follow the highest `id` of the type.
+
+    :param stationType: curwmysqladapter.Station. E.g. Station.FLO2D
+    :param stations: list of [stationId, name, latitude, longitude, resolution, description]
+    :return: Number of the stations created
+    """
+    if not stations:
+        return 0
+    firstId, endId = getStationIdRange(stationType)
+    connection = adapter.connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT MAX(`id`) AS `id` FROM `station` WHERE `id` >= %s AND `id` < %s", (firstId, endId))
+        lastId = cursor.fetchone()['id']
+    nextId = firstId if lastId is None else lastId + 1
+    if nextId + len(stations) > endId:
+        raise ValueError('Not enough station ids left for %s stations of %s' % (len(stations), stationType))
+
+    for k in range(0, len(stations), STATION_INSERT_ROWS):
+        chunk = stations[k:k + STATION_INSERT_ROWS]
+        sql = "INSERT INTO `station` (`id`, `stationId`, `name`, `latitude`, `longitude`, `resolution`, " \
+              "`description`) VALUES %s" % ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+        values = []
+        for n, station in enumerate(chunk):
+            values.extend([nextId + k + n] + list(station))
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, values)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return len(stations)
+
+
+def syncFLO2DStations(adapter, stationType, cells, latitudes, longitudes):
+    """
+    Create the stations of the FLO2D cells which do not exist yet. Existing stations are fetched with a single query.
+
+    :param stationType: Station.FLO2D
+    :param cells: Cell numbers of the mesh. E.g. LIBFLO2DWATERLEVELGRID.getMesh(...)['cells']
+    :param latitudes: Latitude of each cell
+    :param longitudes: Longitude of each cell
+    :return: (number of the stations created, number of the stations which already exist)
+    """
+    existing = getExistingStationIds(adapter, 'flo2d_')
+    stations = []
+    for cellId, latitude, longitude in zip(cells, latitudes, longitudes):
+        station = getFLO2DStation(int(cellId), latitude, longitude)
+        if station[0] not in existing:
+            existing.add(station[0])
+            stations.append(station)
+
+    return createStations(adapter, stationType, stations), len(cells) - len(stations)
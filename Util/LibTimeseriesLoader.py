@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+import queue
+import threading
+import time
+
+from Util.LibAdapterPool import acquireAdapter
+from Util.LibAdapterPool import releaseAdapter
+
+# Number of rows which are inserted in a single transaction
+TIMESERIES_BATCH_SIZE = 20000
+# Number of rows of a single multi-row INSERT statement
+TIMESERIES_INSERT_ROWS = 1000
+# Number of attempts to insert a batch, and the delay (seconds) before the first retry. The delay doubles each retry.
+TIMESERIES_RETRIES = 3
+TIMESERIES_RETRY_DELAY = 2
+
+
+def openTimeseriesLoader(adapter, batchSize=TIMESERIES_BATCH_SIZE, upsert=False, pool=None, workers=0):
+    """
+    Create a bulk loader of the timeseries of many events into the `data` table. Instead of an insert per event,
+    the rows are gathered and inserted with multi-row INSERT statements of TIMESERIES_INSERT_ROWS rows,
+    with a transaction per batchSize rows. Add the timeseries with addTimeseries and close with closeTimeseriesLoader.
+
+    :param adapter: MySQLAdapter
+    :param int batchSize: Rows per transaction. If 0, each timeseries is inserted with MySQLAdapter.insert_timeseries
+    :param bool upsert: Replace the values of the existing rows (--force). Otherwise the rows are inserted with a plain
+    INSERT, which fails on an existing row, same as MySQLAdapter.insert_timeseries. The callers skip the events which
+    already have timeseries, unless --force.
+    :param pool: Pool of adapters of the database. See Util.LibAdapterPool.getAdapterPool
+    :param int workers: Number of threads which insert the batches concurrently, each on its own adapter of the pool.
+    If 0, the batches are inserted on adapter one after the other.
+    :return: dict of the loader state
+    """
+    loader = {
+        'adapter': adapter,
+        'batchSize': batchSize,
+        'upsert': upsert,
+        'pool': pool,
+        'rows': [],
+        'rowCount': 0,
+        'lock': threading.Lock(),
+        # Batches which can wait to be inserted. addTimeseries blocks when the queue is full.
+        'queue': queue.Queue(maxsize=max(workers, 1)),
+        'threads': [],
+        'errors': []
+    }
+    if pool is not None and batchSize:
+        for i in range(workers):
+            thread = threading.Thread(target=timeseriesLoaderWorker, args=(loader,), daemon=True)
+            thread.start()
+            loader['threads'].append(thread)
+
+    return loader
+
+
+def insertTimeseriesRows(cursor, rows, upsert=False):
+    for k in range(0, len(rows), TIMESERIES_INSERT_ROWS):
+        chunk = rows[k:k + TIMESERIES_INSERT_ROWS]
+        sql = "INSERT INTO `data` (`id`, `time`, `value`) VALUES %s" % ', '.join(['(%s, %s, %s)'] * len(chunk))
+        if upsert:
+            sql += " ON DUPLICATE KEY UPDATE `value`=VALUES(`value`)"
+        cursor.execute(sql, [value for row in chunk for value in row])
+
+
+def insertTimeseriesBatch(adapter, rows, upsert=False):
+    """
+    Insert the rows in a single transaction. The transaction is rolled back on an error, and retried up to
+    TIMESERIES_RETRIES times, after reconnecting if the connection is lost.
+    """
+    connection = adapter.connection
+    for attempt in range(TIMESERIES_RETRIES):
+        try:
+            with connection.cursor() as cursor:
+                insertTimeseriesRows(cursor, rows, upsert)
+            connection.commit()
+            return len(rows)
+        except Exception as e:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            if attempt + 1 == TIMESERIES_RETRIES:
+                raise
+            print('Unable to insert %s rows. Retry in %ss :' % (len(rows), TIMESERIES_RETRY_DELAY * 2 ** attempt), e)
+            time.sleep(TIMESERIES_RETRY_DELAY * 2 ** attempt)
+            connection.ping(reconnect=True)
+
+
+def timeseriesLoaderWorker(loader):
+    while True:
+        rows = loader['queue'].get()
+        try:
+            if rows is None:
+                return
+            adapter = acquireAdapter(loader['pool'])
+            try:
+                rowCount = insertTimeseriesBatch(adapter, rows, loader['upsert'])
+            finally:
+                releaseAdapter(loader['pool'], adapter)
+            with loader['lock']:
+                loader['rowCount'] += rowCount
+        except Exception as e:
+            loader['errors'].append(e)
+        finally:
+            loader['queue'].task_done()
+
+
+def flushTimeseriesLoader(loader):
+    """
+    Insert the gathered rows in a single transaction, or queue them for the worker threads.
+    Raise the first error of the worker threads, if any.
+    """
+    if loader['errors']:
+        raise loader['errors'][0]
+    rows = loader['rows']
+    if not rows:
+        return
+    loader['rows'] = []
+    if loader['threads']:
+        loader['queue'].put(rows)
+        return
+    rowCount = insertTimeseriesBatch(loader['adapter'], rows, loader['upsert'])
+    loader['rowCount'] += rowCount
+
+
+def addTimeseries(loader, eventId, timeseries):
+    """
+    Add the timeseries of an event. Rows are inserted once the batch is full.
+
+    :param eventId: Event id of the timeseries. See Util.LibEventIds.resolveEventIds
+    :param timeseries: list of [<%Y-%m-%d %H:%M:%S>, value] rows
+    :return: Number of the rows added
+    """
+    if not loader['batchSize']:
+        rowCount = loader['adapter'].insert_timeseries(eventId, timeseries, loader['upsert'])
+        loader['rowCount'] += rowCount
+        return rowCount
+
+    rows = [(eventId, row[0], row[1]) for row in timeseries if len(row) > 1]
+    loader['rows'].extend(rows)
+    if len(loader['rows']) >= loader['batchSize']:
+        flushTimeseriesLoader(loader)
+    return len(rows)
+
+
+def closeTimeseriesLoader(loader):
+    """
+    Insert the remaining rows, wait until the worker threads insert all the batches and stop them.
+    Raise the first error of the worker threads, if any.
+
+    :return: Total number of the rows inserted by the loader
+    """
+    flushTimeseriesLoader(loader)
+    for thread in loader['threads']:
+        loader['queue'].put(None)
+    for thread in loader['threads']:
+        thread.join()
+    loader['threads'] = []
+    if loader['errors']:
+        raise loader['errors'][0]
+    return loader['rowCount']
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Scripts and libraries of the repository are imported from its root directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
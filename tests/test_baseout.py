@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from LIBFLO2DBASEOUT import decodeBaseOutRows
+from LIBFLO2DBASEOUT import getBaseOutCellValues
+from LIBFLO2DBASEOUT import iterBaseOutResults
+from LIBFLO2DBASEOUT import iterBaseOutTimesteps
+from LIBFLO2DBASEOUT import readBaseOutTimesteps
+
+TIMESTEP_ROWS = [
+    (0.25, ['   1   5.000   0.000   0.000', '   2   5.000   0.000   0.000', '   3   5.916   0.916   0.000',
+            '   4   5.000   0.000   0.000', '  12   5.522   0.522   0.000']),
+    (0.50, ['   1   5.100   0.100   0.010', '   2   5.000   0.000   0.000', '   3   6.012   1.012   0.100',
+            '   4   5.030   0.030   0.000', '  12   5.601   0.601   0.020']),
+    (0.75, ['   1   5.200   0.200   0.020', '   2   5.050   0.050   0.000', '   3   6.104   1.104   0.200',
+            '   4   5.040   0.040   0.000', '  12   5.700   0.700   0.030'])
+]
+
+
+def getBaseOutText(timesteps):
+    lines = [' FLO-2D BASE OUTPUT', '', '']
+    for modelTime, rows in timesteps:
+        lines.extend(['     MODEL TIME = %9.2f HOURS' % modelTime, '', '', '   FLOODPLAIN RESULTS', '',
+                      '   NODE    ELEV     DEPTH   VELOC'])
+        lines.extend(rows)
+        lines.extend(['', '   SOME OTHER TABLE', '                 ***CHANNEL RESULTS***', '   1 2 3', ''])
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture
+def baseOutFilePath(tmp_path):
+    filePath = tmp_path / 'BASE.OUT'
+    filePath.write_text(getBaseOutText(TIMESTEP_ROWS))
+    return str(filePath)
+
+
+def getWaterLevelGrid(lines):
+    """
+    Line by line parser of a timestep, same as LIBFLO2DWATERLEVELGRID.getWaterLevelGrid of the baseline.
+    """
+    waterLevels = []
+    for line in lines[6:]:
+        if line == '\n':
+            break
+        v = line.split()
+        waterLevels.append('%s %s' % (v[0], v[2]))
+    return waterLevels
+
+
+def getWaterLevelOfChannels(lines, channels):
+    """
+    Same as LIBFLO2DWATERLEVELGRID.getWaterLevelOfChannels of the baseline.
+    """
+    water_levels = {}
+    for line in lines[6:]:
+        if line == '\n':
+            break
+        v = line.split()
+        if v[0] in channels:
+            water_levels[v[0]] = v[1]
+    return water_levels
+
+
+def readBaselineTimesteps(baseOutFilePath):
+    with open(baseOutFilePath) as infile:
+        lines = infile.readlines()
+    return [(float(line.split()[3]), lines[k:]) for k, line in enumerate(lines)
+            if line.startswith('MODEL TIME =', 5)]
+
+
+def assertSameAsBaseline(timesteps, baseOutFilePath, channels=('3', '12', '99')):
+    expected = readBaselineTimesteps(baseOutFilePath)
+    assert [modelTime for modelTime, cells, values in timesteps] == [modelTime for modelTime, lines in expected]
+    for (modelTime, cells, values), (expectedTime, lines) in zip(timesteps, expected):
+        waterLevels = [row.split() for row in getWaterLevelGrid(lines)]
+        np.testing.assert_array_equal(cells, [int(cellNo) for cellNo, depth in waterLevels])
+        np.testing.assert_allclose(values['depth'], [float(depth) for cellNo, depth in waterLevels])
+        channelLevels = getWaterLevelOfChannels(lines, channels)
+        assert getBaseOutCellValues(cells, values['elevation'], channels) == \
+            {cellNo: float(value) for cellNo, value in channelLevels.items()}
+
+
+@pytest.mark.parametrize('bufsize', [1048576, 64, 7])
+def test_stream_same_as_baseline(baseOutFilePath, bufsize):
+    assertSameAsBaseline(list(iterBaseOutTimesteps(baseOutFilePath, bufsize=bufsize)), baseOutFilePath)
+
+
+def test_seek_same_as_baseline(baseOutFilePath):
+    assertSameAsBaseline(list(readBaseOutTimesteps(baseOutFilePath)), baseOutFilePath)
+    window = list(readBaseOutTimesteps(baseOutFilePath, startTime=0.5, endTime=0.75))
+    assert [modelTime for modelTime, cells, values in window] == [0.5, 0.75]
+    np.testing.assert_allclose(window[0][2]['elevation'], [5.1, 5.0, 6.012, 5.03, 5.601])
+
+
+def test_cache_same_as_baseline(baseOutFilePath):
+    assertSameAsBaseline(list(iterBaseOutResults(baseOutFilePath, buildCache=True)), baseOutFilePath)
+    # Loaded from the cache file
+    window = list(iterBaseOutResults(baseOutFilePath, startTime=0.75))
+    assert len(window) == 1
+    np.testing.assert_allclose(window[0][2]['depth'], [0.2, 0.05, 1.104, 0.04, 0.7])
+
+
+@pytest.mark.filterwarnings('ignore:Some errors were detected')
+def test_truncated_row_is_skipped():
+    rows = ['   1   5.000   0.000   0.000', '   2   5.100', '   3   5.916   0.916   0.000']
+    block = getBaseOutText([(0.25, rows)]).split('\n', 3)[3].encode()
+    data = decodeBaseOutRows(block)
+    np.testing.assert_array_equal(data[:, 0], [1, 3])
+    np.testing.assert_allclose(data[:, 2], [0.0, 0.916])
+
+
+def test_invalid_value_is_nan():
+    rows = ['   1   5.000   0.000   0.000', '   2   *****   0.100   0.000']
+    block = getBaseOutText([(0.25, rows)]).split('\n', 3)[3].encode()
+    data = decodeBaseOutRows(block)
+    np.testing.assert_array_equal(data[:, 0], [1, 2])
+    assert np.isnan(data[1, 1])
+    assert getBaseOutCellValues(data[:, 0].astype(np.int64), data[:, 1], ['1', '2']) == {'1': 5.0}
@@ -0,0 +1,110 @@
+import pytest
+
+from Util import LibEventIds
+from Util.LibEventIds import createEventIds
+from Util.LibEventIds import getEventId
+from Util.LibEventIds import getEventIdsWithTimeseries
+
+
+# Event ids of the runs, as created by MySQLAdapter.create_event_id
+@pytest.mark.parametrize('meta_data, event_id', [
+    ({'station': 'Wellawatta', 'variable': 'WaterLevel', 'unit': 'm', 'type': 'Forecast-0-d', 'source': 'FLO2D',
+      'name': 'Cloud-1'},
+     'ac5ee875090830853db9fda277901fb0dbe33ab1579c777726ff18cf8a2245b2'),
+    ({'station': "N'Street-Canal", 'variable': 'Discharge', 'unit': 'm3/s', 'type': 'Forecast-2-d-after',
+      'source': 'FLO2D', 'name': 'Cloud-1', 'start_date': '2017-10-18 00:00:00', 'end_date': '2017-10-19 00:00:00'},
+     '8c7931e51c52d2691928c21e903800e930e245befe149c634f4e84f99cf68aae'),
+    ({'station': 'FLO2D 1234', 'variable': 'Waterlevel', 'unit': 'm', 'type': 'Forecast-1-d-after',
+      'source': 'FLO2D_150', 'name': 'Rathnapura Kalu Ganga "Ela"'},
+     'dc350ee5be98a55c8a871199fc30a8491c714662b82761d4b74461dbd4d8860d')
+])
+def test_event_id_same_as_adapter(meta_data, event_id):
+    assert getEventId(meta_data) == event_id
+
+
+def test_event_id_of_missing_field():
+    with pytest.raises(KeyError):
+        getEventId({'station': 'Wellawatta', 'variable': 'WaterLevel', 'unit': 'm'})
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql, args):
+        self.connection.queries.append((sql, args))
+        if 'FROM `data`' in sql:
+            ids, start, end = args[:-2], args[-2], args[-1]
+            self.result = [{'id': event_id} for event_id in dict.fromkeys(ids)
+                           if any(start <= time <= end for time in self.connection.rows.get(event_id, []))]
+        else:
+            # Lookup tables, where the id of a name is its length
+            self.result = [{'id': len(name), 'name': name} for name in args if name in self.connection.names]
+
+    def executemany(self, sql, rows):
+        self.connection.queries.append((sql, rows))
+
+    def fetchall(self):
+        return self.result
+
+
+class Connection:
+    def __init__(self, rows=None, names=()):
+        self.rows = rows or {}
+        self.names = set(names)
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class Adapter:
+    def __init__(self, rows=None, names=()):
+        self.connection = Connection(rows, names)
+
+
+def test_event_ids_with_timeseries(monkeypatch):
+    monkeypatch.setattr(LibEventIds, 'EVENT_ID_QUERY_SIZE', 2)
+    adapter = Adapter({
+        'a': ['2017-10-18 01:00:00'],
+        'b': ['2017-10-20 01:00:00'],
+        'c': ['2017-10-18 23:00:00'],
+        'd': ['2017-10-19 01:00:00']
+    })
+    day0 = ('2017-10-18 00:00:00', '2017-10-18 23:59:59')
+    day1 = ('2017-10-19 00:00:00', '2017-10-19 23:59:59')
+    event_ranges = [('a',) + day0, ('b',) + day0, ('c',) + day0, ('a',) + day0, ('d',) + day1, ('a',) + day1]
+    assert getEventIdsWithTimeseries(adapter, event_ranges) == {'a', 'c', 'd'}
+    # A query per EVENT_ID_QUERY_SIZE distinct events of each time range
+    assert [len(args) - 2 for sql, args in adapter.connection.queries] == [2, 1, 2]
+
+
+def test_create_event_ids():
+    adapter = Adapter(names=['Wellawatta', 'WaterLevel', 'm', 'Forecast-0-d', 'Forecast-1-d-after', 'FLO2D'])
+    meta_data = {'station': 'Wellawatta', 'variable': 'WaterLevel', 'unit': 'm', 'type': 'Forecast-0-d',
+                 'source': 'FLO2D', 'name': 'Cloud-1'}
+    meta_data_dict = {
+        'a': meta_data,
+        'b': dict(meta_data, type='Forecast-1-d-after', start_date='2017-10-19 00:00:00'),
+        # Unknown unit
+        'c': dict(meta_data, unit='mm')
+    }
+    assert createEventIds(adapter, meta_data_dict) == {'a', 'b'}
+    sql, rows = adapter.connection.queries[-1]
+    assert sql == "INSERT INTO `run` (`id`, `name`, `station`, `variable`, `unit`, `type`, `source`, " \
+                  "`start_date`, `end_date`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    assert rows == [('a', 'Cloud-1', 10, 10, 1, 12, 5, None, None),
+                    ('b', 'Cloud-1', 10, 10, 1, 18, 5, '2017-10-19 00:00:00', None)]
+    assert adapter.connection.commits == 1
+    assert createEventIds(adapter, {}) == set()
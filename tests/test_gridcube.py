@@ -0,0 +1,74 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from LIBFLO2DGRIDCUBE import appendCubeTimestep
+from LIBFLO2DGRIDCUBE import closeCube
+from LIBFLO2DGRIDCUBE import closeCubeWriter
+from LIBFLO2DGRIDCUBE import openCube
+from LIBFLO2DGRIDCUBE import openCubeWriter
+from LIBFLO2DGRIDCUBE import readCubeSeries
+from LIBFLO2DGRIDCUBE import readCubeTimestep
+
+BASE_TIME = datetime.datetime(2017, 10, 18, 22, 0, 0)
+BOUDARY = {'long_min': 1000.0, 'lat_min': 2000.0, 'long_max': 33250.0, 'lat_max': 19500.0}
+ROWS, COLS = 70, 130
+MISSING_VALUE = -9
+
+
+def getGrids(timesteps):
+    random = np.random.default_rng(2017)
+    grids = random.random((timesteps, ROWS, COLS)) * 2
+    grids[random.random(grids.shape) < 0.3] = 0.0
+    # Cells out of the mesh
+    grids[:, random.random((ROWS, COLS)) < 0.1] = np.nan
+    return grids
+
+
+@pytest.fixture(params=[(24, 64), (2, 16)])
+def cube(tmp_path, request):
+    timeChunk, tileSize = request.param
+    grids = getGrids(5)
+    modelTimes = [0.25 * (step + 1) for step in range(len(grids))]
+    cubeFilePath = str(tmp_path / 'waterDepth.cube')
+    writer = openCubeWriter(cubeFilePath, BOUDARY, COLS, ROWS, BASE_TIME, missingVal=MISSING_VALUE,
+                            timeChunk=timeChunk, tileSize=tileSize)
+    for modelTime, grid in zip(modelTimes, grids):
+        appendCubeTimestep(writer, modelTime, grid.reshape(-1) if timeChunk == 2 else grid)
+    closeCubeWriter(writer)
+
+    cube = openCube(cubeFilePath)
+    yield cube, modelTimes, np.where(np.isnan(grids), MISSING_VALUE, grids)
+    closeCube(cube)
+
+
+def test_header(cube):
+    cube, modelTimes, grids = cube
+    header = cube['header']
+    assert (header['nrows'], header['ncols']) == (ROWS, COLS)
+    assert (header['xllcorner'], header['yllcorner']) == (875.0, 1875.0)
+    assert header['NODATA_value'] == MISSING_VALUE
+    assert cube['times'].astype(datetime.datetime).tolist() == \
+        [BASE_TIME + datetime.timedelta(hours=modelTime) for modelTime in modelTimes]
+
+
+def test_timestep_round_trip(cube):
+    cube, modelTimes, grids = cube
+    for step in range(len(modelTimes)):
+        np.testing.assert_array_equal(readCubeTimestep(cube, step), grids[step])
+
+
+def test_series_round_trip(cube):
+    cube, modelTimes, grids = cube
+    rows = [0, 69, 5, 64, 17, 5]
+    cols = [0, 129, 70, 63, 100, 70]
+    np.testing.assert_array_equal(readCubeSeries(cube, rows, cols), grids[:, rows, cols])
+    assert readCubeSeries(cube, [], []).shape == (len(modelTimes), 0)
+
+
+def test_invalid_file(tmp_path):
+    cubeFilePath = tmp_path / 'waterDepth.cube'
+    cubeFilePath.write_bytes(b'NCOLS 130\nNROWS 70\n')
+    with pytest.raises(ValueError):
+        openCube(str(cubeFilePath))
@@ -0,0 +1,124 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from LIBFLO2DHYCHAN import getHychanCache
+from LIBFLO2DHYCHAN import getHychanIndex
+from LIBFLO2DHYCHAN import getHychanTimeseries
+from LIBFLO2DHYCHAN import iterHychanCache
+from LIBFLO2DHYCHAN import readHychanElements
+from Util.LibForecastTimeseries import formatTimeseries
+
+BASE_TIME = datetime.datetime(2017, 10, 18, 22, 0, 0)
+ELEMENT_ROWS = {
+    '179': [
+        '       0.25    0.313    0.847    0.764      2.551    0.495',
+        '       0.50    0.628    0.652    0.789      0.939    0.028',
+        '       0.75    1.015    0.433    0.762      0.021    0.445',
+        '       1.00    0.901    0.229    0.945      9.014    0.031'
+    ],
+    # Overflowed and NaN values
+    '221': [
+        '       0.25    0.204    0.541    0.939      3.812    0.217',
+        '       0.50    *****    0.029    0.222      4.379    0.496',
+        '       0.75      NaN    0.231    0.219      4.596    0.290',
+        '       1.00    0.200    0.838    0.556  *********    0.186'
+    ],
+    '3673': [
+        '       0.25   -1.172    0.860    0.121      3.327    0.721',
+        '       0.50    0.890    0.936    0.422      8.300    0.670',
+        '      10.75    0.482    0.588    0.882      8.462    0.505'
+    ]
+}
+
+
+@pytest.fixture
+def hychanFilePath(tmp_path):
+    lines = ['', '  FLO-2D CHANNEL HYDROGRAPHS', '', ' ']
+    for elementNo, rows in ELEMENT_ROWS.items():
+        lines.append('     CHANNEL HYDROGRAPH FOR ELEMENT NO:%6s' % elementNo)
+        lines.append('')
+        lines.append('       TIME     ELEV    DEPTH    VELOC  DISCHARGE  FROUDE NO.')
+        lines.append('                 (M)      (M)    (MPS)     (CMS)')
+        lines.extend(rows)
+        lines.append('')
+    filePath = tmp_path / 'HYCHAN.OUT'
+    filePath.write_text('\n'.join(lines) + '\n')
+    return str(filePath)
+
+
+def isfloat(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def readBaselineTimeseries(hychanFilePath, column):
+    """
+    Line by line parser of HYCHAN.OUT, same as EXTRACTFLO2DWATERLEVEL before the vectorized decoder.
+    """
+    timeseries = {}
+    elementNo = None
+    with open(hychanFilePath) as infile:
+        for line in infile:
+            if line.startswith('CHANNEL HYDROGRAPH FOR ELEMENT NO:', 5):
+                elementNo = line.split()[5]
+                timeseries[elementNo] = []
+            elif elementNo is not None:
+                v = line.split()
+                if len(v) < 1 or not isfloat(v[0]):
+                    continue
+                value = v[column]
+                if not isfloat(value) or value == 'NaN':
+                    continue
+                currentStepTime = BASE_TIME + datetime.timedelta(hours=float(v[0]))
+                timeseries[elementNo].append([currentStepTime.strftime('%Y-%m-%d %H:%M:%S'), float(value)])
+
+    return timeseries
+
+
+def assertSameTimeseries(actual, expected):
+    assert [row[0] for row in actual] == [row[0] for row in expected]
+    np.testing.assert_allclose([float(row[1]) for row in actual], [row[1] for row in expected])
+
+
+@pytest.mark.parametrize('variable, column', [('elevation', 1), ('discharge', 4)])
+def test_read_elements_same_as_baseline(hychanFilePath, variable, column):
+    expected = readBaselineTimeseries(hychanFilePath, column)
+    decoded = dict(readHychanElements(hychanFilePath))
+    assert list(decoded.keys()) == list(ELEMENT_ROWS.keys())
+    for elementNo, data in decoded.items():
+        times, values = getHychanTimeseries(data, BASE_TIME, (variable,))[variable]
+        assertSameTimeseries(formatTimeseries(times, values), expected[elementNo])
+
+
+def test_read_selected_elements(hychanFilePath):
+    decoded = list(readHychanElements(hychanFilePath, ['3673', '179', '999']))
+    assert [elementNo for elementNo, data in decoded] == ['179', '3673']
+    assert decoded[1][1].shape == (3, 6)
+    np.testing.assert_allclose(decoded[1][1][:, 0], [0.25, 0.5, 10.75])
+
+
+def test_index_is_reused_and_rebuilt(hychanFilePath):
+    index = getHychanIndex(hychanFilePath)
+    assert sorted(index['elements'].keys()) == sorted(ELEMENT_ROWS.keys())
+    assert getHychanIndex(hychanFilePath) == index
+
+    with open(hychanFilePath, 'a') as outfile:
+        outfile.write('     CHANNEL HYDROGRAPH FOR ELEMENT NO:   592\n\n'
+                      '       0.25    0.100    0.200    0.300      0.400    0.500\n')
+    assert '592' in getHychanIndex(hychanFilePath)['elements']
+
+
+def test_cache_same_as_decoded_blocks(hychanFilePath):
+    decoded = list(readHychanElements(hychanFilePath))
+    cached = list(iterHychanCache(getHychanCache(hychanFilePath)))
+    assert [elementNo for elementNo, data in cached] == [elementNo for elementNo, data in decoded]
+    for (elementNo, cachedData), (elementNo, data) in zip(cached, decoded):
+        np.testing.assert_array_equal(cachedData, data)
+    # Loaded from the cache file
+    cached = dict(iterHychanCache(getHychanCache(hychanFilePath), ['221']))
+    np.testing.assert_array_equal(cached['221'], dict(decoded)['221'])
@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from LIBFLO2DSPARSEGRID import appendSparseGridTimestep
+from LIBFLO2DSPARSEGRID import closeSparseGridWriter
+from LIBFLO2DSPARSEGRID import openSparseGrid
+from LIBFLO2DSPARSEGRID import openSparseGridWriter
+from LIBFLO2DSPARSEGRID import readSparseGridSeries
+from LIBFLO2DSPARSEGRID import readSparseGridTimestep
+
+BASE_TIME = datetime.datetime(2017, 10, 18, 22, 0, 0)
+BOUDARY = {'long_min': 1000.0, 'lat_min': 2000.0, 'long_max': 10750.0, 'lat_max': 7000.0}
+ROWS, COLS = 20, 40
+MISSING_VALUE = -9
+
+
+@pytest.fixture
+def sparse(tmp_path):
+    random = np.random.default_rng(2017)
+    # Flat grid index of each cell of the mesh, where -1 is a cell out of the grid
+    dryIndex = np.flatnonzero(random.random(ROWS * COLS) < 0.8)
+    dryIndex = np.concatenate((dryIndex, [-1, -1]))
+    dryGrid = np.full(ROWS * COLS, np.nan)
+    dryGrid[dryIndex[dryIndex > -1]] = 0.0
+
+    grids = []
+    for step in range(4):
+        grid = dryGrid.copy()
+        wet = dryIndex[(dryIndex > -1) & (random.random(len(dryIndex)) < 0.2 * step)]
+        grid[wet] = random.random(len(wet)) + 0.01
+        grids.append(grid)
+    # A cell out of the mesh which gets a value, and a cell of the mesh which gets NaN
+    grids[2][np.flatnonzero(np.isnan(dryGrid))[0]] = 0.5
+    grids[3][dryIndex[0]] = np.nan
+
+    modelTimes = [0.25 * (step + 1) for step in range(len(grids))]
+    sparseFilePath = str(tmp_path / 'waterDepth.wet.npz')
+    writer = openSparseGridWriter(sparseFilePath, BOUDARY, COLS, ROWS, BASE_TIME, dryIndex, missingVal=MISSING_VALUE)
+    for modelTime, grid in zip(modelTimes, grids):
+        appendSparseGridTimestep(writer, modelTime, grid if modelTime < 0.5 else grid.reshape(ROWS, COLS))
+    closeSparseGridWriter(writer)
+
+    grids = np.array(grids).reshape(-1, ROWS, COLS)
+    return openSparseGrid(sparseFilePath), modelTimes, np.where(np.isnan(grids), MISSING_VALUE, grids)
+
+
+def test_header(sparse):
+    sparse, modelTimes, grids = sparse
+    assert (int(sparse['nrows']), int(sparse['ncols'])) == (ROWS, COLS)
+    assert (float(sparse['xllcorner']), float(sparse['yllcorner'])) == (875.0, 1875.0)
+    assert sparse['times'].astype(datetime.datetime).tolist() == \
+        [BASE_TIME + datetime.timedelta(hours=modelTime) for modelTime in modelTimes]
+    # Dry timestep does not store any cell
+    assert sparse['offsets'][1] == 0
+
+
+def test_timestep_round_trip(sparse):
+    sparse, modelTimes, grids = sparse
+    for step in range(len(modelTimes)):
+        np.testing.assert_array_equal(readSparseGridTimestep(sparse, step), grids[step])
+
+
+def test_series_round_trip(sparse):
+    sparse, modelTimes, grids = sparse
+    cells = np.flatnonzero(grids[2] != grids[1])[:5]
+    rows = [0, 19, 7] + (cells // COLS).tolist() + [7]
+    cols = [0, 39, 21] + (cells % COLS).tolist() + [21]
+    np.testing.assert_array_equal(readSparseGridSeries(sparse, rows, cols), grids[:, rows, cols])
+    assert readSparseGridSeries(sparse, [], []).shape == (len(modelTimes), 0)